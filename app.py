@@ -1,174 +1,23 @@
 import base64
+import sys
 import streamlit as st
 
-import streamlit as st
-
-def theme_css(mode: str = "auto") -> str:
-    """
-    Returns a <style> block that:
-      - Defines light and dark color tokens with CSS variables based on Thales Blue.
-      - Supports 'auto' (prefers-color-scheme), 'light', and 'dark'.
-      - Hides Streamlit Header and Footer.
-    """
-    
-    # Colores base (Light Mode - Azul Pálido Sutil)
-    light_mode_vars = """
-    --bg:#a8d0ff;       /* Azul Pálido Sutil (Fondo principal) */
-    --bg-alt: #6eb8f5;   /* Azul Claro pálido (Fondo secundario/Sidebar) */
-    --fg: #000000ff;       /* Negro (Texto principal) */
-    --muted: #000000ff;      /* Gris para texto 'muted' */
-    --primary: #1ebcde;    /* Azul Thales Claro (Acento) */
-    --border: #6c70a3ff;   /* Borde */
-    """
-
-    # Colores Dark Mode
-    dark_mode_vars = """
-    --bg: #08306b;       /* Azul Thales Oscuro (Fondo principal) */
-    --bg-alt: #000000;     /* Negro (Fondo secundario/Sidebar) */
-    --fg: #ffffff;         /* Blanco (Texto principal) */
-    --muted: #a0a3ad;      /* Gris claro para texto 'muted' */
-    --primary: #1ebcde;    /* Azul Thales Claro (Acento) */
-    --border: #3b42a9ff;   /* Borde */
-    """
-    
-    # Lógica para aplicar los colores según el 'mode'
-    initial_vars = light_mode_vars
-    auto_dark_css = ""
-    
-    if mode == "auto":
-        auto_dark_css = f"""
-        @media (prefers-color-scheme: dark) {{
-          :root {{
-            {dark_mode_vars}
-          }}
-        }}
-        """
-    elif mode == "dark":
-        initial_vars = dark_mode_vars
-    
-    return f"""
-    <style>
-    :root {{
-    {initial_vars}
-    }}
-
-    @media (prefers-reduced-motion: no-preference) {{
-      [data-testid="stAppViewContainer"],
-      [data-testid="stSidebar"] {{
-        transition: background-color .2s ease, color .2s ease, border-color .2s ease;
-      }}
-    }}
-
-    {auto_dark_css}
-
-    /* =========================================
-       OCULTAR ELEMENTOS DE STREAMLIT (HEADER/FOOTER)
-       ========================================= */
-    
-    /* Ocultar Header (Barra superior con menú hamburguesa y 'Deploy') */
-    header[data-testid="stHeader"] {{
-        background-color: transparent !important;
-        box-shadow: none !important;
-        border-bottom: none !important;
-        /* Si quieres que desaparezca y el contenido suba, descomenta la linea de abajo: */
-        /* display: none !important; */
-    }}
-
-    /* Ocultar Footer ('Made with Streamlit') */
-    footer {{
-        visibility: hidden;
-        display: none !important;
-    }}
-    
-    /* Ajustar el padding superior del contenido principal 
-       para aprovechar el espacio si el header es transparente/oculto */
-    .block-container {{
-        padding-top: 2rem !important;
-    }}
-
-    /* =========================================
-       ESTILOS DE TEMA PERSONALIZADO
-       ========================================= */
-
-    /* Main content area */
-    [data-testid="stAppViewContainer"],
-    .block-container {{
-      background-color: var(--bg);
-      color: var(--fg);
-    }}
-
-    a, .stMarkdown a {{
-      color: var(--primary);
-    }}
+from crime_core import startup
+from crime_core.db import connect
+from crime_core.metrics import span
+from crime_core.scoping import list_alcaldias
+from css.theme import inject_theme
 
-    /* Input fields (Text, Number, Selectbox, Multiselect) */
-    div[data-baseweb="input"] input,
-    textarea, .stTextInput input, .stNumberInput input, .stTextArea textarea,
-    .stSelectbox div[role="combobox"], .stMultiSelect div[role="combobox"] {{
-      background-color: var(--bg-alt) !important;
-      color: var(--fg) !important;
-      border: 1px solid var(--border) !important;
-    }}
+# `python app.py --warmup-only`: precarga todo, imprime los tiempos y termina
+# (sonda de disponibilidad); no se ejecuta nada de Streamlit.
+if "--warmup-only" in sys.argv:
+    sys.exit(startup.main(sys.argv[1:]))
 
-    /* Buttons */
-    .stButton > button, .stDownloadButton > button {{
-      background-color: var(--primary) !important; 
-      color: var(--fg) !important; 
-      border: 1px solid var(--primary) !important;
-      border-radius: 5px;
-      font-weight: bold;
-    }}
-
-    .stButton > button:hover,
-    [data-testid="stSidebar"] .stButton > button:hover {{
-      background-color: #1693b3 !important; 
-      border-color: #1693b3 !important;
-    }}
-
-    hr {{
-      border-color: var(--border);
-    }}
-
-    /* Sidebar styling */
-    [data-testid="stSidebar"] {{
-      background-color: var(--bg-alt);
-      border-right: 1px solid var(--border);
-      color: var(--fg);
-    }}
-
-    [data-testid="stSidebar"] * {{
-      color: var(--fg) !important;
-    }}
-
-    [data-testid="stSidebar"] a {{
-      color: var(--primary) !important;
-    }}
-
-    /* Sidebar Inputs */
-    [data-testid="stSidebar"] .stTextInput input,
-    [data-testid="stSidebar"] textarea,
-    [data-testid="stSidebar"] .stSelectbox div[role="combobox"],
-    [data-testid="stSidebar"] .stMultiSelect div[role="combobox"],
-    [data-testid="stSidebar"] .stNumberInput input {{
-      background-color: var(--bg) !important;
-      color: var(--fg) !important;
-      border: 1px solid var(--border) !important;
-    }}
-
-    /* Sidebar Buttons */
-    [data-testid="stSidebar"] .stButton > button,
-    [data-testid="stSidebar"] .stDownloadButton > button {{
-      background-color: var(--primary) !important;
-      color: var(--fg) !important;
-      border: 1px solid var(--primary) !important;
-    }}
-
-    [data-testid="stSidebar"] label,
-    [data-testid="stSidebar"] [data-testid="stMarkdownContainer"] p {{
-      color: var(--fg) !important;
-    }}
-    </style>
-    """
+# -----------------------------------------
+# Precarga de librerías, datos, modelos y límites de alcaldías
+# (una vez por proceso, en segundo plano)
+# -----------------------------------------
+startup_report = startup.start()
 
 # -----------------------------------------
 # Inicializar estado de sesión
@@ -179,11 +28,23 @@ if "role" not in st.session_state:
 if "theme_mode" not in st.session_state:
     st.session_state.theme_mode = "auto"
 
+# Alcaldías asignadas (Agente Policiaco); acotan las consultas en crime_core.scoping
+if "alcaldias_asignadas" not in st.session_state:
+    st.session_state.alcaldias_asignadas = []
+
 # -----------------------------------------
 # Definir roles disponibles
 # -----------------------------------------
 ROLES = [None, "Socio Thales", "Agente Policiaco", "Visitante"]
 
+@st.cache_data(ttl=3600)
+def opciones_alcaldias():
+    try:
+        with connect() as con:
+            return list_alcaldias(con)
+    except Exception:
+        return []
+
 # -----------------------------------------
 # Función de inicio de sesión
 # -----------------------------------------
@@ -194,8 +55,16 @@ def login():
     # Selector de rol
     role = st.selectbox("Selecciona tu rol:", ROLES)
 
+    asignadas = []
+    if role == "Agente Policiaco":
+        asignadas = st.multiselect("Alcaldías asignadas:", opciones_alcaldias())
+
     if st.button("Entrar"):
+        if role == "Agente Policiaco" and not asignadas:
+            st.error("Selecciona al menos una alcaldía asignada.")
+            return
         st.session_state.role = role
+        st.session_state.alcaldias_asignadas = asignadas
         st.rerun()
 
 # -----------------------------------------
@@ -225,6 +94,12 @@ chat = st.Page(
     icon=":material/chat:",
 )
 
+rendimiento = st.Page(
+    "pages/Rendimiento.py",
+    title="Rendimiento",
+    icon=":material/speed:",
+)
+
 # -----------------------------------------
 # Asignar accesos según el rol
 # -----------------------------------------
@@ -237,6 +112,7 @@ if st.session_state.role == "Socio Thales":
         "EDA": [eda],
         "Predicciones": [predicciones],
         "Mapa": [mapa],
+        "Administración": [rendimiento],
     })
 
 elif st.session_state.role == "Agente Policiaco":
@@ -274,11 +150,15 @@ with st.sidebar:
     if st.session_state.theme_mode != selected_theme:
         st.session_state.theme_mode = selected_theme
         st.rerun()
+
+    if st.session_state.role == "Socio Thales":
+        with st.expander("⏱️ Arranque del servidor"):
+            st.json(startup_report.to_dict())
 # =========================================
 # INYECCIÓN DEL TEMA
 # Se inyecta DESPUÉS de que el selector actualice el estado
 # =========================================
-st.markdown(theme_css(mode=st.session_state.theme_mode), unsafe_allow_html=True)
+inject_theme(st.session_state.theme_mode)
 
 # -----------------------------------------
 # Navegación principal
@@ -288,4 +168,6 @@ if len(page_dict) > 0 and st.session_state.role:
 else:
     pg = st.navigation([st.Page(login)])
 
-pg.run()
\ No newline at end of file
+# Cada rerun de página queda registrado como span (crime_core.metrics)
+with span("page.run", page=pg.title, role=st.session_state.role):
+    pg.run()
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the headless hot paths in `crime_core`.
+
+Each module is runnable with `python -m benchmarks.<name>` from the project root.
+"""
@@ -0,0 +1,450 @@
+"""
+Timing of the headless hot paths on synthetic datasets at several scales.
+
+    python -m benchmarks.core [--scales 10k 100k 1m 10m] [--cases 'data.*']
+                              [--repeat 3] [--json out.json] [--compare base.json]
+
+Each scale gets a cached synthetic `crimes_raw` DB (benchmarks.synthetic).
+Every case prepares its inputs outside the timed region and reports the
+best of `--repeat` runs (a single run from 1M rows up) and the RSS change
+over the timed runs. The JSON report records the commit, library versions
+and machine so runs can be compared across commits: with `--compare` the
+table shows the ratio against a previous report and the run exits with
+status 1 if a case got slower than `--threshold`.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Keep the timed runs out of the production metrics store (crime_core.metrics)
+os.environ.setdefault("CRIME_METRICS", "0")
+
+from benchmarks.synthetic import SCALES, ensure_dataset, parse_rows  # noqa: E402
+from crime_core.metrics import rss_bytes  # noqa: E402
+
+DEFAULT_SCALES = ("10k", "100k")
+# Slower than this ratio against the baseline counts as a regression
+DEFAULT_THRESHOLD = 1.25
+# From this many rows every case runs once
+SINGLE_RUN_ROWS = 1_000_000
+
+CASES = {}
+
+
+def case(name):
+    """Register `setup(db_path, rows)`, which returns the zero-argument callable to time."""
+    def decorator(setup):
+        CASES[name] = setup
+        return setup
+    return decorator
+
+
+# ============================================================================
+# CASES
+# ============================================================================
+
+def _raw_crimes(db_path):
+    from crime_core.db import connect
+    with connect(str(db_path)) as con:
+        return con.execute("""
+            SELECT delito, categoria_delito, alcaldia_hecho, latitud, longitud, fecha_hecho, anio_hecho
+            FROM crimes_raw WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+        """).df()
+
+
+@case("data.load_crime_data")
+def _load_crime_data(db_path, rows):
+    from crime_core.data import load_crime_data
+    return lambda: load_crime_data(str(db_path), geojson_path=None)
+
+
+@case("data.clean_crime_data")
+def _clean_crime_data(db_path, rows):
+    from crime_core.data import clean_crime_data
+    raw = _raw_crimes(db_path)
+    return lambda: clean_crime_data(raw.copy())
+
+
+@case("data.compact_crime_frame")
+def _compact_crime_frame(db_path, rows):
+    from crime_core.data import clean_crime_data, compact_crime_frame
+    cleaned = clean_crime_data(_raw_crimes(db_path))
+    return lambda: compact_crime_frame(cleaned)
+
+
+@case("data.load_robbery_matrix")
+def _load_robbery_matrix(db_path, rows):
+    from crime_core.data import load_robbery_matrix
+    return lambda: load_robbery_matrix(str(db_path))
+
+
+@case("hypothesis.family_cube")
+def _family_cube(db_path, rows):
+    from crime_core.db import connect
+    from crime_core.hypothesis import family_cube
+
+    def run():
+        with connect(str(db_path)) as con:
+            return family_cube(con)
+    return run
+
+
+@case("forecast.forecast")
+def _forecast(db_path, rows):
+    """Prediction loop: every colonia x 24 h over a 7-day horizon."""
+    from crime_core.db import connect
+    from crime_core.forecast import forecast
+    from crime_core.models import get_registry
+
+    registry = get_registry()
+    name = "model_neg_tran" if "model_neg_tran" in registry.available() else registry.available()[0]
+    predictor = registry.predictor(name)
+    with connect(str(db_path)) as con:
+        colonias = con.execute("""
+            SELECT DISTINCT alcaldia_hecho, colonia_hecho FROM crimes_raw
+            WHERE alcaldia_hecho IS NOT NULL AND colonia_hecho IS NOT NULL
+        """).df()
+    return lambda: forecast(predictor, colonias, "2024-06-03", 7, model_name=name, workers=0)
+
+
+@case("forecast.day_risk")
+def _day_risk(db_path, rows):
+    """Predicciones day view: every colonia with a robbery x 24 h, one predict call."""
+    from crime_core.data import load_colonia_counts
+    from crime_core.forecast import day_risk
+    from crime_core.models import get_registry
+
+    registry = get_registry()
+    name = "model_neg_tran" if "model_neg_tran" in registry.available() else registry.available()[0]
+    predictor = registry.predictor(name)
+    colonias = load_colonia_counts("%ROBO%", str(db_path))["colonia_hecho"]
+    return lambda: day_risk(predictor, colonias, pd.Timestamp("2024-06-03"))
+
+
+@case("data.load_colonia_counts")
+def _load_colonia_counts(db_path, rows):
+    from crime_core.data import load_colonia_counts
+    return lambda: load_colonia_counts("%ROBO%", str(db_path))
+
+
+@case("grid.create_grid_sectors")
+def _create_grid_sectors(db_path, rows):
+    from crime_core.grid import create_grid_sectors
+    points = _raw_crimes(db_path)
+    return lambda: create_grid_sectors(points, 0.5)
+
+
+@case("grid.build_grid_pyramid")
+def _build_grid_pyramid(db_path, rows):
+    """All ten slider sizes (0.5-5 km) with per-hour counts, from one binning."""
+    from crime_core.data import load_crime_data
+    from crime_core.grid import build_grid_pyramid
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    return lambda: build_grid_pyramid(points)
+
+
+@case("density.kde_surface")
+def _kde_surface(db_path, rows):
+    """Zonas calientes: FFT smoothing of the base grid at 1 km and its hot-zone contours."""
+    from crime_core.data import load_crime_data
+    from crime_core.density import hotspot_polygons, kde_surface
+    from crime_core.grid import GRID_BASE_KM, build_grid_pyramid
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    level = build_grid_pyramid(points).level(GRID_BASE_KM)
+    return lambda: hotspot_polygons(kde_surface(level, 1.0))
+
+
+@case("hotspots.hotspot_cells")
+def _hotspot_cells(db_path, rows):
+    """Gi* over every 0.5 km cell (3x3 neighbourhoods) with the FDR correction."""
+    from crime_core.data import load_crime_data
+    from crime_core.grid import GRID_BASE_KM, build_grid_pyramid
+    from crime_core.hotspots import hotspot_cells
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    level = build_grid_pyramid(points).level(GRID_BASE_KM)
+    return lambda: hotspot_cells(level, 1)
+
+
+@case("spacetime.append_week")
+def _append_week(db_path, rows):
+    """Weekly update of the space-time cube: only the last week's crimes are binned."""
+    from dataclasses import replace
+
+    from crime_core.data import load_crime_data
+    from crime_core.spacetime import build_space_time_cube, week_index
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    week = week_index(points["fecha_hecho"])
+    cube = build_space_time_cube(points[week < week.max()])
+    new = points[week == week.max()]
+    # The new week is a new slice, so append pads a copy and never touches `cube`
+    return lambda: replace(cube).append(new)
+
+
+@case("spacetime.emerging_hotspots")
+def _emerging_hotspots(db_path, rows):
+    """Weekly Gi* over the 1 km cube and Mann-Kendall trends of every studied cell."""
+    from crime_core.data import load_crime_data
+    from crime_core.spacetime import build_space_time_cube, classify_emerging, emerging_hotspots
+    # Sanity check: a cell hot on and off but not in the last week is still a hot spot
+    sporadic = np.zeros((1, 12), dtype=bool)
+    sporadic[0, [2, 5, 8]] = True
+    if classify_emerging(sporadic, np.zeros(1), np.ones(1))[0] != "Esporádico":
+        raise AssertionError("classify_emerging dejó sin categoría un punto caliente esporádico")
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    cube = build_space_time_cube(points)
+    result = emerging_hotspots(cube)
+    if result.loc[result["hot_weeks"] > 0, "category"].isna().any():
+        raise AssertionError("emerging_hotspots dejó sin categoría celdas que fueron puntos calientes")
+    return lambda: emerging_hotspots(cube)
+
+
+@case("proximity.poi_crime_counts")
+def _poi_crime_counts(db_path, rows):
+    """Tree over every crime plus 2,000 synthetic points of interest at the five page radii."""
+    from crime_core.proximity import build_crime_index, poi_crime_counts
+    points = _raw_crimes(db_path)
+    rng = np.random.default_rng(0)
+    pois = points.sample(2_000, replace=True, random_state=0)[["latitud", "longitud"]].rename(
+        columns={"latitud": "lat", "longitud": "lon"},
+    )
+    pois = pois.assign(name=[f"poi_{i}" for i in range(len(pois))], lat=pois["lat"] + rng.normal(0, 0.002, len(pois)))
+    return lambda: poi_crime_counts(build_crime_index(points), pois)
+
+
+@case("proximity.radius_report")
+def _radius_report(db_path, rows):
+    """Mapa radius query: 500 m around the centre over the last 30 days, on a prebuilt index."""
+    from crime_core.data import load_crime_data
+    from crime_core.proximity import build_crime_index, radius_report
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    index = build_crime_index(points)
+    end = points["fecha_hecho"].max()
+    return lambda: radius_report(index, points, 19.43, -99.13, 500, end - pd.Timedelta(days=30), end)
+
+
+@case("viewport.build_hex_pyramid")
+def _build_hex_pyramid(db_path, rows):
+    from crime_core.data import load_crime_data
+    from crime_core.viewport import build_hex_pyramid
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    return lambda: build_hex_pyramid(points)
+
+
+@case("viewport.viewport_layer")
+def _viewport_layer(db_path, rows):
+    """One pan of the viewport map: hexagons over the city at zoom 12, then the points of a zoom-16 view."""
+    from crime_core.data import load_crime_data
+    from crime_core.maps import viewport_layer_data
+    from crime_core.proximity import build_crime_index
+    from crime_core.viewport import Viewport, build_hex_pyramid, viewport_layer
+    points, _ = load_crime_data(str(db_path), geojson_path=None)
+    index, pyramid = build_crime_index(points), build_hex_pyramid(points)
+    city = Viewport(19.2, -99.3, 19.6, -98.95, 12)
+    street = Viewport(19.42, -99.145, 19.435, -99.125, 16)
+
+    def run():
+        for viewport in (city, street):
+            viewport_layer_data(viewport_layer(index, pyramid, points, viewport))
+
+    return run
+
+
+@case("hexgrid.latlng_to_cell")
+def _latlng_to_cell(db_path, rows):
+    from crime_core.hexgrid import latlng_to_cell
+    points = _raw_crimes(db_path)
+    return lambda: latlng_to_cell(points["latitud"], points["longitud"], 5)
+
+
+@case("scoping.scoped_hex_cells")
+def _scoped_hex_cells(db_path, rows):
+    """Public hexagon counts at 250 m, ids computed in SQL (no stored hex_r* columns)."""
+    from crime_core.db import connect
+    from crime_core.scoping import profile_for, scoped_hex_cells
+
+    profile = profile_for("Visitante", None)
+
+    def run():
+        with connect(str(db_path)) as con:
+            return scoped_hex_cells(con, profile, 5)
+    return run
+
+
+@case("maps.grid_layer_html")
+def _grid_layer_html(db_path, rows):
+    """Grid layer of the Mapa page at 0.5 km, rendered to HTML as the page does."""
+    from crime_core.grid import create_grid_sectors
+    from crime_core.maps import add_grid_to_map, create_base_map
+
+    points = _raw_crimes(db_path)
+    lat_bins, lon_bins, grid_counts, grid_probs = create_grid_sectors(points, 0.5)
+
+    def run():
+        m = create_base_map(points)
+        add_grid_to_map(m, lat_bins, lon_bins, grid_counts, grid_probs, 0)
+        return m._repr_html_()
+    return run
+
+
+@case("grid.timeline_groups")
+def _timeline_groups(db_path, rows):
+    from crime_core.grid import timeline_groups
+    points = _raw_crimes(db_path)
+    points["fecha_hecho"] = pd.to_datetime(points["fecha_hecho"])
+    return lambda: timeline_groups(points, 24)
+
+
+RETRIEVAL_COLS = ["delito", "categoria_delito", "alcaldia_hecho", "fecha_hecho"]
+# Questions like the ones asked on the Chat page
+RETRIEVAL_QUERIES = (
+    "robos a transeúnte en Iztapalapa",
+    "homicidios en Gustavo A. Madero durante 2023",
+    "robo a negocio con violencia en Cuauhtémoc",
+    "violencia familiar en Tlalpan",
+    "robo de vehículo en Coyoacán en diciembre",
+)
+
+
+@case("retrieval.build_corpus_vectors")
+def _build_corpus_vectors(db_path, rows):
+    from crime_core.retrieval import build_corpus_vectors
+    corpus = _raw_crimes(db_path).head(50_000)
+    return lambda: build_corpus_vectors(corpus, RETRIEVAL_COLS)
+
+
+@case("retrieval.retrieve")
+def _retrieve(db_path, rows):
+    """Top-3 rows (the Chat default) for each of RETRIEVAL_QUERIES against the built 50k-row corpus."""
+    from crime_core.retrieval import build_corpus_vectors, retrieve
+    _, vectorizer, X = build_corpus_vectors(_raw_crimes(db_path).head(50_000), RETRIEVAL_COLS)
+
+    def run():
+        for query in RETRIEVAL_QUERIES:
+            retrieve(vectorizer, X, query, 3)
+    return run
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import duckdb
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "duckdb": duckdb.__version__,
+    }
+
+
+def run(scales, patterns=("*",), repeat=3, seed=0):
+    names = [n for n in CASES if any(fnmatch.fnmatch(n, p) for p in patterns)]
+    results = []
+    for scale in scales:
+        rows = parse_rows(scale)
+        db_path = ensure_dataset(rows, seed)
+        for name in names:
+            entry = {"case": name, "rows": rows}
+            try:
+                fn = CASES[name](db_path, rows)
+                n_runs = 1 if rows >= SINGLE_RUN_ROWS else repeat
+                rss_before = rss_bytes()
+                entry["seconds"] = _best_time(fn, n_runs)
+                rss_after = rss_bytes()
+                entry["runs"] = n_runs
+                if None not in (rss_before, rss_after):
+                    entry["rss_delta_mb"] = round((rss_after - rss_before) / 2**20, 2)
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+            results.append(entry)
+            status = f"{entry['seconds'] * 1000:,.1f} ms" if "seconds" in entry else entry["error"]
+            print(f"  {name:<32}{rows:>12,}  {status}", file=sys.stderr)
+    return {"meta": environment(), "results": results}
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Table of seconds now vs. baseline per (case, rows), and the regressions."""
+    now = pd.DataFrame(report["results"])
+    before = pd.DataFrame(baseline["results"])
+    if "seconds" not in now or "seconds" not in before:
+        return pd.DataFrame(), []
+    table = now[["case", "rows", "seconds"]].merge(
+        before[["case", "rows", "seconds"]], on=["case", "rows"], how="left", suffixes=("", "_base"),
+    )
+    table["ratio"] = table["seconds"] / table["seconds_base"]
+    regressions = table[table["ratio"] > threshold]
+    return table, list(zip(regressions["case"], regressions["rows"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="*", default=list(DEFAULT_SCALES), help=f"De {', '.join(SCALES)} o enteros")
+    parser.add_argument("--cases", nargs="*", default=["*"], help="Patrones de nombre (fnmatch)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Ruta opcional para guardar el reporte")
+    parser.add_argument("--compare", help="Reporte JSON previo contra el cual comparar")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(args.scales, args.cases, args.repeat, args.seed)
+    results = pd.DataFrame(report["results"])
+
+    regressions = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        table, regressions = compare(report, baseline, args.threshold)
+        report["baseline"] = baseline["meta"]
+        print(f"vs {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+        print(table.assign(ms=table["seconds"] * 1000, ms_base=table["seconds_base"] * 1000)
+              [["case", "rows", "ms", "ms_base", "ratio"]].to_string(index=False, float_format="{:,.2f}".format))
+    elif "seconds" in results:
+        table = results.pivot_table(index="case", columns="rows", values="seconds") * 1000
+        print(table.to_string(float_format="{:,.1f}".format), "\n(ms)")
+
+    failed = results[results["error"].notna()] if "error" in results else results.iloc[:0]
+    for _, row in failed.iterrows():
+        print(f"error {row['case']} @ {row['rows']:,}: {row['error']}", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print("Regresiones: " + ", ".join(f"{c} @ {r:,}" for c, r in regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
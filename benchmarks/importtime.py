@@ -0,0 +1,124 @@
+"""
+Import-cost regression check for the app and its pages.
+
+    python -m benchmarks.importtime [--repeat 3] [--update] [--json out.json]
+
+For every script the module-level imports are pulled out with `ast` (so the
+page itself is never executed) and run in a fresh interpreter under
+`python -X importtime`. Streamlit is imported first and excluded, since every
+page pays for it anyway; the rest is the page's own import cost. The best of
+`--repeat` runs is compared against `importtime_budget.json` and the run
+exits with status 1 when a script goes over budget * (1 + tolerance)
+(with a small absolute slack for tiny budgets).
+`--update` rewrites the budget from the current measurements.
+"""
+import argparse
+import ast
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_PATH = Path(__file__).resolve().parent / "importtime_budget.json"
+SCRIPTS = ["app.py", "pages/EDA.py", "pages/Predicciones.py", "pages/Mapa.py", "pages/Chat.py", "pages/Rendimiento.py"]
+BASELINE_MODULE = "streamlit"
+DEFAULT_TOLERANCE = 0.25
+# Budgets are written with this much headroom over the measurement
+UPDATE_HEADROOM = 1.2
+# Absolute slack so near-zero budgets (app.py) do not fail on timer noise
+MIN_SLACK_MS = 25
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def module_imports(path):
+    """Source of the `import` statements at module level of `path`."""
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    stmts = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(node) for node in stmts)
+
+
+def measure(script, python=sys.executable):
+    """
+    Import cost of `script` in milliseconds, plus the top-level modules it
+    pulled in with their cumulative cost.
+    """
+    code = f"import {BASELINE_MODULE}\n{module_imports(ROOT / script)}"
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script}: {proc.stderr.strip().splitlines()[-1]}")
+
+    modules = {}
+    past_baseline = False
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        if indent:
+            continue
+        # Top-level entries are printed after their dependencies
+        if not past_baseline:
+            past_baseline = name == BASELINE_MODULE
+            continue
+        modules[name] = int(cumulative) / 1000
+    return sum(modules.values()), modules
+
+
+def run(scripts, repeat):
+    results = {}
+    for script in scripts:
+        runs = [measure(script) for _ in range(repeat)]
+        total, modules = min(runs, key=lambda r: r[0])
+        heaviest = sorted(modules.items(), key=lambda kv: -kv[1])[:5]
+        results[script] = {"ms": round(total, 1), "heaviest": [[m, round(ms, 1)] for m, ms in heaviest]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scripts", nargs="*", default=SCRIPTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=None)
+    parser.add_argument("--update", action="store_true", help="Reescribir el presupuesto con estas mediciones")
+    parser.add_argument("--json", help="Ruta opcional para guardar el reporte")
+    args = parser.parse_args()
+
+    results = run(args.scripts, args.repeat)
+    budget = json.loads(BUDGET_PATH.read_text()) if BUDGET_PATH.exists() else {"tolerance": DEFAULT_TOLERANCE, "ms": {}}
+    tolerance = args.tolerance if args.tolerance is not None else budget.get("tolerance", DEFAULT_TOLERANCE)
+
+    failed = []
+    print(f"{'script':<24}{'ms':>10}{'budget':>10}  heaviest")
+    for script, res in results.items():
+        limit = budget["ms"].get(script)
+        over = limit is not None and res["ms"] > max(limit * (1 + tolerance), limit + MIN_SLACK_MS)
+        if over:
+            failed.append(script)
+        heaviest = ", ".join(f"{m} {ms:.0f}" for m, ms in res["heaviest"][:3])
+        print(f"{script:<24}{res['ms']:>10.1f}{limit if limit is not None else '-':>10}  {heaviest}{'  <-- OVER' if over else ''}")
+
+    if args.update:
+        budget["ms"].update({s: round(r["ms"] * UPDATE_HEADROOM) for s, r in results.items()})
+        budget.setdefault("tolerance", DEFAULT_TOLERANCE)
+        BUDGET_PATH.write_text(json.dumps(budget, indent=2) + "\n")
+        print(f"Presupuesto actualizado en {BUDGET_PATH}")
+        failed = []
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"tolerance": tolerance, "results": results, "failed": failed}, f, indent=2)
+
+    if failed:
+        print(f"FALLA: sobre presupuesto: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
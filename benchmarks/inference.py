@@ -0,0 +1,96 @@
+"""
+Parity check and timing of the inference backends in crime_core.inference.
+
+    python -m benchmarks.inference [--models model_hom_fem ...] [--repeat 5]
+
+Every backend is first compared against the sklearn `model.predict(DataFrame)`
+path on the same random inputs (including missing values); the run exits with
+status 1 if any backend disagrees. Timings are the best of `--repeat` runs.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from crime_core.inference import FastPredictor
+from crime_core.models import get_registry
+
+BATCH_SIZES = (24, 240, 2_400, 24_000, 100_000)
+BACKENDS = ("sklearn", "inplace", "numpy", "auto")
+TOLERANCE = 1e-4
+
+
+def make_inputs(n_rows, n_features, seed=0):
+    """Random integer-valued features in the ranges used by Predicciones."""
+    rng = np.random.default_rng(seed)
+    highs = [24, 7, 13, 1000] + [100] * max(0, n_features - 4)
+    X = np.column_stack([rng.integers(0, h, n_rows) for h in highs[:n_features]]).astype(np.float32)
+    X[rng.random(X.shape) < 0.01] = np.nan
+    return X
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(model_names, batch_sizes=BATCH_SIZES, repeat=5):
+    registry = get_registry()
+    report = {"parity": {}, "timings": []}
+    for name in model_names:
+        model = registry.get(name)
+        predictors = {b: FastPredictor(model, backend=b) for b in BACKENDS}
+        columns = predictors["sklearn"].feature_names
+        n_features = len(columns)
+
+        X = make_inputs(max(batch_sizes), n_features)
+        reference = model.predict(pd.DataFrame(X, columns=columns))
+        report["parity"][name] = {
+            b: float(np.max(np.abs(p.predict(X) - reference))) for b, p in predictors.items()
+        }
+
+        for n in batch_sizes:
+            batch = X[:n]
+            for backend, predictor in predictors.items():
+                seconds = best_time(lambda: predictor.predict(batch), repeat if n < 50_000 else 1)
+                report["timings"].append({
+                    "model": name, "backend": backend, "rows": n,
+                    "seconds": seconds, "rows_per_second": n / seconds,
+                })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", nargs="*", help="Modelos a medir (por defecto todos)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Ruta opcional para guardar el reporte")
+    args = parser.parse_args()
+
+    names = args.models or get_registry().available()
+    report = run(names, repeat=args.repeat)
+
+    timings = pd.DataFrame(report["timings"])
+    table = timings.pivot_table(index=["model", "rows"], columns="backend", values="seconds")
+    print((table * 1000).round(3).to_string(float_format="{:,.3f}".format), "\n(ms)")
+
+    failed = {m: d for m, d in report["parity"].items() if max(d.values()) > TOLERANCE}
+    for model, diffs in report["parity"].items():
+        print(f"parity {model}: " + ", ".join(f"{b}={d:.2e}" for b, d in diffs.items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        print(f"Paridad fallida: {sorted(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Synthetic `crimes_raw` tables shaped like the FGJ CDMX open data.
+
+    python -m benchmarks.synthetic --rows 100000 [--seed 0] [--out path.db]
+
+The real `crimes_fgj.db` is a Git LFS object and is usually missing in
+clones; these tables let the benchmarks run anywhere with the same schema
+and realistic distributions: the 16 alcaldías weighted by their share of
+reports, points scattered around each alcaldía inside the CDMX bounding box
+(19.0–19.6, -99.4 – -98.9), Zipf-distributed colonias, delitos covering the
+families in `crime_core.series.CRIME_FAMILIES`, an evening-heavy hour
+profile and 2016–2024 dates. A few percent of rows carry the defects the
+cleaning code handles (missing coordinates, missing or indeterminate
+alcaldía).
+
+Random codes are drawn with NumPy in chunks and turned into strings and
+dates inside DuckDB, so 10M rows take seconds, not minutes.
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+# Bump when the distributions change so cached datasets are regenerated
+GENERATOR_VERSION = 1
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+CHUNK_ROWS = 1_000_000
+
+# alcaldía -> (lat, lon of the populated centre, share of reports, spread in degrees)
+ALCALDIAS = {
+    "ALVARO OBREGON": (19.365, -99.225, 0.070, 0.020),
+    "AZCAPOTZALCO": (19.485, -99.185, 0.040, 0.012),
+    "BENITO JUAREZ": (19.375, -99.160, 0.075, 0.010),
+    "COYOACAN": (19.330, -99.150, 0.070, 0.015),
+    "CUAJIMALPA DE MORELOS": (19.360, -99.290, 0.015, 0.015),
+    "CUAUHTEMOC": (19.430, -99.150, 0.150, 0.012),
+    "GUSTAVO A. MADERO": (19.490, -99.110, 0.105, 0.020),
+    "IZTACALCO": (19.395, -99.100, 0.040, 0.010),
+    "IZTAPALAPA": (19.355, -99.060, 0.160, 0.022),
+    "LA MAGDALENA CONTRERAS": (19.315, -99.240, 0.015, 0.012),
+    "MIGUEL HIDALGO": (19.430, -99.200, 0.060, 0.014),
+    "MILPA ALTA": (19.190, -99.020, 0.010, 0.030),
+    "TLAHUAC": (19.285, -99.010, 0.025, 0.015),
+    "TLALPAN": (19.280, -99.170, 0.060, 0.025),
+    "VENUSTIANO CARRANZA": (19.430, -99.100, 0.060, 0.012),
+    "XOCHIMILCO": (19.255, -99.100, 0.030, 0.020),
+}
+
+# delito -> (categoria_delito, share of reports)
+DELITOS = {
+    "VIOLENCIA FAMILIAR": ("DELITO DE BAJO IMPACTO", 0.14),
+    "FRAUDE": ("DELITO DE BAJO IMPACTO", 0.09),
+    "AMENAZAS": ("DELITO DE BAJO IMPACTO", 0.08),
+    "ROBO A TRANSEUNTE EN VIA PUBLICA CON VIOLENCIA": ("ROBO A TRANSEUNTE EN VIA PUBLICA CON Y SIN VIOLENCIA", 0.07),
+    "ROBO A TRANSEUNTE EN VIA PUBLICA SIN VIOLENCIA": ("ROBO A TRANSEUNTE EN VIA PUBLICA CON Y SIN VIOLENCIA", 0.04),
+    "ROBO A NEGOCIO SIN VIOLENCIA": ("DELITO DE BAJO IMPACTO", 0.07),
+    "ROBO A NEGOCIO CON VIOLENCIA": ("ROBO A NEGOCIO CON VIOLENCIA", 0.02),
+    "ROBO A PASAJERO A BORDO DE TRANSPORTE PUBLICO CON VIOLENCIA": ("ROBO A PASAJERO A BORDO DE MICROBUS CON Y SIN VIOLENCIA", 0.02),
+    "ROBO A TRANSPORTISTA CON VIOLENCIA": ("ROBO A TRANSPORTISTA CON Y SIN VIOLENCIA", 0.01),
+    "ROBO DE OBJETOS DEL INTERIOR DE UN VEHICULO": ("DELITO DE BAJO IMPACTO", 0.05),
+    "ROBO DE ACCESORIOS DE AUTO": ("DELITO DE BAJO IMPACTO", 0.04),
+    "ROBO DE VEHICULO DE SERVICIO PARTICULAR SIN VIOLENCIA": ("ROBO DE VEHICULO CON Y SIN VIOLENCIA", 0.05),
+    "ROBO A CASA HABITACION SIN VIOLENCIA": ("DELITO DE BAJO IMPACTO", 0.03),
+    "DANO EN PROPIEDAD AJENA INTENCIONAL": ("DELITO DE BAJO IMPACTO", 0.05),
+    "LESIONES INTENCIONALES POR GOLPES": ("DELITO DE BAJO IMPACTO", 0.04),
+    "ABUSO DE CONFIANZA": ("DELITO DE BAJO IMPACTO", 0.04),
+    "HOMICIDIO DOLOSO": ("HOMICIDIO DOLOSO", 0.01),
+    "HOMICIDIO CULPOSO POR TRANSITO VEHICULAR": ("DELITO DE BAJO IMPACTO", 0.01),
+    "VIOLACION": ("VIOLACION", 0.005),
+}
+
+# Relative frequency of each hour of the day (evening peak, quiet early morning)
+HOUR_WEIGHTS = np.array([
+    5, 3, 2, 1.5, 1.2, 1.2, 2, 3, 4.5, 5.5, 6, 6.5,
+    8, 7.5, 7, 7, 7, 7.5, 8, 8.5, 8, 7, 6, 5.5,
+])
+
+COLONIAS_PER_ALCALDIA = 80
+FIRST_DAY = pd.Timestamp("2016-01-01")
+N_DAYS = (pd.Timestamp("2024-12-31") - FIRST_DAY).days + 1
+
+# Share of rows with the defects the cleaning code handles
+MISSING_COORDS = 0.03
+MISSING_ALCALDIA = 0.01
+INDETERMINATE_ALCALDIA = 0.005
+
+BBOX = (19.0, 19.6, -99.4, -98.9)
+
+
+def _normalized(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def _chunk(rng, n):
+    """Random codes for `n` rows; strings and dates are resolved in SQL."""
+    alcaldia = rng.choice(len(ALCALDIAS), n, p=_normalized([a[2] for a in ALCALDIAS.values()]))
+    centres = np.array([(a[0], a[1], a[3]) for a in ALCALDIAS.values()])
+    lat = rng.normal(centres[alcaldia, 0], centres[alcaldia, 2])
+    lon = rng.normal(centres[alcaldia, 1], centres[alcaldia, 2])
+    lat = np.clip(lat, BBOX[0] + 1e-4, BBOX[1] - 1e-4)
+    lon = np.clip(lon, BBOX[2] + 1e-4, BBOX[3] - 1e-4)
+    no_coords = rng.random(n) < MISSING_COORDS
+    lat[no_coords] = np.nan
+    lon[no_coords] = np.nan
+
+    # Zipf-like colonias: a few colonias concentrate most reports
+    colonia = np.minimum(rng.zipf(1.6, n) - 1, COLONIAS_PER_ALCALDIA - 1)
+
+    u = rng.random(n)
+    alcaldia_flag = np.where(u < MISSING_ALCALDIA, 1, np.where(u < MISSING_ALCALDIA + INDETERMINATE_ALCALDIA, 2, 0))
+
+    day = rng.integers(0, N_DAYS, n)
+    return pd.DataFrame({
+        "alcaldia": alcaldia.astype(np.int16),
+        "alcaldia_flag": alcaldia_flag.astype(np.int8),
+        "colonia": colonia.astype(np.int16),
+        "delito": rng.choice(len(DELITOS), n, p=_normalized([d[1] for d in DELITOS.values()])).astype(np.int16),
+        "lat": lat,
+        "lon": lon,
+        "day": day.astype(np.int32),
+        "second": (rng.choice(24, n, p=_normalized(HOUR_WEIGHTS)) * 3600 + rng.integers(0, 3600, n)).astype(np.int32),
+        "report_lag": np.minimum(rng.geometric(0.4, n) - 1, 365).astype(np.int16),
+    })
+
+
+def generate(path, rows, seed=0):
+    """Write a synthetic `crimes_raw` table with `rows` rows to the DuckDB file `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    rng = np.random.default_rng(seed)
+
+    con = duckdb.connect(str(tmp))
+    try:
+        con.register("alcaldias_df", pd.DataFrame({"id": range(len(ALCALDIAS)), "nombre": list(ALCALDIAS)}))
+        con.register("delitos_df", pd.DataFrame({
+            "id": range(len(DELITOS)),
+            "delito": list(DELITOS),
+            "categoria": [d[0] for d in DELITOS.values()],
+        }))
+        con.execute("""
+            CREATE TABLE crimes_raw (
+                delito VARCHAR, categoria_delito VARCHAR, alcaldia_hecho VARCHAR,
+                colonia_hecho VARCHAR, latitud DOUBLE, longitud DOUBLE,
+                fecha_hecho VARCHAR, hora_hecho VARCHAR, anio_hecho INTEGER,
+                fecha_inicio VARCHAR
+            )
+        """)
+        done = 0
+        while done < rows:
+            chunk = _chunk(rng, min(CHUNK_ROWS, rows - done))
+            con.register("chunk", chunk)
+            con.execute(f"""
+                INSERT INTO crimes_raw
+                SELECT
+                    d.delito,
+                    d.categoria,
+                    CASE c.alcaldia_flag WHEN 1 THEN NULL WHEN 2 THEN 'CDMX (indeterminada)' ELSE a.nombre END,
+                    'COL ' || left(a.nombre, 5) || ' ' || lpad(CAST(c.colonia AS VARCHAR), 2, '0'),
+                    c.lat,
+                    c.lon,
+                    strftime(DATE '{FIRST_DAY.date()}' + c.day, '%Y-%m-%d'),
+                    CAST(TIME '00:00:00' + to_seconds(c.second) AS VARCHAR),
+                    year(DATE '{FIRST_DAY.date()}' + c.day),
+                    strftime(DATE '{FIRST_DAY.date()}' + c.day + c.report_lag, '%Y-%m-%d')
+                FROM chunk c
+                JOIN alcaldias_df a ON a.id = c.alcaldia
+                JOIN delitos_df d ON d.id = c.delito
+            """)
+            con.unregister("chunk")
+            done += len(chunk)
+    finally:
+        con.close()
+    os.replace(tmp, path)
+    return path
+
+
+def dataset_path(rows, seed=0, data_dir=DATA_DIR):
+    return Path(data_dir) / f"crimes_v{GENERATOR_VERSION}_{rows}_s{seed}.db"
+
+
+def ensure_dataset(rows, seed=0, data_dir=DATA_DIR):
+    """Path of the cached synthetic DB for (rows, seed), generating it if needed."""
+    path = dataset_path(rows, seed, data_dir)
+    if not path.exists():
+        generate(path, rows, seed)
+    return path
+
+
+def parse_rows(value):
+    """'100k', '1m' or a plain integer."""
+    return SCALES.get(str(value).lower()) or int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="100k", help="Filas: 10k, 100k, 1m, 10m o un entero")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Ruta de la BD (por defecto, la caché en benchmarks/.data)")
+    args = parser.parse_args()
+
+    rows = parse_rows(args.rows)
+    start = time.perf_counter()
+    path = generate(args.out, rows, args.seed) if args.out else ensure_dataset(rows, args.seed)
+    print(f"{rows:,} filas en {path} ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Leaflet map that reports its viewport back to the app.
+
+The component shows a folium map (the static layers: tiles, alcaldías,
+points of interest) in its frame and draws one more layer over it, the
+crimes of the visible area (crime_core.maps.viewport_layer_data). After
+every pan or zoom it returns the bounds and zoom, so the page reruns and
+sends only the new layer: the folium map is reloaded only when its HTML
+changes, and the view is kept when it is.
+"""
+from pathlib import Path
+
+import streamlit.components.v1 as components
+
+from crime_core.viewport import Viewport
+
+_component = components.declare_component("viewport_map", path=str(Path(__file__).parent / "frontend"))
+
+
+def current_viewport(value):
+    """Viewport from a value returned by `viewport_map`; the whole city before the map has reported one."""
+    if not value:
+        return Viewport.default()
+    return Viewport.from_bounds(value["bounds"], value["zoom"])
+
+
+def viewport_map(html, layer, height=600, key=None):
+    """
+    Show the folium `html` with `layer` drawn over it. Returns the last
+    viewport the map reported, {"bounds": [[south, west], [north, east]],
+    "zoom": z}, or None before the first one.
+    """
+    return _component(html=html, layer=layer, height=height, key=key, default=None)
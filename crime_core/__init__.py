@@ -0,0 +1,6 @@
+"""
+Headless core of the crime dashboard.
+
+Everything in this package is importable without Streamlit so it can be
+reused by the pages, background warm-up, batch jobs and benchmarks.
+"""
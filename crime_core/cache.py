@@ -0,0 +1,309 @@
+"""
+Process-wide result cache for query results and other derived data.
+
+Entries are keyed on (namespace, arguments), where the arguments are cheap
+values such as the SQL filter, a `QueryProfile` or a tuple of selected
+categories; DataFrames are never hashed to build a key. Every namespace
+shares one memory budget, and the least recently used entries are evicted
+once it is exceeded. With a disk directory configured, evicted entries are
+pickled there and a later miss in memory reads them back, so an expensive
+result (an OSM download, a large query) survives memory pressure.
+
+Values are handed out as-is, not copied: callers must not mutate them.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Overrides for the shared cache (see get_result_cache)
+MAX_MB_ENV = "CRIME_CACHE_MAX_MB"
+DISK_DIR_ENV = "CRIME_CACHE_DIR"
+DISK_MAX_MB_ENV = "CRIME_CACHE_DISK_MAX_MB"
+DEFAULT_DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+def estimate_size(value):
+    """Approximate memory held by `value`, in bytes."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True, index=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray) or hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if hasattr(value, "indptr") and hasattr(value, "indices"):  # scipy.sparse
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if isinstance(value, (tuple, list)):
+        return 64 + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024
+
+
+def _check_key_part(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        raise TypeError(
+            f"{type(value).__name__} no es una clave válida: use los filtros que lo generan "
+            "o un argumento con prefijo '_' para excluirlo"
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            _check_key_part(item)
+
+
+def make_key(*parts):
+    """Hashable key from plain values; lists and sets become tuples."""
+    def _freeze(value):
+        _check_key_part(value)
+        if isinstance(value, (list, tuple)):
+            return tuple(_freeze(v) for v in value)
+        if isinstance(value, (set, frozenset)):
+            return tuple(sorted((_freeze(v) for v in value), key=repr))
+        if isinstance(value, dict):
+            return tuple((k, _freeze(value[k])) for k in sorted(value, key=repr))
+        return value
+
+    return tuple(_freeze(p) for p in parts)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires")
+
+    def __init__(self, value, size, expires):
+        self.value = value
+        self.size = size
+        self.expires = expires
+
+
+class ResultCache:
+    """Thread-safe LRU of computed results, bounded by estimated bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._namespaces = {}
+        # Namespaces whose evicted entries go to the disk tier
+        self._spill = set()
+
+    # ------------------------------------------------------------------ stats
+
+    def _count(self, namespace, event, n=1):
+        counters = self._namespaces.setdefault(
+            namespace, {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "spills": 0}
+        )
+        counters[event] += n
+
+    def stats(self):
+        with self._lock:
+            per_namespace = {ns: dict(c, entries=0, bytes=0) for ns, c in self._namespaces.items()}
+            for (namespace, _), entry in self._entries.items():
+                per_namespace[namespace]["entries"] += 1
+                per_namespace[namespace]["bytes"] += entry.size
+            totals = {k: sum(c[k] for c in self._namespaces.values())
+                      for k in ("hits", "misses", "disk_hits", "evictions", "spills")}
+            lookups = totals["hits"] + totals["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                **totals,
+                "hit_rate": totals["hits"] / lookups if lookups else 0.0,
+                "namespaces": per_namespace,
+            }
+
+    # ------------------------------------------------------------------ disk tier
+
+    def _disk_path(self, cache_key):
+        digest = hashlib.blake2b(repr(cache_key).encode(), digest_size=16).hexdigest()
+        return self.disk_dir / f"{cache_key[0]}-{digest}.pkl"
+
+    def _disk_read(self, cache_key):
+        path = self._disk_path(cache_key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, expires, value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if stored_key != cache_key or (expires is not None and expires < time.time()):
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return _Entry(value, estimate_size(value), expires)
+
+    def _disk_write(self, cache_key, entry):
+        path = self._disk_path(cache_key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((cache_key, entry.expires, entry.value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            return False
+        self._trim_disk()
+        return True
+
+    def _trim_disk(self):
+        files = sorted(self.disk_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for path in files:
+            if total <= self.disk_max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------ memory tier
+
+    def _lookup(self, cache_key):
+        """Entry for `cache_key` in memory, dropping it if it expired. Caller holds the lock."""
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        if entry.expires is not None and entry.expires < time.time():
+            del self._entries[cache_key]
+            self._bytes -= entry.size
+            return None
+        self._entries.move_to_end(cache_key)
+        return entry
+
+    def _store(self, cache_key, entry):
+        """Insert and evict down to the budget; returns the evicted (key, entry) pairs."""
+        evicted = []
+        with self._lock:
+            if entry.size > self.max_bytes:
+                return [(cache_key, entry)]
+            old = self._entries.pop(cache_key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[cache_key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                key, victim = self._entries.popitem(last=False)
+                self._bytes -= victim.size
+                self._count(key[0], "evictions")
+                evicted.append((key, victim))
+        return evicted
+
+    def _spill_evicted(self, evicted):
+        if self.disk_dir is None:
+            return
+        for key, entry in evicted:
+            if key[0] in self._spill and self._disk_write(key, entry):
+                with self._lock:
+                    self._count(key[0], "spills")
+
+    # ------------------------------------------------------------------ public API
+
+    def get_or_compute(self, namespace, key, compute, ttl=None, disk=False):
+        """
+        Cached result of `compute()` for (namespace, key). Concurrent callers
+        with the same key wait for a single computation. `ttl` is in seconds;
+        `disk=True` lets evicted entries of this namespace spill to disk.
+        """
+        cache_key = (namespace, make_key(key))
+        with self._lock:
+            if disk:
+                self._spill.add(namespace)
+            entry = self._lookup(cache_key)
+            if entry is not None:
+                self._count(namespace, "hits")
+                return entry.value
+            key_lock = self._key_locks.setdefault(cache_key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(cache_key)
+                if entry is not None:
+                    self._count(namespace, "hits")
+                    return entry.value
+
+            # The key lock is dropped even when compute() raises, so failed keys do not pile up
+            try:
+                entry = self._disk_read(cache_key) if disk and self.disk_dir is not None else None
+                if entry is not None:
+                    with self._lock:
+                        self._count(namespace, "disk_hits")
+                else:
+                    value = compute()
+                    expires = time.time() + ttl if ttl is not None else None
+                    entry = _Entry(value, estimate_size(value), expires)
+                    with self._lock:
+                        self._count(namespace, "misses")
+
+                self._spill_evicted(self._store(cache_key, entry))
+            finally:
+                with self._lock:
+                    self._key_locks.pop(cache_key, None)
+            return entry.value
+
+    def memoize(self, namespace, ttl=None, disk=False):
+        """
+        Decorator caching a function on its arguments. As with
+        `st.cache_data`, parameters whose name starts with '_' are left out
+        of the key; DataFrames and arrays are rejected as key parts.
+        """
+        def decorator(fn):
+            signature = inspect.signature(fn)
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = tuple((name, value) for name, value in bound.arguments.items()
+                            if not name.startswith("_"))
+                return self.get_or_compute(namespace, key, lambda: fn(*args, **kwargs), ttl=ttl, disk=disk)
+
+            wrapper.clear = lambda: self.clear(namespace)
+            return wrapper
+
+        return decorator
+
+    def clear(self, namespace=None):
+        """Drop every entry in memory, or only those of `namespace`."""
+        with self._lock:
+            for cache_key in [k for k in self._entries if namespace is None or k[0] == namespace]:
+                self._bytes -= self._entries.pop(cache_key).size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Process-wide result cache shared by every session and page. The budget
+    comes from CRIME_CACHE_MAX_MB; CRIME_CACHE_DIR enables the disk tier.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = os.environ.get(MAX_MB_ENV)
+            disk_max_mb = os.environ.get(DISK_MAX_MB_ENV)
+            _cache = ResultCache(
+                max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES,
+                disk_dir=os.environ.get(DISK_DIR_ENV) or None,
+                disk_max_bytes=int(float(disk_max_mb) * 1024 * 1024) if disk_max_mb else DEFAULT_DISK_MAX_BYTES,
+            )
+        return _cache
@@ -0,0 +1,353 @@
+"""
+Crime datasets and boundary layers, loaded without Streamlit.
+
+The loaders are memoized in the process-wide result cache
+(`crime_core.cache`), so the startup warm-up and every session share one
+copy within a single memory budget. Conditions the UI should surface (large dataset, missing
+columns) are returned as `notices` instead of being shown from here.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from crime_core.cache import get_result_cache
+from crime_core.db import ALCALDIAS_INVALIDAS, DB_PATH, connect
+from crime_core.hexgrid import latlng_to_cell, stored_hex_columns
+from crime_core import metrics
+from crime_core.metrics import span, timed
+from crime_core.scoping import scope_filter, select_list
+
+GEOJSON_NAME = "limite-de-las-alcaldias.json"
+
+# Same lookup order Mapa used: user downloads first, then the repo copy
+GEOJSON_CANDIDATES = [
+    Path.home() / "Downloads" / GEOJSON_NAME,
+    Path.home() / "Descargas" / GEOJSON_NAME,
+    Path(GEOJSON_NAME),
+]
+
+# geopandas sjoin is extremely heavy; above this many rows it is skipped
+SJOIN_MAX_ROWS = 5000
+
+# Hexagon resolution that places each colonia on the map (1 km edge)
+COLONIA_HEX_RES = 3
+
+_CRIME_COLUMNS = """
+    delito,
+    categoria_delito,
+    alcaldia_hecho,
+    latitud,
+    longitud,
+    fecha_hecho,
+    hour(TRY_CAST(hora_hecho AS TIME)) AS hora,
+    anio_hecho
+"""
+
+# In-memory schema of the crime frame (see compact_crime_frame): a handful
+# of distinct names become categoricals and the time fields small integers
+COMPACT_DTYPES = {
+    "delito": "category",
+    "categoria_delito": "category",
+    "alcaldia_hecho": "category",
+    "latitud": "float32",
+    "longitud": "float32",
+    "anio_hecho": "Int16",
+    "hora": "Int8",
+    "dia_semana": "Int8",
+}
+
+
+def find_geojson():
+    """Path of the alcaldía boundaries GeoJSON, or None if there is none."""
+    for path in GEOJSON_CANDIDATES:
+        if os.path.exists(path):
+            return str(path)
+    return None
+
+
+def strip_accents_capitalize(text):
+    """
+    Normalize text by removing accents and capitalizing the first letter of each word.
+    Example: "álvaro obregón norte" -> "Alvaro Obregon Norte"
+    """
+    if pd.isna(text):
+        return text
+
+    repl = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"),
+            ("Á", "A"), ("É", "E"), ("Í", "I"), ("Ó", "O"), ("Ú", "U"),
+            ("ñ", "n"), ("Ñ", "N"))
+    for a, b in repl:
+        text = text.replace(a, b)
+
+    return " ".join(w.capitalize() for w in text.split())
+
+
+def fill_missing_alcaldias(crimes_df, geojson_path, alcaldia_column="NOMGEO"):
+    """Fill missing 'alcaldia_hecho' using coordinates (spatial join)."""
+    import geopandas as gpd
+
+    coords_df = crimes_df.dropna(subset=["latitud", "longitud"]).copy()
+    if coords_df.empty:
+        return crimes_df
+
+    gdf_municipalities = gpd.read_file(geojson_path).to_crs(epsg=4326)
+    crimes_gdf = gpd.GeoDataFrame(
+        coords_df,
+        geometry=gpd.points_from_xy(coords_df["longitud"], coords_df["latitud"]),
+        crs="EPSG:4326",
+    )
+    joined = gpd.sjoin(crimes_gdf, gdf_municipalities, how="left", predicate="within")
+
+    crimes_df = crimes_df.copy()
+    subset = crimes_df.loc[coords_df.index, "alcaldia_hecho"].copy()
+    subset = subset.fillna(joined[alcaldia_column].reset_index(drop=True))
+    crimes_df.loc[coords_df.index, "alcaldia_hecho"] = subset
+    return crimes_df
+
+
+def _normalize_distinct(series, normalize):
+    """
+    `series` as a categorical after `normalize` (a Series -> Series of the
+    same length), which only sees each distinct value once: the name
+    columns repeat a few dozen values over every row.
+    """
+    codes, uniques = pd.factorize(series)
+    normalized_codes, categories = pd.factorize(normalize(pd.Series(uniques, dtype=object)), sort=True)
+    codes = np.where(codes >= 0, normalized_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=series.index, name=series.name)
+
+
+def _fill_to_unknown(df, column="alcaldia_hecho"):
+    df = df.copy()
+    df[column] = df[column].replace("CDMX (indeterminada)", "Desconocido")
+    df[column] = df[column].fillna("Desconocido")
+    return df
+
+
+@timed("data.clean_crime_data")
+def clean_crime_data(df, geojson_path=None, notices=None):
+    """
+    Clean and prepare crime data for the map. Skips the spatial join on
+    large datasets to protect memory.
+    """
+    notices = [] if notices is None else notices
+
+    if geojson_path and os.path.exists(geojson_path):
+        if len(df) < SJOIN_MAX_ROWS:
+            try:
+                df = fill_missing_alcaldias(df, geojson_path)
+            except Exception as e:
+                notices.append(f"Error al completar alcaldías: {e}")
+        else:
+            notices.append("⚠️ Dataset grande: Saltando cálculo geométrico para ahorrar memoria.")
+
+    df = _fill_to_unknown(df)
+    df["alcaldia_hecho"] = _normalize_distinct(df["alcaldia_hecho"], lambda names: names.map(strip_accents_capitalize))
+
+    df["latitud"] = pd.to_numeric(df["latitud"], errors="coerce")
+    df["longitud"] = pd.to_numeric(df["longitud"], errors="coerce")
+    df = df.dropna(subset=["latitud", "longitud"])
+
+    # Valid coordinates for Mexico City
+    df = df[(df["latitud"] >= 19.0) & (df["latitud"] <= 19.6) &
+            (df["longitud"] >= -99.4) & (df["longitud"] <= -98.9)]
+
+    for date_col in ["fecha_inicio", "fecha_hecho"]:
+        if date_col in df.columns:
+            df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+
+    # Hour of the crime (0-23, NaN if unknown) for the per-hour grid
+    if "hora" not in df.columns and "hora_hecho" in df.columns:
+        df["hora"] = pd.to_datetime(df["hora_hecho"], format="%H:%M:%S", errors="coerce").dt.hour
+        df = df.drop(columns="hora_hecho")
+
+    for col in ["delito", "categoria_delito"]:
+        if col in df.columns:
+            df[col] = _normalize_distinct(df[col], lambda names: names.str.strip().str.upper())
+
+    return df.drop_duplicates()
+
+
+def frame_memory(df):
+    """Bytes held by `df`, its object strings and index included."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def compact_crime_frame(df):
+    """
+    `df` in the COMPACT_DTYPES schema, with a RangeIndex and the weekday of
+    fecha_hecho (dia_semana, Monday = 0). float32 keeps coordinates to
+    about 0.2 m; hora, anio_hecho and dia_semana are nullable, <NA> where
+    unknown. Columns outside the schema are kept as they are.
+    """
+    if "fecha_hecho" in df.columns:
+        df = df.assign(dia_semana=df["fecha_hecho"].dt.dayofweek)
+    dtypes = {col: dtype for col, dtype in COMPACT_DTYPES.items() if col in df.columns}
+    return df.astype(dtypes).reset_index(drop=True)
+
+
+@timed("data.load_crime_data")
+def load_crime_data(db_path=DB_PATH, geojson_path=GEOJSON_NAME, profile=None):
+    """
+    Crimes with coordinates from DuckDB, cleaned for the map and stored in
+    the compact schema (`compact_crime_frame`); the span records the memory
+    before and after compaction. Returns (DataFrame, notices). Raises
+    FileNotFoundError without the DB.
+
+    With a `crime_core.scoping.QueryProfile` only the rows and columns the
+    role may see are read; profiles without row-level access are refused.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"BD no encontrada: {db_path}")
+    if profile is not None and not profile.row_level:
+        raise PermissionError(f"El rol {profile.role} solo tiene acceso a datos agregados")
+
+    scope_sql, scope_params = scope_filter(profile) if profile is not None else ("TRUE", [])
+    notices = []
+    with connect(db_path) as con, span("data.crime_sql"):
+        # Only the visualized columns; NULL coordinates and out-of-scope rows are dropped in SQL
+        try:
+            df = con.execute(f"""
+                SELECT {", ".join([_CRIME_COLUMNS] + stored_hex_columns(con))}
+                FROM crimes_raw
+                WHERE latitud IS NOT NULL
+                  AND longitud IS NOT NULL
+                  AND ({scope_sql})
+            """, scope_params).df()
+        except Exception:
+            notices.append("Columnas no coinciden, cargando con SELECT * LIMIT 50000")
+            columns = select_list(profile) if profile is not None else "*"
+            df = con.execute(
+                f"SELECT {columns} FROM crimes_raw WHERE ({scope_sql}) LIMIT 50000", scope_params
+            ).df()
+
+    df.columns = df.columns.str.strip()
+    for col in ["latitud", "longitud", "anio_hecho"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df.dropna(subset=["latitud", "longitud"])
+
+    geojson_path = geojson_path if geojson_path and os.path.exists(geojson_path) else None
+    # Memory of the frame as read (object strings, float64) and compacted;
+    # measuring the strings is slow, so only while metrics are recorded
+    with span("data.compact_crime_data", rows=len(df)) as attrs:
+        if metrics.ENABLED:
+            attrs["mb_read"] = round(frame_memory(df) / 1e6, 2)
+        df = compact_crime_frame(clean_crime_data(df, geojson_path, notices))
+        if metrics.ENABLED:
+            attrs["mb_compact"] = round(frame_memory(df) / 1e6, 2)
+    return df, notices
+
+
+@timed("data.load_robbery_matrix")
+def load_robbery_matrix(db_path=DB_PATH):
+    """Robberies per alcaldía x hour (the matrix behind the EDA page)."""
+    from crime_core.stats import alcaldia_hour_matrix
+
+    # Hour and counts come out of DuckDB: a few hundred rows instead of every robbery
+    with connect(db_path) as con:
+        df = con.execute(
+            """
+            SELECT upper(trim(alcaldia_hecho)) AS alcaldia_hecho,
+                   hour(TRY_CAST(hora_hecho AS TIME)) AS hora,
+                   count(*) AS n
+            FROM crimes_raw
+            WHERE delito ILIKE '%ROBO%' AND alcaldia_hecho IS NOT NULL
+            GROUP BY 1, 2
+            """
+        ).df()
+
+    df = df.dropna(subset=["hora"])
+    df = df[~df["alcaldia_hecho"].isin(ALCALDIAS_INVALIDAS)]
+    return alcaldia_hour_matrix(df, count_col="n")
+
+
+@timed("data.load_colonia_counts")
+def load_colonia_counts(pattern=None, db_path=DB_PATH, familia=None):
+    """
+    Crimes per (alcaldía, colonia) whose delito matches the ILIKE `pattern`
+    (e.g. "%ROBO%"), or that belong to `familia` as the hourly series counts
+    them (crime_core.series.family_filter), with both names upper-cased; the
+    history behind Predicciones. `hex_cell` is the hexagon
+    (crime_core.hexgrid, 1 km edge) of the colonia's median point, <NA>
+    without coordinates.
+    """
+    from crime_core.series import family_filter
+
+    if familia is not None:
+        condition, params = family_filter(familia), []
+    else:
+        condition, params = "delito ILIKE ?", [pattern]
+    with connect(db_path) as con:
+        df = con.execute(f"""
+            SELECT alcaldia_hecho, colonia_hecho, COUNT(*) AS total_robos,
+                   median(TRY_CAST(latitud AS DOUBLE)) AS lat, median(TRY_CAST(longitud AS DOUBLE)) AS lon
+            FROM crimes_raw
+            WHERE {condition}
+              AND alcaldia_hecho IS NOT NULL
+              AND colonia_hecho IS NOT NULL
+            GROUP BY alcaldia_hecho, colonia_hecho
+        """, params).df()
+
+    df = df.dropna(subset=["alcaldia_hecho", "colonia_hecho"])
+    df["alcaldia_hecho"] = df["alcaldia_hecho"].astype(str).str.upper().str.strip()
+    df["colonia_hecho"] = df["colonia_hecho"].astype(str).str.upper().str.strip()
+    lat, lon = df.pop("lat").to_numpy(dtype=float), df.pop("lon").to_numpy(dtype=float)
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    cells = latlng_to_cell(np.where(located, lat, 0), np.where(located, lon, 0), COLONIA_HEX_RES)
+    df["hex_cell"] = pd.Series(cells, index=df.index, dtype="Int64").where(located)
+    return df
+
+
+def load_boundaries(geojson_path):
+    """
+    Parsed alcaldía boundaries: the GeoJSON dict (for folium) and a
+    DataFrame with NOMGEO and the centroid of each polygon (for labels).
+    """
+    import geopandas as gpd
+
+    with open(geojson_path, "r", encoding="utf-8") as f:
+        geojson = json.load(f)
+    gdf = gpd.read_file(geojson_path)
+    centroids = gdf.geometry.centroid
+    labels = pd.DataFrame({
+        "NOMGEO": gdf["NOMGEO"].to_numpy(),
+        "lat": np.asarray(centroids.y),
+        "lon": np.asarray(centroids.x),
+    })
+    return geojson, labels
+
+
+# ============================================================================
+# SHARED, MEMORY-BOUNDED MEMO
+# ============================================================================
+
+def _memoized(namespace, key, loader):
+    """Run `loader` once per key while it stays in the result cache; concurrent callers wait for it."""
+    return get_result_cache().get_or_compute(namespace, key, loader)
+
+
+def get_crime_data(db_path=DB_PATH, geojson_path=GEOJSON_NAME, profile=None):
+    if profile is not None and profile.alcaldias is None and profile.columns is None:
+        profile = None  # unrestricted: share the copy loaded by the startup warm-up
+    return _memoized(
+        "crime_data", (db_path, geojson_path, profile),
+        lambda: load_crime_data(db_path, geojson_path, profile),
+    )
+
+
+def get_robbery_matrix(db_path=DB_PATH):
+    return _memoized("robbery_matrix", db_path, lambda: load_robbery_matrix(db_path))
+
+
+def get_colonia_counts(pattern=None, db_path=DB_PATH, familia=None):
+    return _memoized(
+        "colonia_counts", (pattern, db_path, familia), lambda: load_colonia_counts(pattern, db_path, familia),
+    )
+
+
+def get_boundaries(geojson_path):
+    return _memoized("boundaries", geojson_path, lambda: load_boundaries(geojson_path))
@@ -0,0 +1,20 @@
+"""
+DuckDB access shared by the headless modules.
+"""
+import duckdb
+
+DB_PATH = "crimes_fgj.db"
+
+
+def connect(db_path=DB_PATH, read_only=True):
+    return duckdb.connect(db_path, read_only=read_only)
+
+
+def table_exists(con, name):
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [name]
+    ).fetchone()[0] > 0
+
+
+# Placeholder values of alcaldia_hecho that do not name an alcaldía
+ALCALDIAS_INVALIDAS = ["NAN", "NONE", "NULL", "NAT", "", "DESCONOCIDO", "CDMX (INDETERMINADA)"]
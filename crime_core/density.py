@@ -0,0 +1,125 @@
+"""
+Kernel density surface of crimes, smoothed on the server.
+
+The crimes are binned once on the base grid of the grid pyramid
+(crime_core.grid) and the counts are convolved with a Gaussian kernel by
+FFT, so the cost grows with the grid area and not with the number of
+crimes. Unlike the Leaflet heatmap, the surface does not depend on the zoom
+or the browser: the same filters give the same surface, which is cached and
+contoured into hot-zone polygons (drawn by crime_core.maps.add_density_layer).
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from crime_core.metrics import timed
+
+# Bandwidths (kernel standard deviation) offered by the Mapa slider; the
+# base grid cell is 0.5 km, so narrower kernels would be undersampled
+BANDWIDTHS_KM = (0.5, 0.75, 1.0, 1.5, 2.0, 3.0)
+DEFAULT_BANDWIDTH_KM = 1.0
+
+# The kernel is truncated at this many bandwidths (99.7% of its mass)
+KERNEL_RADIUS = 3
+
+# Hot zones: the cells above these percentiles of the density
+HOTSPOT_PERCENTILES = (90, 95, 99)
+
+# Densities below this fraction of the peak are FFT round-off, not crimes
+_ROUNDOFF = 1e-9
+
+
+def gaussian_kernel(bandwidth_cells, radius=KERNEL_RADIUS):
+    """Normalized 2-D Gaussian of `bandwidth_cells` standard deviation, truncated at `radius` of them."""
+    half = max(1, int(np.ceil(radius * bandwidth_cells)))
+    x = np.arange(-half, half + 1)
+    g = np.exp(-0.5 * (x / bandwidth_cells) ** 2)
+    kernel = np.outer(g, g)
+    return kernel / kernel.sum()
+
+
+@dataclass
+class DensitySurface:
+    """
+    Crimes per km² on a regular grid; density[i, j] covers
+    [lat_bins[i], lat_bins[i + 1]) x [lon_bins[j], lon_bins[j + 1]).
+    """
+    lat_bins: np.ndarray
+    lon_bins: np.ndarray
+    density: np.ndarray
+    cell_size_km: float
+    bandwidth_km: float
+
+    @property
+    def lat_centres(self):
+        return (self.lat_bins[:-1] + self.lat_bins[1:]) / 2
+
+    @property
+    def lon_centres(self):
+        return (self.lon_bins[:-1] + self.lon_bins[1:]) / 2
+
+    def percentile_levels(self, percentiles=HOTSPOT_PERCENTILES):
+        """Density at `percentiles` of the cells within the kernel's reach of a crime."""
+        reached = self.density[self.density > 0]
+        if reached.size == 0:
+            return np.full(len(percentiles), np.inf)
+        return np.percentile(reached, percentiles)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.lat_bins, self.lon_bins, self.density))
+
+
+@timed("density.kde_surface")
+def kde_surface(level, bandwidth_km=DEFAULT_BANDWIDTH_KM, hour=None):
+    """
+    DensitySurface of the counts of a GridLevel (all crimes, or those of
+    `hour`) smoothed with a Gaussian of `bandwidth_km`. The surface extends
+    the grid by the kernel radius on every side, so zones at the edge of the
+    data are not clipped.
+    """
+    from scipy.signal import fftconvolve
+
+    counts = level.counts if hour is None else level.hourly[hour]
+    kernel = gaussian_kernel(bandwidth_km / level.cell_size_km)
+    half = kernel.shape[0] // 2
+
+    smoothed = fftconvolve(counts.astype(float), kernel, mode="full")
+    smoothed[smoothed < smoothed.max() * _ROUNDOFF] = 0
+
+    lat_step = level.lat_bins[1] - level.lat_bins[0]
+    lon_step = level.lon_bins[1] - level.lon_bins[0]
+    return DensitySurface(
+        lat_bins=level.lat_bins[0] + (np.arange(smoothed.shape[0] + 1) - half) * lat_step,
+        lon_bins=level.lon_bins[0] + (np.arange(smoothed.shape[1] + 1) - half) * lon_step,
+        density=smoothed / level.cell_size_km ** 2,
+        cell_size_km=level.cell_size_km,
+        bandwidth_km=bandwidth_km,
+    )
+
+
+@timed("density.hotspot_polygons")
+def hotspot_polygons(surface, percentiles=HOTSPOT_PERCENTILES):
+    """
+    Filled contours of `surface` at its `percentiles`, one dict per band
+    (percentile, level, polygons) from the lowest. Each band runs from its
+    level to the next one, so bands never overlap; a polygon is a list of
+    closed (lat, lon) rings, the outer one first and then its holes.
+    """
+    from contourpy import FillType, contour_generator
+
+    levels = surface.percentile_levels(percentiles)
+    gen = contour_generator(
+        x=surface.lon_centres, y=surface.lat_centres, z=surface.density, fill_type=FillType.OuterOffset,
+    )
+    bands = []
+    for p, lower, upper in zip(percentiles, levels, list(levels[1:]) + [np.inf]):
+        if not np.isfinite(lower) or lower >= upper:
+            continue
+        points, offsets = gen.filled(lower, upper)
+        polygons = [
+            [ring[:, ::-1] for ring in np.split(pts, offs[1:-1])]
+            for pts, offs in zip(points, offsets)
+        ]
+        bands.append({"percentile": p, "level": float(lower), "polygons": polygons})
+    return bands
@@ -0,0 +1,126 @@
+"""
+Rendered-figure cache for the matplotlib/seaborn charts.
+
+Figures are keyed on (chart kind, hash of the data behind it, theme, extra
+parameters) and stored as PNG/SVG bytes in a size-bounded LRU. On a hit the
+pages show the cached bytes and matplotlib is never touched; on a miss the
+figure is drawn, serialized and closed right away so pyplot does not keep
+it alive.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Same defaults st.pyplot uses when it serializes a figure
+SAVEFIG_KWARGS = {"dpi": 200, "bbox_inches": "tight"}
+
+
+def data_hash(obj):
+    """Cheap content hash for DataFrames, Series, arrays and plain values."""
+    digest = hashlib.blake2b(digest_size=16)
+
+    def _update(value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            digest.update(type(value).__name__.encode())
+            digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        elif isinstance(value, np.ndarray):
+            digest.update(repr((value.dtype.str, value.shape)).encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, (list, tuple)):
+            digest.update(b"(")
+            for item in value:
+                _update(item)
+            digest.update(b")")
+        elif isinstance(value, dict):
+            for k in sorted(value, key=repr):
+                digest.update(repr(k).encode())
+                _update(value[k])
+        else:
+            digest.update(repr(value).encode())
+
+    _update(obj)
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """Thread-safe LRU of rendered figures, bounded by total bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, kind, data, draw, theme="auto", fmt="png", transparent=False, **params):
+        """
+        Return the image bytes for `draw(data, **params)`, which must build and
+        return a matplotlib Figure from `data` only.
+        """
+        key = (kind, data_hash(data), theme, fmt, transparent, data_hash(params))
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        import matplotlib.pyplot as plt
+        fig = draw(data, **params)
+        try:
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt, transparent=transparent, **SAVEFIG_KWARGS)
+            image = buf.getvalue()
+        finally:
+            plt.close(fig)
+
+        with self._lock:
+            if key not in self._entries and len(image) <= self.max_bytes:
+                self._entries[key] = image
+                self._bytes += len(image)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+                    self.evictions += 1
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_figure_cache():
+    """Process-wide figure cache shared by every session and page."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FigureCache()
+        return _cache
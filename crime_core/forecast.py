@@ -0,0 +1,230 @@
+"""
+Multi-day batch forecasts for the spatio-temporal crime models.
+
+The spatio-temporal models only see (hora, dia_semana, mes, colonia_code),
+so a date range collapses to its distinct (weekday, month) pairs: a 30-day
+horizon needs at most 14 of them. Each pair is scored once for every
+colonia x 24 hours and the dates are mapped back onto those results, so the
+cost depends on the number of colonias, not on the horizon length.
+"""
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from crime_core.series import LAGS
+
+HOURS = np.arange(24)
+
+# Feature order of the temporal (city-wide, Transeúnte) model
+TEMPORAL_FEATURES = ["año", "mes", "dia", "hora", "dia_semana", "sin_hora", "cos_hora"] + [f"lag_{k}" for k in LAGS]
+
+# Above this many rows the (weekday, month) blocks are scored in a process pool
+POOL_MIN_ROWS = 2_000_000
+
+
+def colonia_code(nombre_colonia):
+    """Hash provisional usado por los modelos para codificar la colonia."""
+    return zlib.crc32(nombre_colonia.encode("utf-8")) % 1000
+
+
+def feature_block(codes, dia_semana, mes):
+    """Feature columns for every colonia x 24 hours on one (weekday, month)."""
+    n_rows = len(codes) * 24
+    return {
+        "hora": np.tile(HOURS, len(codes)),
+        "dia_semana": np.full(n_rows, dia_semana),
+        "mes": np.full(n_rows, mes),
+        "colonia_code": np.repeat(codes, 24),
+    }
+
+
+def _score_blocks(predictor, codes, keys):
+    n_col = len(codes)
+    blocks = [feature_block(codes, wd, mes) for wd, mes in keys]
+    X = np.column_stack([
+        np.concatenate([b[f] for b in blocks]) for f in predictor.feature_names
+    ])
+    return predictor.predict(X).reshape(len(keys), n_col, 24)
+
+
+_worker_predictor = None
+
+
+def _init_worker(model_name, backend):
+    global _worker_predictor
+    from crime_core.models import get_registry
+    _worker_predictor = get_registry().predictor(model_name, backend)
+
+
+def _score_in_worker(codes, keys):
+    return _score_blocks(_worker_predictor, codes, keys)
+
+
+@dataclass
+class ForecastResult:
+    """
+    Risk for every date x colonia x hour, stored compactly as
+    `risk[key_index[d], colonia, hora]`.
+    """
+    dates: pd.DatetimeIndex
+    colonias: pd.DataFrame
+    key_index: np.ndarray
+    risk: np.ndarray
+
+    @property
+    def n_rows(self):
+        return len(self.dates) * len(self.colonias) * 24
+
+    def iter_frames(self, days_per_chunk=1):
+        """Long-format frames (fecha, alcaldía, colonia, hora, riesgo), a few days at a time."""
+        n_col = len(self.colonias)
+        alcaldias = np.repeat(self.colonias["alcaldia_hecho"].to_numpy(), 24)
+        colonias = np.repeat(self.colonias["colonia_hecho"].to_numpy(), 24)
+        horas = np.tile(HOURS, n_col).astype(np.int8)
+        for start in range(0, len(self.dates), days_per_chunk):
+            dates = self.dates[start:start + days_per_chunk]
+            keys = self.key_index[start:start + days_per_chunk]
+            yield pd.DataFrame({
+                "fecha": np.repeat(dates.to_numpy(), n_col * 24),
+                "alcaldia": np.tile(alcaldias, len(dates)),
+                "colonia": np.tile(colonias, len(dates)),
+                "hora": np.tile(horas, len(dates)),
+                "riesgo": self.risk[keys].reshape(-1),
+            })
+
+    def write(self, path, fmt="parquet", days_per_chunk=1):
+        """Stream the forecast to disk without materializing every row at once."""
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            writer = None
+            try:
+                for frame in self.iter_frames(days_per_chunk):
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+        elif fmt == "csv":
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                for i, frame in enumerate(self.iter_frames(days_per_chunk)):
+                    frame.to_csv(f, index=False, header=(i == 0), float_format="%.5f")
+        else:
+            raise ValueError(f"Formato no soportado: {fmt}")
+        return path
+
+    def _by_alcaldia(self):
+        """(keys x alcaldías x 24) sums, computed on the compact array."""
+        codes, names = pd.factorize(self.colonias["alcaldia_hecho"], sort=True)
+        onehot = np.zeros((len(names), len(codes)), dtype=np.float32)
+        onehot[codes, np.arange(len(codes))] = 1
+        return np.einsum("ac,kch->kah", onehot, self.risk), names
+
+    def daily_by_alcaldia(self):
+        """Expected total risk per day (rows) and alcaldía (columns)."""
+        per_key, names = self._by_alcaldia()
+        return pd.DataFrame(per_key.sum(axis=2)[self.key_index], index=self.dates, columns=names)
+
+    def hourly_by_alcaldia(self):
+        """Mean risk per alcaldía (rows) and hour (columns) over the horizon."""
+        per_key, names = self._by_alcaldia()
+        mean = per_key[self.key_index].mean(axis=0)
+        return pd.DataFrame(mean, index=names, columns=[f"{h}:00" for h in HOURS])
+
+    def top_colonias(self, n=20):
+        """Colonias with the highest total risk over the horizon."""
+        weights = np.bincount(self.key_index, minlength=len(self.risk))
+        totals = np.tensordot(weights, self.risk.sum(axis=2), axes=1)
+        peak = self.risk[self.key_index].mean(axis=0).argmax(axis=1)
+        out = self.colonias[["alcaldia_hecho", "colonia_hecho"]].copy()
+        out["riesgo_total"] = totals
+        out["hora_pico"] = peak
+        return out.nlargest(n, "riesgo_total").reset_index(drop=True)
+
+
+def forecast(predictor, colonias, start, days, model_name=None, workers=None):
+    """
+    Score `days` consecutive dates from `start` for every row of `colonias`
+    (columns alcaldia_hecho, colonia_hecho).
+
+    Large jobs are split by (weekday, month) across a process pool when
+    `model_name` is given so workers can load the model from the registry;
+    `workers=0` forces in-process scoring.
+    """
+    colonias = colonias[["alcaldia_hecho", "colonia_hecho"]].drop_duplicates().reset_index(drop=True)
+    dates = pd.date_range(pd.Timestamp(start).normalize(), periods=days, freq="D")
+    pairs = np.column_stack([dates.weekday, dates.month])
+    keys, key_index = np.unique(pairs, axis=0, return_inverse=True)
+    keys = [tuple(int(v) for v in k) for k in keys]
+    codes = np.array([colonia_code(c) for c in colonias["colonia_hecho"]])
+
+    n_score_rows = len(keys) * len(codes) * 24
+    if workers is None:
+        workers = min(len(keys), os.cpu_count() or 1) if n_score_rows >= POOL_MIN_ROWS else 0
+
+    if workers > 1 and model_name is not None and len(keys) > 1:
+        groups = [keys[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(model_name, getattr(predictor, "backend", "auto")),
+        ) as pool:
+            parts = list(pool.map(_score_in_worker, [codes] * len(groups), groups))
+        risk = np.empty((len(keys), len(codes), 24), dtype=np.float32)
+        for i, part in enumerate(parts):
+            risk[i::workers] = part
+    else:
+        risk = _score_blocks(predictor, codes, keys).astype(np.float32, copy=False)
+
+    return ForecastResult(dates=dates, colonias=colonias, key_index=key_index.ravel(), risk=risk)
+
+
+# ============================================================================
+# ONE-DAY RISK PER COLONIA (the "Un día por colonia" view)
+# ============================================================================
+
+def _hour_columns():
+    return [f"{h}:00" for h in HOURS]
+
+
+def day_risk(predictor, colonias, fecha):
+    """
+    Risk per colonia (rows) and hour (columns) on `fecha` for the
+    spatio-temporal models: one feature matrix and one predict call.
+    """
+    colonias = list(colonias)
+    codes = np.array([colonia_code(c) for c in colonias])
+    features = feature_block(codes, fecha.weekday(), fecha.month)
+    X = np.column_stack([features[f] for f in predictor.feature_names])
+    preds = predictor.predict(X).reshape(len(colonias), 24)
+    return pd.DataFrame(preds, index=colonias, columns=_hour_columns())
+
+
+def temporal_features(fecha, lags):
+    """Feature frame (24 hours) of the temporal model; `lags` holds the lag_* columns."""
+    df_time = pd.DataFrame({
+        "año": fecha.year, "mes": fecha.month, "dia": fecha.day,
+        "hora": HOURS, "dia_semana": fecha.weekday(),
+        "sin_hora": np.sin(2 * np.pi * HOURS / 24),
+        "cos_hora": np.cos(2 * np.pi * HOURS / 24),
+    })
+    return pd.concat([df_time, lags.reset_index(drop=True)], axis=1)[TEMPORAL_FEATURES]
+
+
+def distributed_day_risk(predictor, colonias, total, fecha, lags):
+    """
+    City-wide hourly risk of the temporal model on `fecha`, split across
+    `colonias` (colonia_hecho, total_robos) by their share of `total`, x100
+    because the base risk is very small.
+    """
+    riesgo_base = np.asarray(predictor.predict_frame(temporal_features(fecha, lags)))
+    peso = colonias["total_robos"].to_numpy(dtype=float) / total
+    return pd.DataFrame(
+        np.outer(peso, riesgo_base) * 100,
+        index=colonias["colonia_hecho"].tolist(), columns=_hour_columns(),
+    )
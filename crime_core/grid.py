@@ -0,0 +1,269 @@
+"""
+Spatial, temporal and categorical aggregation of crimes, without Streamlit.
+
+These are the computations behind the Mapa layers and statistics: the
+probability grid and its multi-resolution pyramid, the windows of the
+animated timeline and the counts per alcaldía, weekday and violence class.
+They take the cleaned crime DataFrame (see `crime_core.data`) and return
+plain arrays and DataFrames; drawing them is left to `crime_core.maps`.
+"""
+import re
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from crime_core.metrics import timed
+
+# Kilometres per degree of latitude (approximate); a degree of longitude
+# spans this times cos(latitude)
+KM_PER_DEGREE = 111.0
+
+# Decimals kept in coordinates sent to the browser (~1 m); the loaded
+# coordinates are float32, whose floats would print spurious digits
+COORD_DECIMALS = 5
+
+# Finest cell of the grid pyramid and the sizes offered by the Mapa slider
+GRID_BASE_KM = 0.5
+GRID_LEVELS_KM = tuple(GRID_BASE_KM * k for k in range(1, 11))
+
+
+def cell_degrees(cell_size_km, latitude):
+    """Degrees of (latitude, longitude) spanning `cell_size_km` at `latitude`."""
+    lat_step = cell_size_km / KM_PER_DEGREE
+    return lat_step, lat_step / np.cos(np.radians(latitude))
+
+
+def point_coords(df, decimals=COORD_DECIMALS):
+    """(n, 2) float64 array of the (latitud, longitud) of `df`, rounded to `decimals`."""
+    return np.round(df[["latitud", "longitud"]].to_numpy(dtype=float), decimals)
+
+
+def _extent(df):
+    lat = df["latitud"].to_numpy(dtype=float)
+    lon = df["longitud"].to_numpy(dtype=float)
+    return lat, lon, (lat.min() + lat.max()) / 2
+
+
+def _probs(counts):
+    total = counts.sum()
+    return (counts / total * 100) if total > 0 else counts.astype(float)
+
+
+@timed("grid.create_grid_sectors")
+def create_grid_sectors(df, cell_size_km=1.0):
+    """
+    Grid of `cell_size_km` squares over the extent of `df` (longitude
+    spacing corrected for the latitude of its centre) with the number of
+    crimes per cell and each cell's share of the total in percent.
+    Returns (lat_bins, lon_bins, grid_counts, grid_probs).
+    """
+    lat, lon, mid_lat = _extent(df)
+    lat_step, lon_step = cell_degrees(cell_size_km, mid_lat)
+
+    lat_bins = np.arange(lat.min(), lat.max() + lat_step, lat_step)
+    lon_bins = np.arange(lon.min(), lon.max() + lon_step, lon_step)
+
+    # One pass over the points; the last edge lies past the maximum, so every
+    # cell is half-open [edge, next edge) as in a per-cell mask
+    grid_counts, _, _ = np.histogram2d(lat, lon, bins=(lat_bins, lon_bins))
+
+    return lat_bins, lon_bins, grid_counts, _probs(grid_counts)
+
+
+# ============================================================================
+# GRID PYRAMID: every slider size from one binning of the points
+# ============================================================================
+
+def _block_sum(a, k):
+    """Sum `k` x `k` blocks over the last two axes of `a`, zero-padding the edges."""
+    if k == 1:
+        return a
+    rows, cols = a.shape[-2:]
+    pad = [(0, 0)] * (a.ndim - 2) + [(0, -rows % k), (0, -cols % k)]
+    a = np.pad(a, pad)
+    shape = a.shape[:-2] + (a.shape[-2] // k, k, a.shape[-1] // k, k)
+    return a.reshape(shape).sum(axis=(-3, -1))
+
+
+@dataclass
+class GridLevel:
+    """One resolution of a GridPyramid; `hourly[h]` holds the counts of hour h."""
+    cell_size_km: float
+    lat_bins: np.ndarray
+    lon_bins: np.ndarray
+    counts: np.ndarray
+    hourly: np.ndarray
+
+    @property
+    def probs(self):
+        return _probs(self.counts)
+
+    def hour(self, h):
+        """(counts, probs) of the crimes at hour `h`; probs are shares of that hour."""
+        counts = self.hourly[h]
+        return counts, _probs(counts)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.lat_bins, self.lon_bins, self.counts, self.hourly))
+
+
+@dataclass
+class GridPyramid:
+    """
+    Crime counts binned once on a GRID_BASE_KM grid; each coarser level is
+    a block sum of that grid, so every cell of a level is exactly k x k
+    base cells and all levels share the same origin.
+    """
+    base_km: float
+    lat_origin: float
+    lon_origin: float
+    lat_step: float
+    lon_step: float
+    levels: dict
+
+    def level(self, cell_size_km):
+        """The level closest to `cell_size_km`, derived from the base grid if not prebuilt."""
+        k = max(1, int(round(cell_size_km / self.base_km)))
+        if k not in self.levels:
+            self.levels[k] = self._derive(k)
+        return self.levels[k]
+
+    def _derive(self, k):
+        base = self.levels[1]
+        counts = _block_sum(base.counts, k)
+        return GridLevel(
+            cell_size_km=self.base_km * k,
+            lat_bins=self.lat_origin + np.arange(counts.shape[0] + 1) * self.lat_step * k,
+            lon_bins=self.lon_origin + np.arange(counts.shape[1] + 1) * self.lon_step * k,
+            counts=counts,
+            hourly=_block_sum(base.hourly, k),
+        )
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels.values())
+
+
+@timed("grid.build_grid_pyramid")
+def build_grid_pyramid(df, base_km=GRID_BASE_KM, levels_km=GRID_LEVELS_KM):
+    """
+    GridPyramid of the crimes in `df` with `levels_km` prebuilt. Per-hour
+    counts use the `hora` column (crimes without an hour only count in the
+    totals).
+    """
+    lat, lon, mid_lat = _extent(df)
+    lat_step, lon_step = cell_degrees(base_km, mid_lat)
+    n_lat = int(np.floor((lat.max() - lat.min()) / lat_step)) + 1
+    n_lon = int(np.floor((lon.max() - lon.min()) / lon_step)) + 1
+
+    i = np.minimum(((lat - lat.min()) / lat_step).astype(np.int64), n_lat - 1)
+    j = np.minimum(((lon - lon.min()) / lon_step).astype(np.int64), n_lon - 1)
+    cell = i * n_lon + j
+    counts = np.bincount(cell, minlength=n_lat * n_lon).reshape(n_lat, n_lon).astype(np.int32)
+
+    hourly = np.zeros((24, n_lat, n_lon), dtype=np.int32)
+    if "hora" in df.columns:
+        hora = pd.to_numeric(df["hora"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        known = (hora >= 0) & (hora < 24)
+        hourly = np.bincount(
+            hora[known].astype(np.int64) * n_lat * n_lon + cell[known], minlength=24 * n_lat * n_lon,
+        ).reshape(24, n_lat, n_lon).astype(np.int32)
+
+    base = GridLevel(
+        cell_size_km=base_km,
+        lat_bins=lat.min() + np.arange(n_lat + 1) * lat_step,
+        lon_bins=lon.min() + np.arange(n_lon + 1) * lon_step,
+        counts=counts,
+        hourly=hourly,
+    )
+    pyramid = GridPyramid(base_km, lat.min(), lon.min(), lat_step, lon_step, {1: base})
+    for size in levels_km:
+        pyramid.level(size)
+    return pyramid
+
+
+def grid_cells(lat_bins, lon_bins, grid_counts, grid_probs, threshold=0):
+    """
+    Non-empty cells whose probability is at least `threshold` percent
+    (0-100) of the hottest cell's, one row per cell with its bounds, count
+    and probability. Empty cells are never returned, so the result grows
+    with the hot cells and not with the grid area.
+    """
+    keep = grid_counts > 0
+    if threshold > 0 and keep.any():
+        keep &= grid_probs >= grid_probs.max() * threshold / 100
+    i, j = np.nonzero(keep)
+    return pd.DataFrame({
+        "lat0": lat_bins[i],
+        "lon0": lon_bins[j],
+        "lat1": lat_bins[i + 1],
+        "lon1": lon_bins[j + 1],
+        "count": grid_counts[i, j].astype(np.int64),
+        "prob": grid_probs[i, j],
+    })
+
+
+def timeline_groups(df, window_hours=24):
+    """
+    Points of `df` in consecutive windows of `window_hours` from the first
+    to the last `fecha_hecho`. Empty windows are skipped.
+    Returns (groups, labels): lists of [[lat, lon], ...] and window starts.
+    """
+    df = df[df["fecha_hecho"].notna()].sort_values("fecha_hecho")
+    if df.empty:
+        return [], []
+
+    start_date = df["fecha_hecho"].iloc[0]
+    window = pd.Timedelta(timedelta(hours=window_hours))
+    slots = ((df["fecha_hecho"] - start_date) // window).to_numpy(dtype=np.int64)
+    coords = point_coords(df)
+
+    # Sorted by date, so each window is one contiguous run of rows
+    present, first = np.unique(slots, return_index=True)
+    groups = [chunk.tolist() for chunk in np.split(coords, first[1:])]
+    labels = [(start_date + window * int(s)).strftime("%Y-%m-%d %H:%M") for s in present]
+    return groups, labels
+
+
+def counts_by_alcaldia(df):
+    """Crimes per alcaldía (columns alcaldia_hecho, count)."""
+    return df.groupby("alcaldia_hecho", observed=True).size().reset_index(name="count")
+
+
+WEEKDAYS = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo")
+
+# Words in delito/categoria_delito that mark a violent crime in the CDMX data
+VIOLENCE_KEYWORDS = (
+    "VIOLENCIA", "HOMICIDIO", "LESIONES", "ARMA", "VIOLACION",
+    "SECUESTRO", "FEMINICIDIO", "DISPARO", "ASALTO", "C/V",
+    "AGRESION", "MUERTE", "BALA", "PUNZOCORTANTE", "GOLPE",
+    "AMENAZAS", "ABUSO",
+)
+
+
+def counts_by_weekday(df):
+    """Crimes per weekday (dia_semana, else that of fecha_hecho; columns Día, Crímenes), Monday first."""
+    weekday = df["dia_semana"] if "dia_semana" in df.columns else pd.to_datetime(df["fecha_hecho"]).dt.dayofweek
+    dias = weekday.value_counts().sort_index()
+    return pd.DataFrame({
+        "Día": [WEEKDAYS[int(d)] for d in dias.index],
+        "Crímenes": dias.to_numpy(),
+    })
+
+
+def count_violence(df):
+    """
+    Crimes classified "Violento" / "No Violento" by VIOLENCE_KEYWORDS in
+    delito and categoria_delito (either may be missing), in that order.
+    """
+    text = pd.Series("", index=df.index)
+    for column in ("delito", "categoria_delito"):
+        if column in df.columns:
+            text = text + " " + df[column].astype(str)
+    pattern = "|".join(re.escape(k) for k in VIOLENCE_KEYWORDS)
+    violent = text.str.upper().str.contains(pattern, regex=True)
+    counts = violent.map({True: "Violento", False: "No Violento"}).value_counts()
+    return counts.reindex(["Violento", "No Violento"]).dropna()
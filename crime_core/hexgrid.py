@@ -0,0 +1,312 @@
+"""
+Hierarchical hexagonal cell index over Mexico City (H3-style, pure NumPy).
+
+Points are projected to kilometres on a plane tangent at the centre of the
+city, which is exact to well under 1% across CDMX, and binned into
+pointy-top hexagons. Each resolution halves the edge of the previous one
+(aperture 4): resolution 0 has 8 km edges, resolution 5 has 250 m edges.
+A cell id is a positive int64 packing the resolution and the axial (q, r)
+coordinates, so ids can be stored in DuckDB, grouped on and compared.
+
+As in H3, hexagons do not nest exactly; a cell's parent is the coarser cell
+containing its centre and its children are the finer cells whose parent it
+is. Rollups therefore partition the points exactly.
+
+The `hex_cell` DuckDB macro produces the same ids inside SQL. `rebuild_hex_columns`
+stores them in crimes_raw as hex_r3, hex_r4 and hex_r5, and `fill_hex_columns`
+keeps them filled at ingest (crime_core.series.ingest). Spatial counts are
+then an integer GROUP BY.
+"""
+import numpy as np
+import pandas as pd
+
+from crime_core.db import DB_PATH, connect
+from crime_core.grid import KM_PER_DEGREE
+
+# Tangent point of the projection (centre of the CDMX bounding box)
+REF_LAT = 19.3
+REF_LON = -99.15
+KM_PER_DEGREE_LON = float(KM_PER_DEGREE * np.cos(np.radians(REF_LAT)))
+
+# Edge (= circumradius) of a resolution-0 cell in km; each resolution halves it
+BASE_EDGE_KM = 8.0
+HEX_EDGE_KM = {res: BASE_EDGE_KM / 2 ** res for res in range(8)}
+
+# Resolutions stored as crimes_raw columns (1 km, 500 m and 250 m edges)
+HEX_RESOLUTIONS = (3, 4, 5)
+
+# Resolutions offered on the map, from 2 km to 250 m edges
+MAP_RESOLUTIONS = (2, 3, 4, 5)
+
+_SQRT3 = float(np.sqrt(3.0))
+_AXIS_BITS = 28
+_AXIS_OFFSET = 1 << (_AXIS_BITS - 1)
+_AXIS_MASK = (1 << _AXIS_BITS) - 1
+
+
+def hex_column(res):
+    return f"hex_r{res}"
+
+
+def edge_label(res):
+    """Edge length of `res` for display, e.g. "500 m" or "2 km"."""
+    km = HEX_EDGE_KM[res]
+    return f"{km:g} km" if km >= 1 else f"{km * 1000:g} m"
+
+
+# ============================================================================
+# INDEX (NumPy)
+# ============================================================================
+
+def project(lat, lon):
+    """Kilometres (x east, y north) of each point from the tangent point of the plane."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return (lon - REF_LON) * KM_PER_DEGREE_LON, (lat - REF_LAT) * KM_PER_DEGREE
+
+
+def unproject(x, y):
+    """Inverse of `project`: (lat, lon) of plane coordinates in km."""
+    return REF_LAT + y / KM_PER_DEGREE, REF_LON + x / KM_PER_DEGREE_LON
+
+
+def _axial_round(fq, fr):
+    """Nearest hexagon to fractional axial coordinates (cube rounding)."""
+    fs = -fq - fr
+    q, r, s = np.floor(fq + 0.5), np.floor(fr + 0.5), np.floor(fs + 0.5)
+    dq, dr, ds = np.abs(q - fq), np.abs(r - fr), np.abs(s - fs)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def _edge_km(res):
+    return BASE_EDGE_KM / 2.0 ** np.asarray(res)
+
+
+def _xy_to_axial(x, y, res):
+    size = HEX_EDGE_KM[res]
+    return _axial_round((_SQRT3 / 3 * x - y / 3) / size, (2 / 3 * y) / size)
+
+
+def _axial_to_xy(q, r, res):
+    size = HEX_EDGE_KM[res]
+    return size * (_SQRT3 * q + _SQRT3 / 2 * r), size * 1.5 * r
+
+
+def _pack(q, r, res):
+    res = np.asarray(res, dtype=np.int64)
+    return (res << (2 * _AXIS_BITS)) | ((q + _AXIS_OFFSET) << _AXIS_BITS) | (r + _AXIS_OFFSET)
+
+
+def _unpack(cells):
+    cells = np.asarray(cells, dtype=np.int64)
+    res = cells >> (2 * _AXIS_BITS)
+    q = ((cells >> _AXIS_BITS) & _AXIS_MASK) - _AXIS_OFFSET
+    r = (cells & _AXIS_MASK) - _AXIS_OFFSET
+    return q, r, res
+
+
+def latlng_to_cell(lat, lon, res):
+    """Cell ids (int64) at resolution `res` of the points (lat, lon)."""
+    q, r = _xy_to_axial(*project(lat, lon), res)
+    return _pack(q, r, res)
+
+
+def cell_resolution(cells):
+    return _unpack(cells)[2]
+
+
+def _centres_xy(cells):
+    q, r, res = _unpack(cells)
+    size = _edge_km(res)
+    return size * (_SQRT3 * q + _SQRT3 / 2 * r), size * 1.5 * r
+
+
+def cell_to_latlng(cells):
+    """(lat, lon) of the centres of `cells`."""
+    return unproject(*_centres_xy(cells))
+
+
+def cell_to_parent(cells, res):
+    """Cells of resolution `res` containing the centres of `cells`."""
+    return _pack(*_xy_to_axial(*_centres_xy(cells), res), res)
+
+
+def cell_to_children(cell, res):
+    """Sorted ids of the cells of resolution `res` whose parent is `cell`."""
+    q, r, parent_res = (int(v) for v in _unpack(cell))
+    factor = 2 ** (res - parent_res)
+    # Children's centres lie within one parent edge of its centre
+    cq, cr = _xy_to_axial(*_axial_to_xy(q, r, parent_res), res)
+    reach = factor + 1
+    dq, dr = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1))
+    candidates = _pack(cq + dq.ravel(), cr + dr.ravel(), res)
+    return np.sort(candidates[cell_to_parent(candidates, parent_res) == cell])
+
+
+def _disk_offsets(k):
+    dq, dr = np.meshgrid(np.arange(-k, k + 1), np.arange(-k, k + 1))
+    dq, dr = dq.ravel(), dr.ravel()
+    keep = np.maximum.reduce([np.abs(dq), np.abs(dr), np.abs(dq + dr)]) <= k
+    return dq[keep], dr[keep]
+
+
+def grid_disk(cells, k=1):
+    """
+    The cells within `k` steps of each of `cells` (k-ring, including the
+    cell itself), as an (n, 3k(k+1)+1) array.
+    """
+    q, r, res = _unpack(np.atleast_1d(cells))
+    dq, dr = _disk_offsets(k)
+    return _pack(q[:, None] + dq, r[:, None] + dr, res[:, None])
+
+
+def cell_boundary(cells):
+    """Vertices of `cells` as an (n, 6, 2) array of (lat, lon)."""
+    cells = np.atleast_1d(cells)
+    x, y = _centres_xy(cells)
+    size = _edge_km(cell_resolution(cells))
+    angles = np.radians(30 + 60 * np.arange(6))
+    vx = x[:, None] + size[:, None] * np.cos(angles)
+    vy = y[:, None] + size[:, None] * np.sin(angles)
+    lat, lon = unproject(vx, vy)
+    return np.stack([lat, lon], axis=-1)
+
+
+def rollup(cells, counts, res):
+    """Sum `counts` of `cells` into their parents at resolution `res`."""
+    parents = cell_to_parent(cells, res)
+    uniq, inverse = np.unique(parents, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def cells_of(df, res):
+    """Cell ids of the crimes in `df` at `res`: the loaded hex_r* column, else computed."""
+    column = hex_column(res)
+    if column in df.columns:
+        return df[column].to_numpy(dtype=np.int64)
+    return latlng_to_cell(df["latitud"], df["longitud"], res)
+
+
+def hex_counts(df, res):
+    """
+    Crimes per cell of resolution `res` (columns cell, count). Resolutions
+    coarser than the stored ones are rolled up from the coarsest stored.
+    """
+    source = max(res, min(HEX_RESOLUTIONS))
+    cells, counts = np.unique(cells_of(df, source), return_counts=True)
+    if source != res:
+        cells, counts = rollup(cells, counts, res)
+    return pd.DataFrame({"cell": cells, "count": counts})
+
+
+# ============================================================================
+# DUCKDB
+# ============================================================================
+
+def register_hex_macros(con):
+    """
+    Temporary DuckDB macros computing the same ids as `latlng_to_cell`:
+    hex_cell(lat, lon, res) is NULL without coordinates. Temporary objects
+    are allowed on read-only connections and vanish with the connection.
+    """
+    # Same cube rounding as _axial_round; macro arguments are expanded inline
+    con.execute(f"""
+        CREATE OR REPLACE TEMP MACRO hex_pack(q, r, res) AS
+            (res::BIGINT << {2 * _AXIS_BITS})
+            | ((q::BIGINT + {_AXIS_OFFSET}) << {_AXIS_BITS})
+            | (r::BIGINT + {_AXIS_OFFSET})
+    """)
+    con.execute("""
+        CREATE OR REPLACE TEMP MACRO hex_fix(q, r, s, fq, fr, res) AS hex_pack(
+            CASE WHEN abs(q - fq) > abs(r - fr) AND abs(q - fq) > abs(s - (-fq - fr)) THEN -r - s ELSE q END,
+            CASE WHEN NOT (abs(q - fq) > abs(r - fr) AND abs(q - fq) > abs(s - (-fq - fr)))
+                  AND abs(r - fr) > abs(s - (-fq - fr)) THEN -q - s ELSE r END,
+            res
+        )
+    """)
+    con.execute("""
+        CREATE OR REPLACE TEMP MACRO hex_axial(fq, fr, res) AS
+            hex_fix(floor(fq + 0.5), floor(fr + 0.5), floor(-fq - fr + 0.5), fq, fr, res)
+    """)
+    con.execute(f"""
+        CREATE OR REPLACE TEMP MACRO hex_cell(lat, lon, res) AS hex_axial(
+            ({_SQRT3 / 3!r} * ((TRY_CAST(lon AS DOUBLE) - ({REF_LON})) * {KM_PER_DEGREE_LON!r})
+             - ((TRY_CAST(lat AS DOUBLE) - ({REF_LAT})) * {KM_PER_DEGREE!r}) / 3) / ({BASE_EDGE_KM!r} / pow(2, res)),
+            (2.0 / 3 * ((TRY_CAST(lat AS DOUBLE) - ({REF_LAT})) * {KM_PER_DEGREE!r})) / ({BASE_EDGE_KM!r} / pow(2, res)),
+            res
+        )
+    """)
+
+
+def hex_cell_sql(res, lat="latitud", lon="longitud"):
+    """SQL for the cell id at `res` (needs `register_hex_macros` on the connection)."""
+    return f"hex_cell({lat}, {lon}, {res})"
+
+
+def stored_resolutions(con):
+    """Resolutions of HEX_RESOLUTIONS present as crimes_raw columns."""
+    columns = {
+        row[0] for row in con.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'crimes_raw'"
+        ).fetchall()
+    }
+    return [res for res in HEX_RESOLUTIONS if hex_column(res) in columns]
+
+
+def hex_expr(con, res):
+    """The stored hex column of `res` if crimes_raw has it, else its SQL expression."""
+    if res in stored_resolutions(con):
+        return hex_column(res)
+    register_hex_macros(con)
+    return hex_cell_sql(res)
+
+
+def stored_hex_columns(con):
+    """Names of the hex_r* columns crimes_raw stores (see rebuild_hex_columns)."""
+    return [hex_column(res) for res in stored_resolutions(con)]
+
+
+def fill_hex_columns(con, where=None):
+    """Compute missing ids of the stored hex columns (all rows, or those matching `where`)."""
+    resolutions = stored_resolutions(con)
+    if not resolutions:
+        return 0
+    register_hex_macros(con)
+    assignments = ", ".join(f"{hex_column(res)} = {hex_cell_sql(res)}" for res in resolutions)
+    condition = " OR ".join(f"{hex_column(res)} IS NULL" for res in resolutions)
+    extra = f" AND ({where})" if where else ""
+    return con.execute(
+        f"UPDATE crimes_raw SET {assignments} WHERE ({condition}) AND latitud IS NOT NULL{extra}"
+    ).fetchone()[0]
+
+
+def rebuild_hex_columns(con, resolutions=HEX_RESOLUTIONS):
+    """Add the hex_r* columns to crimes_raw and compute them for every row."""
+    register_hex_macros(con)
+    # DuckDB cannot alter and update a table in the same transaction
+    for res in resolutions:
+        con.execute(f"ALTER TABLE crimes_raw ADD COLUMN IF NOT EXISTS {hex_column(res)} BIGINT")
+    assignments = ", ".join(f"{hex_column(res)} = {hex_cell_sql(res)}" for res in resolutions)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"UPDATE crimes_raw SET {assignments}")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return con.execute(f"SELECT COUNT({hex_column(resolutions[-1])}) FROM crimes_raw").fetchone()[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Guarda los índices hexagonales en crimes_raw.")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    with connect(args.db, read_only=False) as con:
+        print(f"{rebuild_hex_columns(con):,} filas con celda en {', '.join(map(hex_column, HEX_RESOLUTIONS))}")
@@ -0,0 +1,125 @@
+"""
+Getis-Ord Gi* hot and cold spots over the crime grid.
+
+Each cell of a GridLevel (crime_core.grid) is compared with its
+neighbourhood: Gi* is the z-score of the neighbourhood's count against what
+a random arrangement of the same counts would give. The neighbourhoods are
+one sparse weight matrix, so the statistic for every cell is a couple of
+sparse products, and the p-values are corrected for testing every cell at
+once with Benjamini-Hochberg (crime_core.hypothesis), the same FDR control
+as the chi-square suite.
+"""
+import numpy as np
+import pandas as pd
+
+from crime_core.hypothesis import benjamini_hochberg
+from crime_core.metrics import timed
+
+# FDR levels of the confidence bins: |bin| 3, 2, 1 for q below 1%, 5%, 10%
+CONFIDENCE_LEVELS = (0.01, 0.05, 0.10)
+
+BIN_LABELS = {
+    3: "Punto caliente (99%)", 2: "Punto caliente (95%)", 1: "Punto caliente (90%)",
+    -1: "Punto frío (90%)", -2: "Punto frío (95%)", -3: "Punto frío (99%)",
+}
+
+
+def grid_weights(shape, radius=1, mask=None):
+    """
+    Binary weights (CSR, n x n for the n cells where `mask` is true, in
+    row-major order) linking every cell to the cells within `radius` rows
+    and columns of it, itself included as Gi* requires.
+    """
+    from scipy import sparse
+
+    rows, cols = shape
+    mask = np.ones(shape, dtype=bool) if mask is None else mask
+    # Position of each studied cell among the studied cells, -1 elsewhere
+    index = np.full(shape, -1, dtype=np.int64)
+    index[mask] = np.arange(mask.sum())
+    i, j = np.nonzero(mask)
+
+    src, dst = [], []
+    for di in range(-radius, radius + 1):
+        for dj in range(-radius, radius + 1):
+            ni, nj = i + di, j + dj
+            inside = (ni >= 0) & (ni < rows) & (nj >= 0) & (nj < cols)
+            neighbour = np.full(i.size, -1, dtype=np.int64)
+            neighbour[inside] = index[ni[inside], nj[inside]]
+            keep = neighbour >= 0
+            src.append(index[i[keep], j[keep]])
+            dst.append(neighbour[keep])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    n = int(mask.sum())
+    return sparse.csr_matrix((np.ones(src.size), (src, dst)), shape=(n, n))
+
+
+def study_area(counts, radius=1):
+    """
+    Cells of the 2-D `counts` with a crime within `radius` of them, so the
+    empty bounding-box corners outside the city do not make every populated
+    cell look hot.
+    """
+    from scipy.ndimage import maximum_filter
+
+    return maximum_filter(counts > 0, size=2 * radius + 1, mode="constant")
+
+
+def getis_ord_gi_star(values, weights):
+    """
+    Gi* z-scores of `values` under the sparse `weights` (n x n, self-weights
+    included) and their two-sided normal p-values. `values` is (n,), or
+    (n, t) for t independent snapshots of the same cells (e.g. weeks).
+    """
+    from scipy.stats import norm
+
+    x = np.asarray(values, dtype=np.float64)
+    n = x.shape[0]
+    mean = x.mean(axis=0)
+    s = np.sqrt((x ** 2).mean(axis=0) - mean ** 2)
+    w_sum = np.asarray(weights.sum(axis=1)).reshape((n,) + (1,) * (x.ndim - 1))
+    w_sq = np.asarray(weights.multiply(weights).sum(axis=1)).reshape(w_sum.shape)
+
+    numerator = weights @ x - mean * w_sum
+    denominator = s * np.sqrt((n * w_sq - w_sum ** 2) / (n - 1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(denominator > 0, numerator / denominator, 0.0)
+    return z, 2 * norm.sf(np.abs(z))
+
+
+def confidence_bins(z, q, levels=CONFIDENCE_LEVELS):
+    """Signed bins (-3..3) of each cell: the strictest level its q-value passes, by the sign of z."""
+    strength = np.zeros(len(q), dtype=np.int8)
+    for bin_, level in zip((3, 2, 1), levels):
+        strength[(strength == 0) & (q < level)] = bin_
+    return np.sign(z).astype(np.int8) * strength
+
+
+@timed("hotspots.hotspot_cells")
+def hotspot_cells(level, radius=1, hour=None):
+    """
+    Gi* analysis of a GridLevel (all crimes, or those of `hour`) over its
+    `study_area`. Returns one row per studied cell: bounds (lat0, lon0,
+    lat1, lon1), count, z, p_value, q_value (Benjamini-Hochberg) and bin.
+    """
+    counts = level.counts if hour is None else level.hourly[hour]
+    studied = study_area(counts, radius)
+    columns = ["lat0", "lon0", "lat1", "lon1", "count", "z", "p_value", "q_value", "bin"]
+    if studied.sum() < 2:
+        return pd.DataFrame(columns=columns)
+
+    x = counts[studied].astype(np.float64)
+    z, p = getis_ord_gi_star(x, grid_weights(counts.shape, radius, studied))
+    q = benjamini_hochberg(p)
+    i, j = np.nonzero(studied)
+    return pd.DataFrame({
+        "lat0": level.lat_bins[i],
+        "lon0": level.lon_bins[j],
+        "lat1": level.lat_bins[i + 1],
+        "lon1": level.lon_bins[j + 1],
+        "count": x.astype(np.int64),
+        "z": z,
+        "p_value": p,
+        "q_value": q,
+        "bin": confidence_bins(z, q),
+    })[columns]
@@ -0,0 +1,185 @@
+"""
+Batteries of chi-square tests over precomputed count matrices.
+
+Every test here is a contingency table cut out of an alcaldía x hour matrix
+(see `crime_core.stats.alcaldia_hour_matrix`) or a familia x alcaldía x hour
+cube, so hundreds of tests are a few stacked array operations and never
+read the raw rows. Tables of the same shape are evaluated together with the
+vectorized helpers in `crime_core.stats`, and the whole suite is corrected
+for multiple testing with Benjamini-Hochberg.
+"""
+from dataclasses import dataclass
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from crime_core.db import ALCALDIAS_INVALIDAS
+from crime_core.series import CRIME_FAMILIES, family_case
+from crime_core.stats import HOURS, chi2_statistic
+
+_TEST_COLUMNS = ["prueba", "grupo", "chi2", "dof", "p_value", "cramers_v"]
+RESULT_COLUMNS = ["prueba", "grupo", "chi2", "dof", "p_value", "q_value", "cramers_v", "significativa"]
+
+
+@dataclass
+class CountCube:
+    """Counts per familia x alcaldía x hour, `counts[f, a, h]`."""
+    familias: list
+    alcaldias: list
+    counts: np.ndarray
+
+    def matrix(self, familia=None):
+        """Alcaldía x hour matrix of one familia, or of all of them summed."""
+        counts = self.counts.sum(axis=0) if familia is None else self.counts[self.familias.index(familia)]
+        return pd.DataFrame(counts, index=self.alcaldias, columns=HOURS)
+
+
+def family_cube(con):
+    """Aggregate crimes_raw into a `CountCube` with a single GROUP BY."""
+    placeholders = ", ".join("?" for _ in ALCALDIAS_INVALIDAS)
+    df = con.execute(
+        f"""
+        SELECT familia, alcaldia, hora, COUNT(*) AS n
+        FROM (
+            SELECT {family_case()} AS familia,
+                   upper(trim(CAST(alcaldia_hecho AS VARCHAR))) AS alcaldia,
+                   hour(TRY_CAST(hora_hecho AS TIME)) AS hora
+            FROM crimes_raw
+        )
+        WHERE familia IS NOT NULL AND hora IS NOT NULL AND alcaldia NOT IN ({placeholders})
+        GROUP BY ALL
+        """,
+        ALCALDIAS_INVALIDAS,
+    ).df()
+
+    familias = [f for f in CRIME_FAMILIES if f in set(df["familia"])]
+    alcaldias = sorted(df["alcaldia"].unique())
+    counts = np.zeros((len(familias), len(alcaldias), 24), dtype=np.int64)
+    f_idx = pd.Index(familias).get_indexer(df["familia"])
+    a_idx = pd.Index(alcaldias).get_indexer(df["alcaldia"])
+    np.add.at(counts, (f_idx, a_idx, df["hora"].to_numpy(dtype=np.intp)), df["n"].to_numpy())
+    return CountCube(familias=familias, alcaldias=alcaldias, counts=counts)
+
+
+def benjamini_hochberg(p_values):
+    """Benjamini-Hochberg adjusted p-values (q-values), same order as the input."""
+    p = np.asarray(p_values, dtype=np.float64)
+    n = p.size
+    if n == 0:
+        return p
+    order = np.argsort(p)
+    scaled = p[order] * n / np.arange(1, n + 1)
+    # Enforce monotonicity from the largest p-value down
+    q_sorted = np.minimum.accumulate(scaled[::-1])[::-1].clip(max=1.0)
+    q = np.empty(n)
+    q[order] = q_sorted
+    return q
+
+
+def test_tables(tables):
+    """
+    Chi-square test of independence for a stack of tables (..., r, c).
+
+    Rows and columns that are all zero are left out of the degrees of
+    freedom and of Cramér's V, as if the table had been built without them.
+    Returns a dict of arrays: chi2, dof, p_value, cramers_v.
+    """
+    from scipy.stats import chi2 as chi2_dist
+
+    tables = np.asarray(tables, dtype=np.float64)
+    stat = chi2_statistic(tables)
+    r_eff = (tables.sum(axis=-1) > 0).sum(axis=-1)
+    c_eff = (tables.sum(axis=-2) > 0).sum(axis=-1)
+    dof = (r_eff - 1) * (c_eff - 1)
+    n = tables.sum(axis=(-2, -1))
+    k = np.minimum(r_eff, c_eff) - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = np.where(dof > 0, chi2_dist.sf(stat, np.maximum(dof, 1)), np.nan)
+        v = np.where(k > 0, np.sqrt(stat / (n * k)), np.nan)
+    return {"chi2": stat, "dof": dof, "p_value": p, "cramers_v": v}
+
+
+def _frame(prueba, grupos, result):
+    return pd.DataFrame({"prueba": prueba, "grupo": grupos, **result})
+
+
+def pairwise_alcaldia_tests(matrix):
+    """Every pair of alcaldías: do their hourly profiles differ? (2 x 24 tables)."""
+    values = matrix.to_numpy()
+    pairs = list(combinations(range(len(values)), 2))
+    if not pairs:
+        return pd.DataFrame(columns=_TEST_COLUMNS)
+    i, j = np.array(pairs).T
+    tables = np.stack([values[i], values[j]], axis=1)
+    grupos = [f"{matrix.index[a]} vs {matrix.index[b]}" for a, b in pairs]
+    return _frame("alcaldia_vs_alcaldia", grupos, test_tables(tables))
+
+
+def hour_window_tests(matrix, width=3):
+    """
+    For every alcaldía and every window of `width` consecutive hours
+    (wrapping past midnight): is the share of crimes inside the window
+    different from the rest of the city? (2 x 2 tables)
+    """
+    values = matrix.to_numpy()
+    starts = np.arange(24)
+    # window[s, h] is True when hour h falls in the window starting at s
+    window = ((np.arange(24)[None, :] - starts[:, None]) % 24) < width
+    in_win = values @ window.T.astype(values.dtype)       # alcaldías x starts
+    total = values.sum(axis=1, keepdims=True)
+    city_in = in_win.sum(axis=0, keepdims=True)
+    city_total = total.sum()
+
+    tables = np.empty((len(values), 24, 2, 2), dtype=np.int64)
+    tables[..., 0, 0] = in_win
+    tables[..., 0, 1] = total - in_win
+    tables[..., 1, 0] = city_in - in_win
+    tables[..., 1, 1] = (city_total - total) - (city_in - in_win)
+
+    grupos = [
+        f"{alcaldia} {s:02d}:00-{(s + width) % 24:02d}:00"
+        for alcaldia in matrix.index for s in starts
+    ]
+    return _frame(f"ventana_{width}h", grupos, test_tables(tables.reshape(-1, 2, 2)))
+
+
+def family_tests(cube):
+    """
+    Per familia, alcaldía x hour independence; per pair of familias, whether
+    their hourly and their alcaldía profiles differ.
+    """
+    frames = []
+    if cube.familias:
+        frames.append(_frame("familia_alcaldia_x_hora", list(cube.familias), test_tables(cube.counts)))
+
+    pairs = list(combinations(range(len(cube.familias)), 2))
+    if pairs:
+        i, j = np.array(pairs).T
+        grupos = [f"{cube.familias[a]} vs {cube.familias[b]}" for a, b in pairs]
+        by_hour = cube.counts.sum(axis=1)
+        by_alcaldia = cube.counts.sum(axis=2)
+        frames.append(_frame("familias_por_hora", grupos, test_tables(np.stack([by_hour[i], by_hour[j]], axis=1))))
+        frames.append(_frame("familias_por_alcaldia", grupos, test_tables(np.stack([by_alcaldia[i], by_alcaldia[j]], axis=1))))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=_TEST_COLUMNS)
+
+
+def run_suite(matrix, cube=None, window_width=3, alpha=0.05):
+    """
+    Every alcaldía pair, every hour window and (with `cube`) every crime
+    family, with Benjamini-Hochberg q-values computed across the whole suite.
+    """
+    frames = [pairwise_alcaldia_tests(matrix), hour_window_tests(matrix, window_width)]
+    if cube is not None:
+        frames.append(family_tests(cube))
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    results = pd.concat(frames, ignore_index=True)
+
+    valid = results["p_value"].notna().to_numpy()
+    q = np.full(len(results), np.nan)
+    q[valid] = benjamini_hochberg(results.loc[valid, "p_value"])
+    results["q_value"] = q
+    results["significativa"] = results["q_value"] < alpha
+    return results[RESULT_COLUMNS]
@@ -0,0 +1,186 @@
+"""
+Fast inference backends for the XGBoost crime models.
+
+The sklearn wrapper validates a pandas DataFrame and builds a DMatrix on
+every `predict`. The backends here score raw float32 arrays instead:
+
+- "numpy":   the booster is flattened into node arrays once and all trees
+             are walked together, one depth level per vectorized step.
+- "inplace": XGBoost's `inplace_predict` on the raw array (no DMatrix).
+- "sklearn": the original `model.predict(DataFrame)` path, kept as fallback.
+"""
+import json
+
+import numpy as np
+
+from crime_core.metrics import span
+
+BACKENDS = ("auto", "numpy", "inplace", "sklearn")
+
+# Objectives whose prediction is the raw margin (no link function)
+_IDENTITY_OBJECTIVES = {"reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror"}
+
+# Rows scored per block in the NumPy walker; bounds the (rows x trees) index matrix
+_CHUNK_ROWS = 8192
+
+# Below this many rows the NumPy walker beats inplace_predict (see benchmarks.inference)
+SMALL_BATCH_ROWS = 128
+
+
+def _booster_of(model):
+    return model.get_booster() if hasattr(model, "get_booster") else model
+
+
+def _parse_base_score(raw):
+    # XGBoost >= 3 stores it as a vector string such as "[1.0022222E0]"
+    return float(str(raw).strip("[]").split(",")[0])
+
+
+class CompiledEnsemble:
+    """
+    Array-based representation of a single-output gbtree regressor.
+
+    All trees are concatenated into flat node arrays. Leaves point to
+    themselves, so after `max_depth` steps every (tree, row) pair sits on
+    its leaf and the prediction is the sum of those leaf values.
+    """
+
+    def __init__(self, booster):
+        model = json.loads(bytes(booster.save_raw("json")))
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        gb = learner["gradient_booster"]
+        if gb["name"] != "gbtree":
+            raise ValueError(f"Booster no soportado: {gb['name']}")
+        if objective not in _IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objetivo no soportado: {objective}")
+        params = learner["learner_model_param"]
+        if int(params.get("num_class", 0)) > 1 or int(params.get("num_target", 1)) > 1:
+            raise ValueError("Solo se soportan modelos de una salida")
+
+        trees = gb["model"]["trees"]
+        if any(t.get("categories_nodes") for t in trees):
+            raise ValueError("Los splits categóricos no están soportados")
+
+        self.feature_names = learner.get("feature_names") or None
+        self.n_features = int(params["num_feature"])
+        self.base_score = np.float32(_parse_base_score(params["base_score"]))
+        self.n_trees = len(trees)
+
+        feature, threshold, children, default_left, value = [], [], [], [], []
+        roots = np.empty(self.n_trees, dtype=np.intp)
+        offset = 0
+        max_depth = 0
+        for t_idx, tree in enumerate(trees):
+            lc = np.asarray(tree["left_children"], dtype=np.intp)
+            rc = np.asarray(tree["right_children"], dtype=np.intp)
+            cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+            is_leaf = lc == -1
+            own = np.arange(lc.size, dtype=np.intp)
+
+            roots[t_idx] = offset
+            feature.append(np.where(is_leaf, 0, tree["split_indices"]).astype(np.intp))
+            # Leaves get +inf so `x < threshold` keeps them on their (self-looping) left slot
+            threshold.append(np.where(is_leaf, np.inf, cond).astype(np.float32))
+            pair = np.empty((lc.size, 2), dtype=np.intp)
+            pair[:, 0] = np.where(is_leaf, own, lc) + offset
+            pair[:, 1] = np.where(is_leaf, own, rc) + offset
+            children.append(pair)
+            default_left.append(np.asarray(tree["default_left"], dtype=bool) | is_leaf)
+            value.append(np.where(is_leaf, cond, 0).astype(np.float32))
+            max_depth = max(max_depth, _tree_depth(lc, rc))
+            offset += lc.size
+
+        self.roots = roots
+        self.feature = np.concatenate(feature)
+        self.threshold = np.concatenate(threshold)
+        # Interleaved [left, right] per node: child = children[2 * node + went_right]
+        self.children = np.concatenate(children).ravel()
+        self.default_right = ~np.concatenate(default_left)
+        self.value = np.concatenate(value)
+        self.max_depth = max_depth
+
+    def _predict_block(self, X):
+        n_rows = X.shape[0]
+        # Feature-major copy so each lookup is a 1-D gather: Xt[feature * n_rows + row]
+        Xt = X.T.ravel()
+        rows = np.arange(n_rows, dtype=np.intp)
+        has_nan = np.isnan(Xt).any()
+
+        idx = np.repeat(self.roots[:, None], n_rows, axis=1)  # trees x rows
+        for _ in range(self.max_depth):
+            x = Xt.take(self.feature.take(idx) * n_rows + rows)
+            went_right = ~(x < self.threshold.take(idx))
+            if has_nan:
+                missing = np.isnan(x)
+                went_right[missing] = self.default_right.take(idx[missing])
+            idx = self.children.take(2 * idx + went_right)
+        return self.value.take(idx).sum(axis=0, dtype=np.float32) + self.base_score
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Se esperaban {self.n_features} columnas, llegaron {X.shape}")
+        out = np.empty(X.shape[0], dtype=np.float32)
+        for start in range(0, X.shape[0], _CHUNK_ROWS):
+            stop = start + _CHUNK_ROWS
+            out[start:stop] = self._predict_block(X[start:stop])
+        return out
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(left.size, dtype=np.int32)
+    # Node ids are assigned breadth-first, so parents always precede children
+    for node in range(left.size):
+        if left[node] != -1:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+class FastPredictor:
+    """
+    Scores feature matrices (rows x features, in the model's feature order)
+    with the selected backend. "auto" uses the NumPy ensemble for small
+    batches (one colonia x 24 hours) and `inplace_predict` for larger ones,
+    following the crossover measured by `python -m benchmarks.inference`.
+    """
+
+    def __init__(self, model, backend="auto"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend}")
+        self.model = model
+        self.booster = _booster_of(model)
+        self.feature_names = list(self.booster.feature_names or [])
+        self.compiled = None
+
+        if backend in ("auto", "numpy"):
+            try:
+                self.compiled = CompiledEnsemble(self.booster)
+            except (ValueError, KeyError):
+                if backend == "numpy":
+                    raise
+                backend = "inplace"
+        self.backend = backend
+
+    def predict(self, X):
+        backend = self.backend
+        if backend == "auto":
+            backend = "numpy" if len(X) <= SMALL_BATCH_ROWS else "inplace"
+        with span("model.predict", backend=backend, rows=len(X)):
+            return self._predict(X, backend)
+
+    def _predict(self, X, backend):
+        if backend == "numpy":
+            return self.compiled.predict(X)
+        if backend == "inplace":
+            X = np.ascontiguousarray(X, dtype=np.float32)
+            return self.booster.inplace_predict(X, validate_features=False)
+
+        import pandas as pd
+        columns = self.feature_names or None
+        return self.model.predict(pd.DataFrame(X, columns=columns))
+
+    def predict_frame(self, df):
+        """Convenience wrapper taking a DataFrame with (at least) the model's columns."""
+        X = df[self.feature_names].to_numpy(dtype=np.float32) if self.feature_names else df.to_numpy(np.float32)
+        return self.predict(X)
@@ -0,0 +1,621 @@
+"""
+Folium layers for the crime map, without Streamlit.
+
+Each function adds one layer to a `folium.Map` from data computed in
+`crime_core.grid`, `crime_core.density`, `crime_core.hotspots`,
+`crime_core.spacetime` and `crime_core.data`; the Mapa page only decides
+which layers to draw and shows the resulting HTML. Problems are raised instead of shown, so the same
+code serves the page, batch exports and benchmarks. `viewport_layer_data`
+is the one layer drawn by the browser instead, for components.viewport_map.
+"""
+import os
+import re
+
+import branca.colormap as cm
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import HeatMap, HeatMapWithTime, MarkerCluster
+from folium.utilities import JsCode
+
+from crime_core.cache import get_result_cache
+from crime_core.data import get_boundaries, strip_accents_capitalize
+from crime_core.grid import COORD_DECIMALS, grid_cells, point_coords
+from crime_core.hexgrid import cell_boundary, cell_to_latlng
+from crime_core.hotspots import BIN_LABELS
+from crime_core.metrics import timed
+from crime_core.proximity import radius_column
+
+PLACE = "Ciudad de México, Mexico"
+
+# Points drawn individually in the marker layer; the rest are sampled out
+MAX_MARKERS = 1000
+
+# Distinct colors a cell layer can use; values are snapped to the nearest one
+PALETTE_LEVELS = 256
+
+# Leaflet styles each cell from its own properties, so folium emits no
+# per-cell style function
+_CELL_STYLE_JS = JsCode("""
+function(feature, layer) {
+    layer.setStyle({
+        color: feature.properties.color,
+        fillColor: feature.properties.color,
+        fillOpacity: 0.5,
+        weight: 0
+    });
+}
+""")
+
+# Hot-zone contours: outlined, lightly filled, over the density image
+_CONTOUR_STYLE_JS = JsCode("""
+function(feature, layer) {
+    layer.setStyle({
+        color: feature.properties.color,
+        fillColor: feature.properties.color,
+        fillOpacity: 0.15,
+        weight: 2
+    });
+}
+""")
+
+# Gi* confidence bins (crime_core.hotspots): reds for hot spots, blues for cold
+HOTSPOT_COLORS = {3: "#d7301f", 2: "#fc8d59", 1: "#fdcc8a", -1: "#bdd7e7", -2: "#6baed6", -3: "#2171b5"}
+
+# Emerging hot spot categories (crime_core.spacetime), from the most urgent
+EMERGING_COLORS = {
+    "Nuevo": "#7f0000", "Consecutivo": "#b30000", "Intensificándose": "#e34a33", "Persistente": "#fc8d59",
+    "Disminuyendo": "#fdbb84", "Esporádico": "#fdd49e", "Histórico": "#bcbddc",
+}
+
+# OSM layers offered by the page: tags, popup text and marker style
+POI_LAYERS = {
+    "schools": {"tags": {"amenity": "school"}, "name": "Escuelas", "popup": "Escuela",
+                "icon": {"color": "blue", "icon": "graduation-cap", "prefix": "fa"}},
+    "hospitals": {"tags": {"amenity": "hospital"}, "name": "Hospitales", "popup": "Hospital",
+                  "icon": {"color": "red", "icon": "plus", "prefix": "fa"}},
+    "metro": {"tags": {"railway": "station", "station": "subway"}, "name": "Estaciones de Metro",
+              "popup": "Estación de Metro", "icon": {"color": "orange", "icon": "subway", "prefix": "fa"}},
+    "parking": {"tags": {"amenity": "parking"}, "name": "Estacionamientos", "popup": "Estacionamiento",
+                "circle": "purple"},
+}
+
+
+def create_base_map(df):
+    """Base map centered on the crimes in `df`, with light and dark tile layers."""
+    m = folium.Map(
+        location=point_coords(df).mean(axis=0).round(COORD_DECIMALS).tolist(),
+        zoom_start=11,
+        tiles="OpenStreetMap",
+    )
+    folium.TileLayer("CartoDB positron", name="Light Map").add_to(m)
+    folium.TileLayer("CartoDB dark_matter", name="Dark Map").add_to(m)
+    return m
+
+
+def cell_count_map(cells):
+    """
+    Map of aggregated cells (crime_core.scoping.scoped_cells: lat, lon,
+    step, n) for roles without row-level access.
+    """
+    m = folium.Map(
+        location=[cells["lat"].mean(), cells["lon"].mean()],
+        zoom_start=11,
+        tiles="CartoDB positron",
+    )
+    colormap = cm.LinearColormap(
+        colors=["green", "yellow", "orange", "red"],
+        vmin=0,
+        vmax=cells["n"].max(),
+        caption="Crímenes por celda",
+    )
+    rects = pd.DataFrame({
+        "lat0": cells["lat"], "lon0": cells["lon"],
+        "lat1": cells["lat"] + cells["step"], "lon1": cells["lon"] + cells["step"],
+        "count": cells["n"],
+    })
+    add_cell_layer(m, rects, palette_colors(colormap, rects["count"]), "Celdas",
+                   fields=["count"], aliases=["Crímenes:"])
+    colormap.add_to(m)
+    return m
+
+
+def hex_count_map(counts, zoom_start=11, **layer):
+    """
+    Map of aggregated hexagonal cells (e.g. crime_core.scoping.scoped_hex_cells:
+    cell, count); `layer` is passed on to add_hex_layer.
+    """
+    lat, lon = cell_to_latlng(counts["cell"].to_numpy())
+    m = folium.Map(location=[lat.mean(), lon.mean()], zoom_start=zoom_start, tiles="CartoDB positron")
+    add_hex_layer(m, counts, **layer)
+    return m
+
+
+def palette_colors(colormap, values, levels=PALETTE_LEVELS):
+    """
+    Hex colors of `values` on `colormap`: the colormap is sampled `levels`
+    times and every value indexes that palette, instead of one colormap
+    call per value.
+    """
+    palette = np.array([colormap.rgb_hex_str(v) for v in np.linspace(colormap.vmin, colormap.vmax, levels)])
+    extent = (colormap.vmax - colormap.vmin) or 1
+    scaled = (np.asarray(values, dtype=float) - colormap.vmin) / extent
+    return palette[np.clip(np.rint(scaled * (levels - 1)), 0, levels - 1).astype(int)]
+
+
+def polygons_geojson(rings, properties, decimals=COORD_DECIMALS):
+    """
+    One FeatureCollection of polygons: `rings` is an (n, vertices, 2) array
+    of (lat, lon), rounded to `decimals`, and `properties` a DataFrame with
+    one row per polygon.
+    """
+    coords = np.round(np.asarray(rings, dtype=float)[..., ::-1], decimals)
+    closed = np.concatenate([coords, coords[:, :1]], axis=1).tolist()
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]}, "properties": prop}
+            for ring, prop in zip(closed, properties.to_dict("records"))
+        ],
+    }
+
+
+def _add_polygon_layer(m, geojson, name, fields, aliases, style=_CELL_STYLE_JS):
+    layer = folium.GeoJson(
+        geojson,
+        name=name,
+        on_each_feature=style,
+        tooltip=folium.GeoJsonTooltip(fields=fields, aliases=aliases, localize=True),
+    )
+    layer.add_to(m)
+    return layer
+
+
+def cells_geojson(cells, colors, decimals=COORD_DECIMALS):
+    """
+    One FeatureCollection for the rectangles in `cells` (lat0, lon0, lat1,
+    lon1 and any property columns), with each cell's color as a property.
+    """
+    lat0, lon0, lat1, lon1 = (cells[c].to_numpy(dtype=float) for c in ("lat0", "lon0", "lat1", "lon1"))
+    rings = np.stack([
+        np.column_stack([lat0, lon0]), np.column_stack([lat0, lon1]),
+        np.column_stack([lat1, lon1]), np.column_stack([lat1, lon0]),
+    ], axis=1)
+    props = cells.drop(columns=["lat0", "lon0", "lat1", "lon1"]).assign(color=colors)
+    return polygons_geojson(rings, props, decimals)
+
+
+def add_cell_layer(m, cells, colors, name, fields, aliases):
+    """Add `cells` as a single GeoJSON layer with a tooltip of `fields`."""
+    if cells.empty:
+        return None
+    return _add_polygon_layer(m, cells_geojson(cells, colors), name, fields, aliases)
+
+
+@timed("maps.add_hex_layer")
+def add_hex_layer(m, counts, name="Hexágonos", column="count",
+                  caption="Crímenes por hexágono", alias="Crímenes:"):
+    """
+    Hexagonal cells (crime_core.hexgrid) colored by `column`, as one
+    GeoJSON layer; `counts` has the cell ids in column cell.
+    """
+    if counts.empty:
+        return None
+    values = counts[column].to_numpy()
+    colormap = cm.LinearColormap(
+        colors=["green", "yellow", "orange", "red"],
+        vmin=0,
+        vmax=values.max(),
+        caption=caption,
+    )
+    props = pd.DataFrame({
+        column: values.round(4) if values.dtype.kind == "f" else values,
+        "color": palette_colors(colormap, values),
+    })
+    layer = _add_polygon_layer(
+        m, polygons_geojson(cell_boundary(counts["cell"].to_numpy()), props), name,
+        fields=[column], aliases=[alias],
+    )
+    colormap.add_to(m)
+    return layer
+
+
+@timed("maps.add_density_layer")
+def add_density_layer(m, surface, bands, name="Densidad de crimen", opacity=0.7):
+    """
+    Kernel density surface (crime_core.density.kde_surface) as one image
+    overlay, and its hot-zone `bands` (density.hotspot_polygons) as one
+    GeoJSON layer of contours. Low densities fade out instead of covering
+    the map.
+    """
+    peak = surface.density.max()
+    if peak <= 0:
+        return None
+    colormap = cm.LinearColormap(
+        colors=["green", "yellow", "orange", "red"],
+        vmin=0,
+        vmax=peak,
+        caption="Densidad de crimen (crímenes/km²)",
+    )
+    palette = np.array([colormap.rgba_bytes_tuple(v) for v in np.linspace(0, peak, PALETTE_LEVELS)], dtype=np.uint8)
+    scaled = surface.density / peak
+    image = palette[np.rint(scaled * (PALETTE_LEVELS - 1)).astype(int)]
+    image[..., 3] = np.rint(255 * np.sqrt(scaled)).astype(np.uint8)
+    folium.raster_layers.ImageOverlay(
+        image,
+        bounds=[[surface.lat_bins[0], surface.lon_bins[0]], [surface.lat_bins[-1], surface.lon_bins[-1]]],
+        origin="lower",
+        mercator_project=True,
+        pixelated=False,
+        opacity=opacity,
+        name=name,
+    ).add_to(m)
+    colormap.add_to(m)
+
+    if not bands:
+        return None
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "MultiPolygon",
+                    "coordinates": [
+                        [np.round(ring[:, ::-1], COORD_DECIMALS).tolist() for ring in polygon]
+                        for polygon in band["polygons"]
+                    ],
+                },
+                "properties": {
+                    "zona": f"Percentil {band['percentile']}",
+                    "densidad": round(band["level"], 1),
+                    "color": colormap.rgb_hex_str(band["level"]),
+                },
+            }
+            for band in bands
+        ],
+    }
+    return _add_polygon_layer(
+        m, geojson, "Zonas calientes", fields=["zona", "densidad"],
+        aliases=["Zona:", "Desde (crímenes/km²):"], style=_CONTOUR_STYLE_JS,
+    )
+
+
+@timed("maps.add_hotspot_layer")
+def add_hotspot_layer(m, cells, name="Puntos calientes y fríos (Gi*)"):
+    """
+    The significant cells of a Gi* analysis (hotspots.hotspot_cells, bin
+    not 0) as one GeoJSON layer colored by confidence bin. Returns the
+    number of cells drawn.
+    """
+    cells = cells[cells["bin"] != 0]
+    props = cells[["lat0", "lon0", "lat1", "lon1", "count"]].assign(
+        zona=cells["bin"].map(BIN_LABELS),
+        z=cells["z"].round(2),
+        q=cells["q_value"].round(4),
+    )
+    add_cell_layer(m, props, cells["bin"].map(HOTSPOT_COLORS).to_numpy(), name,
+                   fields=["zona", "z", "q", "count"], aliases=["Zona:", "Gi* (z):", "q (FDR):", "Crímenes:"])
+    return len(cells)
+
+
+@timed("maps.add_emerging_layer")
+def add_emerging_layer(m, cells, name="Puntos calientes emergentes"):
+    """
+    The categorized cells of an emerging hot spot analysis
+    (spacetime.emerging_hotspots) as one GeoJSON layer colored by category.
+    Returns the number of cells drawn.
+    """
+    cells = cells[cells["category"].notna()]
+    props = cells[["lat0", "lon0", "lat1", "lon1", "count", "hot_weeks"]].assign(
+        zona=cells["category"],
+        tendencia=cells["trend_z"].round(2),
+    )
+    add_cell_layer(m, props, cells["category"].map(EMERGING_COLORS).to_numpy(), name,
+                   fields=["zona", "hot_weeks", "tendencia", "count"],
+                   aliases=["Patrón:", "Semanas como punto caliente:", "Tendencia (Mann-Kendall z):", "Crímenes:"])
+    return len(cells)
+
+
+def crime_popups(df):
+    """Popup HTML of each crime in `df`, as shown by the marker layers."""
+    return [
+        f"<b>Crime:</b> {delito}<br><b>Date:</b> {fecha}<br><b>Alcaldía:</b> {alcaldia}"
+        for delito, fecha, alcaldia in zip(df["delito"], df["fecha_hecho"], df["alcaldia_hecho"])
+    ]
+
+
+def add_crime_markers(m, df, max_points=MAX_MARKERS, seed=None):
+    """Clustered markers for a sample of at most `max_points` crimes."""
+    marker_cluster = MarkerCluster().add_to(m)
+    sample_df = df.sample(min(max_points, len(df)), random_state=seed)
+    for (lat, lon), popup in zip(point_coords(sample_df), crime_popups(sample_df)):
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=3,
+            popup=popup,
+            color="red",
+            fill=True,
+            fillColor="red",
+        ).add_to(marker_cluster)
+    return marker_cluster
+
+
+def add_heatmap(m, df, radius=15, blur=25, name="Heatmap de crimen"):
+    HeatMap(
+        point_coords(df).tolist(),
+        radius=radius,
+        blur=blur,
+        max_zoom=13,
+        name=name,
+    ).add_to(m)
+
+
+def add_timeline(m, groups, labels):
+    """Animated heatmap with one frame per window (see grid.timeline_groups)."""
+    if groups:
+        HeatMapWithTime(
+            groups,
+            index=labels,
+            auto_play=True,
+            radius=15,
+            max_opacity=0.8,
+            name="Línea de tiempo de crimen animada",
+        ).add_to(m)
+
+
+@timed("maps.add_grid_to_map")
+def add_grid_to_map(m, lat_bins, lon_bins, grid_counts, grid_probs, threshold=0):
+    """
+    Colored grid sectors as one GeoJSON layer: the non-empty cells whose
+    probability is at least `threshold` percent of the hottest cell's
+    (see grid.grid_cells). Returns the number of cells drawn.
+    """
+    colormap = cm.LinearColormap(
+        colors=["green", "yellow", "orange", "red"],
+        vmin=0,
+        vmax=grid_probs.max(),
+        caption="Probabilidad de crimen (%)",
+    )
+    cells = grid_cells(lat_bins, lon_bins, grid_counts, grid_probs, threshold)
+    colors = palette_colors(colormap, cells["prob"])
+    cells = cells.assign(prob=cells["prob"].round(2))
+    add_cell_layer(m, cells, colors, "Cuadrícula de probabilidad",
+                   fields=["prob", "count"], aliases=["Probabilidad (%):", "Crímenes:"])
+    colormap.add_to(m)
+    return len(cells)
+
+
+def add_alcaldias_to_map(m, geojson_path, crime_counts_df):
+    """
+    Alcaldía boundaries colored by crime count, with a label at each centroid.
+    `crime_counts_df` has columns alcaldia_hecho and count (grid.counts_by_alcaldia).
+    Raises FileNotFoundError if the GeoJSON is missing.
+    """
+    if not os.path.exists(geojson_path):
+        raise FileNotFoundError(f"GeoJSON archivo no encontrado en {geojson_path}")
+
+    # Parsed once per process (see crime_core.startup)
+    alcaldias_geo, alcaldias_labels = get_boundaries(geojson_path)
+
+    crime_dict = {
+        strip_accents_capitalize(name): count
+        for name, count in zip(crime_counts_df["alcaldia_hecho"], crime_counts_df["count"])
+    }
+
+    max_crimes = max(crime_dict.values()) if crime_dict else 1
+    colormap = cm.LinearColormap(
+        colors=["#ffffcc", "#ffeda0", "#fed976", "#feb24c", "#fd8d3c", "#fc4e2a", "#e31a1c", "#bd0026", "#800026"],
+        vmin=0,
+        vmax=max_crimes,
+        caption="Numero de crimenes",
+    )
+
+    def style_function(feature):
+        """Style each alcaldía based on crime count"""
+        alcaldia_normalized = strip_accents_capitalize(feature["properties"].get("NOMGEO", ""))
+        crime_count = crime_dict.get(alcaldia_normalized, 0)
+        return {
+            "fillColor": colormap(crime_count) if crime_count > 0 else "#cccccc",
+            "color": "black",
+            "weight": 2,
+            "fillOpacity": 0.6,
+        }
+
+    def highlight_function(feature):
+        """Highlight on hover"""
+        return {"fillColor": "#ffff00", "color": "black", "weight": 3, "fillOpacity": 0.8}
+
+    folium.GeoJson(
+        alcaldias_geo,
+        name="Alcaldías",
+        style_function=style_function,
+        highlight_function=highlight_function,
+        tooltip=folium.GeoJsonTooltip(fields=["NOMGEO"], aliases=["Alcaldía:"], localize=True),
+        popup=folium.GeoJsonPopup(fields=["NOMGEO"], aliases=["Alcaldía:"], localize=True),
+    ).add_to(m)
+
+    for row in alcaldias_labels.itertuples(index=False):
+        alcaldia_name = strip_accents_capitalize(row.NOMGEO)
+        crime_count = crime_dict.get(alcaldia_name, 0)
+        folium.Marker(
+            location=[row.lat, row.lon],
+            icon=folium.DivIcon(html=f'''
+                <div style="
+                    font-size: 10px;
+                    font-weight: bold;
+                    color: white;
+                    text-align: center;
+                    background-color: rgba(0, 0, 0, 0.7);
+                    border-radius: 5px;
+                    padding: 2px 5px;
+                    white-space: nowrap;
+                ">
+                    {alcaldia_name}<br>{crime_count:,} crimes
+                </div>
+            '''),
+        ).add_to(m)
+
+    colormap.add_to(m)
+
+
+# ============================================================================
+# POINTS OF INTEREST (OpenStreetMap)
+# ============================================================================
+
+@get_result_cache().memoize("maps.osm_features", disk=True)
+def osm_features(tags, place=PLACE):
+    """OSMnx features of `place` matching `tags`; failures raise and are not cached."""
+    import osmnx as ox
+    return ox.features_from_place(place, tags)
+
+
+def poi_points(layer):
+    """
+    Name and centroid (lat, lon) of every feature of one of POI_LAYERS;
+    unnamed features take the layer's popup text. Raises if the OSM
+    download fails.
+    """
+    spec = POI_LAYERS[layer]
+    gdf = osm_features(spec["tags"])
+    names = gdf["name"] if "name" in gdf.columns else pd.Series(None, index=gdf.index, dtype=object)
+    rows = [
+        (name, geometry.centroid.y, geometry.centroid.x)
+        for name, geometry in zip(names.fillna(spec["popup"]), gdf.geometry)
+        if hasattr(geometry, "centroid")
+    ]
+    return pd.DataFrame(rows, columns=["name", "lat", "lon"])
+
+
+def add_poi_layer(m, layer):
+    """Add one of POI_LAYERS to the map; raises if the OSM download fails."""
+    spec = POI_LAYERS[layer]
+    group = folium.FeatureGroup(name=spec["name"])
+    for row in poi_points(layer).itertuples(index=False):
+        if "circle" in spec:
+            folium.CircleMarker(
+                location=[row.lat, row.lon],
+                radius=5,
+                popup=spec["popup"],
+                color=spec["circle"],
+                fill=True,
+                fillColor=spec["circle"],
+            ).add_to(group)
+        else:
+            folium.Marker(
+                location=[row.lat, row.lon],
+                popup=spec["popup"],
+                icon=folium.Icon(**spec["icon"]),
+            ).add_to(group)
+    group.add_to(m)
+    return group
+
+
+@timed("maps.add_proximity_layer")
+def add_proximity_layer(m, counts, radius_m, name):
+    """
+    A circle of `radius_m` around each point of interest in `counts`
+    (proximity.poi_crime_counts, usually its top_pois), colored by the
+    crimes inside it.
+    """
+    column = radius_column(radius_m)
+    if counts.empty:
+        return None
+    colormap = cm.LinearColormap(
+        colors=["green", "yellow", "orange", "red"],
+        vmin=0,
+        vmax=max(int(counts[column].max()), 1),
+        caption=f"Crímenes a {radius_m} m",
+    )
+    group = folium.FeatureGroup(name=name)
+    for row, color in zip(counts.itertuples(index=False), palette_colors(colormap, counts[column])):
+        folium.Circle(
+            location=[row.lat, row.lon],
+            radius=radius_m,
+            color=color,
+            weight=1,
+            fill=True,
+            fill_color=color,
+            fill_opacity=0.35,
+            tooltip=f"{row.name}: {getattr(row, column):,} crímenes a {radius_m} m",
+        ).add_to(group)
+    group.add_to(m)
+    colormap.add_to(m)
+    return group
+
+
+def add_radius_query_layer(m, lat, lon, radius_m, rows, max_points=MAX_MARKERS):
+    """
+    The circle of a radius query (proximity.radius_report) and its nearest
+    `max_points` crimes.
+    """
+    group = folium.FeatureGroup(name=f"Consulta a {radius_m} m")
+    folium.Circle(
+        location=[lat, lon], radius=radius_m, color="#3388ff", weight=2, fill=True, fill_opacity=0.08,
+    ).add_to(group)
+    folium.Marker(
+        location=[lat, lon],
+        tooltip=f"{len(rows):,} crímenes a {radius_m} m",
+        icon=folium.Icon(color="blue", icon="crosshairs", prefix="fa"),
+    ).add_to(group)
+    nearest = rows.head(max_points)
+    for (crime_lat, crime_lon), row in zip(point_coords(nearest), nearest.itertuples(index=False)):
+        folium.CircleMarker(
+            location=[crime_lat, crime_lon],
+            radius=3,
+            popup=f"<b>Crime:</b> {row.delito}<br><b>Date:</b> {row.fecha_hecho}<br><b>Distancia:</b> {row.distancia_m:,.0f} m",
+            color="purple",
+            fill=True,
+            fillColor="purple",
+        ).add_to(group)
+    group.add_to(m)
+    return group
+
+
+# ============================================================================
+# VIEWPORT LAYER (components.viewport_map)
+# ============================================================================
+
+# folium names every element with a random uuid4().hex
+_ELEMENT_ID = re.compile(r"(?<![0-9a-f])[0-9a-f]{32}(?![0-9a-f])")
+
+
+def stable_html(m):
+    """
+    Standalone HTML document of `m` with folium's random element ids
+    numbered in order of appearance, so the same layers always give the
+    same document and the viewport map does not reload them.
+    """
+    ids = {}
+    return _ELEMENT_ID.sub(lambda match: ids.setdefault(match.group(), f"{len(ids):032x}"), m.get_root().render())
+
+
+@timed("maps.viewport_layer_data")
+def viewport_layer_data(layer, style="markers"):
+    """
+    JSON-ready form of a crime_core.viewport.ViewportLayer for the viewport
+    map. Style "markers" gives colored hexagons (GeoJSON with count and
+    color) or [lat, lon, popup] points; style "heat" gives [lat, lon,
+    weight] points for a heatmap, weighted by count when aggregated.
+    """
+    data = {"kind": "heat" if style == "heat" else layer.kind, "in_view": layer.in_view}
+    if layer.kind == "cells":
+        counts = layer.features["count"].to_numpy()
+        if style == "heat":
+            coords = np.round(layer.features[["lat", "lon"]].to_numpy(dtype=float), COORD_DECIMALS)
+            weights = np.round(counts / max(counts.max(initial=0), 1), 4)
+            data["points"] = np.column_stack([coords, weights]).tolist()
+            return data
+        colormap = cm.LinearColormap(
+            colors=["green", "yellow", "orange", "red"], vmin=0, vmax=max(counts.max(initial=0), 1),
+        )
+        props = pd.DataFrame({"count": counts, "color": palette_colors(colormap, counts)})
+        data["geojson"] = polygons_geojson(cell_boundary(layer.features["cell"].to_numpy()), props)
+        return data
+
+    coords = point_coords(layer.features).tolist()
+    if style == "heat":
+        data["points"] = [[lat, lon, 1] for lat, lon in coords]
+    else:
+        data["points"] = [[lat, lon, popup] for (lat, lon), popup in zip(coords, crime_popups(layer.features))]
+    return data
@@ -0,0 +1,184 @@
+"""
+Timing and memory instrumentation for the hot paths.
+
+    with span("mapa.folium_html", viz=viz_type):
+        html = m._repr_html_()
+
+    @timed("data.clean")
+    def clean_crime_data(...): ...
+
+Each finished span appends one JSON line to the metrics store
+(`metrics/spans.jsonl`, or CRIME_METRICS_PATH) with its wall time, the
+process RSS after it and the RSS delta, the enclosing span and any extra
+attributes. Spans nest per thread/task, so a slow page load can be broken
+down into its SQL, cleaning and rendering steps. CRIME_METRICS=0 turns the
+recording off. `load_spans` and the summaries below feed the Rendimiento page.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_PATH = Path(os.environ.get("CRIME_METRICS_PATH", "metrics/spans.jsonl"))
+ENABLED = os.environ.get("CRIME_METRICS", "1") != "0"
+
+# The store is rotated to `<name>.1` past this size, so it stays bounded
+MAX_FILE_BYTES = 50 * 1024 * 1024
+
+_MB = 1024 * 1024
+_lock = threading.Lock()
+_current = contextvars.ContextVar("crime_metrics_span", default=None)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+def _write(record, path):
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists() and path.stat().st_size > MAX_FILE_BYTES:
+                os.replace(path, path.with_name(path.name + ".1"))
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass  # instrumentation must never break the page
+
+
+@contextmanager
+def span(name, path=None, **attrs):
+    """
+    Time the enclosed block and record it as `name` with `attrs`. The block
+    gets the attrs dict and may add to it (e.g. sizes only known at the end).
+    """
+    if not ENABLED:
+        yield dict(attrs)
+        return
+    parent = _current.get()
+    token = _current.set(name)
+    rss_before = rss_bytes()
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        yield attrs
+    except Exception:
+        ok = False
+        raise
+    finally:
+        # Streamlit's st.stop()/st.rerun() are BaseExceptions and count as ok
+        ms = (time.perf_counter() - t0) * 1000
+        _current.reset(token)
+        rss_after = rss_bytes()
+        record = {
+            "ts": time.time(),
+            "span": name,
+            "ms": round(ms, 3),
+            "rss_mb": round(rss_after / _MB, 2) if rss_after is not None else None,
+            "rss_delta_mb": round((rss_after - rss_before) / _MB, 3) if None not in (rss_after, rss_before) else None,
+            "parent": parent,
+            "ok": ok,
+            "pid": os.getpid(),
+        }
+        if attrs:
+            record["attrs"] = attrs
+        _write(record, Path(path) if path else METRICS_PATH)
+
+
+def timed(name=None, **attrs):
+    """Decorator form of `span`; the name defaults to module.function."""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attrs):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ============================================================================
+# READING AND SUMMARIZING
+# ============================================================================
+
+def load_spans(path=None, since=None):
+    """
+    Recorded spans as a DataFrame (ts as datetime), including the rotated
+    file. `since` is an epoch timestamp; older records are dropped.
+    """
+    import pandas as pd
+
+    path = Path(path) if path else METRICS_PATH
+    records = []
+    for p in (path.with_name(path.name + ".1"), path):
+        if not p.exists():
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by a crash or a concurrent rotation
+                if since is None or record.get("ts", 0) >= since:
+                    records.append(record)
+
+    columns = ["ts", "span", "ms", "rss_mb", "rss_delta_mb", "parent", "ok", "pid", "attrs"]
+    df = pd.DataFrame.from_records(records, columns=columns)
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df
+
+
+def summarize(df):
+    """Per-span count, p50/p95/max milliseconds and mean RSS delta, slowest p95 first."""
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=["span", "n", "p50_ms", "p95_ms", "max_ms", "rss_delta_mb", "errores"])
+    grouped = df.groupby("span")
+    out = pd.DataFrame({
+        "n": grouped["ms"].size(),
+        "p50_ms": grouped["ms"].quantile(0.5),
+        "p95_ms": grouped["ms"].quantile(0.95),
+        "max_ms": grouped["ms"].max(),
+        "rss_delta_mb": grouped["rss_delta_mb"].mean(),
+        "errores": grouped["ok"].apply(lambda s: int((~s.astype(bool)).sum())),
+    })
+    return out.sort_values("p95_ms", ascending=False).reset_index()
+
+
+def percentiles_over_time(df, freq="1h"):
+    """p50/p95 milliseconds per span and `freq` time bucket (long format)."""
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=["span", "ts", "n", "p50_ms", "p95_ms"])
+    grouped = df.groupby(["span", pd.Grouper(key="ts", freq=freq)])["ms"]
+    out = pd.DataFrame({
+        "n": grouped.size(),
+        "p50_ms": grouped.quantile(0.5),
+        "p95_ms": grouped.quantile(0.95),
+    })
+    return out[out["n"] > 0].reset_index()
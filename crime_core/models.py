@@ -0,0 +1,285 @@
+"""
+Model registry for the prediction models.
+
+Discovers the models shipped next to the app, loads them lazily (preferring
+the native XGBoost UBJ/JSON format over pickles) and keeps per-model
+metadata: feature names, training date, checksum, load time and memory.
+"""
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).resolve().parent.parent
+
+PICKLE_SUFFIX = ".pkl"
+META_SUFFIX = ".meta.json"
+NATIVE_FORMATS = {".ubj": "ubj", ".json": "json"}
+
+
+@dataclass
+class ModelInfo:
+    """Metadata and load metrics for one registered model."""
+    name: str
+    path: str
+    fmt: str
+    size_bytes: int
+    sha256: str
+    feature_names: list = None
+    trained_at: str = None
+    loaded: bool = False
+    load_seconds: float = None
+    memory_bytes: int = None
+    error: str = None
+
+
+def _sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _booster_of(model):
+    return model.get_booster() if hasattr(model, "get_booster") else model
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry of the prediction models found in `model_dir`.
+
+    A model is either a `<name>.pkl` pickle or a native booster described by
+    a `<name>.meta.json` sidecar (written by `export_native`). When both
+    exist the native file wins because it loads without unpickling.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = Path(model_dir)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._models = {}
+        self._predictors = {}
+        self._infos = {}
+        self._warm_thread = None
+        self.refresh()
+
+    # ------------------------------------------------------------------
+    # Discovery
+    # ------------------------------------------------------------------
+    def refresh(self):
+        """Rescan `model_dir`; already loaded models are kept."""
+        infos = {}
+        for pkl in sorted(self.model_dir.glob(f"*{PICKLE_SUFFIX}")):
+            infos[pkl.stem] = ModelInfo(
+                name=pkl.stem,
+                path=str(pkl),
+                fmt="pickle",
+                size_bytes=pkl.stat().st_size,
+                sha256=_sha256(pkl),
+            )
+
+        for meta_path in sorted(self.model_dir.glob(f"*{META_SUFFIX}")):
+            meta = _read_meta(meta_path)
+            native = self.model_dir / meta.get("file", "")
+            fmt = NATIVE_FORMATS.get(native.suffix)
+            if not meta.get("file") or fmt is None or not native.exists():
+                continue
+            name = meta_path.name[: -len(META_SUFFIX)]
+            infos[name] = ModelInfo(
+                name=name,
+                path=str(native),
+                fmt=fmt,
+                size_bytes=native.stat().st_size,
+                sha256=_sha256(native),
+                feature_names=meta.get("feature_names"),
+                trained_at=meta.get("trained_at"),
+            )
+
+        with self._lock:
+            for name, info in infos.items():
+                old = self._infos.get(name)
+                if old is not None and old.loaded and old.sha256 == info.sha256:
+                    infos[name] = old
+            self._models = {k: v for k, v in self._models.items() if infos.get(k) is self._infos.get(k)}
+            self._predictors = {k: v for k, v in self._predictors.items() if k[0] in self._models}
+            self._infos = infos
+
+    def available(self):
+        """Names of every model that can be loaded."""
+        with self._lock:
+            return sorted(self._infos)
+
+    def info(self, name):
+        with self._lock:
+            return self._infos.get(name)
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def _loader(self, info):
+        """Import the backend up front so load_seconds measures only the file load."""
+        if info.fmt == "pickle":
+            import joblib
+            return joblib.load
+
+        import xgboost as xgb
+
+        def _load_native(path):
+            model = xgb.XGBRegressor()
+            model.load_model(path)
+            return model
+        return _load_native
+
+    def get(self, name):
+        """
+        Return the loaded model, loading it on first use.
+        Raises FileNotFoundError if `name` is not registered.
+        """
+        with self._lock:
+            model = self._models.get(name)
+            info = self._infos.get(name)
+        if model is not None:
+            return model
+        if info is None:
+            raise FileNotFoundError(f"Modelo no registrado: {name}")
+
+        # Loads are serialized so two sessions never unpickle the same file twice
+        with self._load_lock:
+            with self._lock:
+                if name in self._models:
+                    return self._models[name]
+            try:
+                load = self._loader(info)
+                start = time.perf_counter()
+                model = load(info.path)
+                if isinstance(model, str):
+                    raise ValueError(f"El archivo {Path(info.path).name} es texto, no un modelo")
+            except Exception as e:
+                info.error = str(e)
+                raise
+            info.load_seconds = time.perf_counter() - start
+
+            booster = _booster_of(model)
+            if hasattr(booster, "save_raw"):
+                # Size of the in-memory tree buffer; a stable proxy for the booster footprint
+                info.memory_bytes = len(booster.save_raw())
+            if not info.feature_names and getattr(booster, "feature_names", None):
+                info.feature_names = list(booster.feature_names)
+            info.loaded = True
+            info.error = None
+
+            with self._lock:
+                self._models[name] = model
+        return model
+
+    def predictor(self, name, backend="auto"):
+        """Fast-inference wrapper (see crime_core.inference) built once per model and backend."""
+        key = (name, backend)
+        with self._lock:
+            predictor = self._predictors.get(key)
+        if predictor is None:
+            from crime_core.inference import FastPredictor
+            predictor = FastPredictor(self.get(name), backend=backend)
+            with self._lock:
+                predictor = self._predictors.setdefault(key, predictor)
+        return predictor
+
+    def warm_up(self, background=True):
+        """Load every registered model, by default in a daemon thread. Idempotent."""
+        def _run():
+            for name in self.available():
+                try:
+                    self.predictor(name)
+                except Exception:
+                    pass  # recorded in ModelInfo.error
+
+        if not background:
+            _run()
+            return None
+        with self._lock:
+            if self._warm_thread is None:
+                self._warm_thread = threading.Thread(
+                    target=_run, name="model-warm-up", daemon=True
+                )
+                self._warm_thread.start()
+            return self._warm_thread
+
+    def metrics(self):
+        """One dict per model with its metadata and load metrics."""
+        with self._lock:
+            return [asdict(info) for _, info in sorted(self._infos.items())]
+
+
+def export_native(name, registry=None, fmt="ubj"):
+    """
+    Save a registered model in XGBoost's native format next to the pickle,
+    together with a `<name>.meta.json` sidecar describing it.
+    """
+    registry = registry or get_registry()
+    info = registry.info(name)
+    if info is None:
+        raise FileNotFoundError(f"Modelo no registrado: {name}")
+    model = registry.get(name)
+
+    suffix = {v: k for k, v in NATIVE_FORMATS.items()}[fmt]
+    target = registry.model_dir / f"{name}{suffix}"
+    model.save_model(str(target))
+
+    booster = _booster_of(model)
+    source = Path(info.path)
+    meta = {
+        "file": target.name,
+        "estimator": type(model).__name__,
+        "feature_names": list(booster.feature_names or []),
+        # Only a known training time; the pickle's mtime is when it was checked out
+        "trained_at": info.trained_at,
+        "source": source.name,
+        "source_sha256": info.sha256,
+    }
+    with open(registry.model_dir / f"{name}{META_SUFFIX}", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return target
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry shared by every Streamlit session."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lista o exporta los modelos registrados.")
+    parser.add_argument("--export", action="store_true",
+                        help="Guardar los modelos pickle en formato nativo de XGBoost")
+    parser.add_argument("--format", choices=sorted(NATIVE_FORMATS.values()), default="ubj")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    if args.export:
+        for name in registry.available():
+            if registry.info(name).fmt == "pickle":
+                print(f"{name} -> {export_native(name, registry, args.format).name}")
+        registry.refresh()
+    registry.warm_up(background=False)
+    print(json.dumps(registry.metrics(), indent=2, ensure_ascii=False))
@@ -0,0 +1,96 @@
+"""
+TF-IDF retrieval over crime rows and prompting of a local Ollama model.
+
+The Chat page indexes the text of a few columns of each row, retrieves the
+rows closest to the question and asks the model to answer from them only.
+Nothing here touches Streamlit, so the index can be built and queried from
+benchmarks or batch jobs as well.
+"""
+import json
+
+import numpy as np
+
+from crime_core.metrics import timed
+
+OLLAMA_GENERATE_URL = "http://localhost:11434/api/generate"
+
+SYSTEM_INSTRUCTION = (
+    "Eres un asistente útil. Responde SO´LO usando las filas de contexto CSV proporcionadas. "
+    "Si la respuesta no está en el contexto, indica que no la encuentras."
+)
+
+
+@timed("retrieval.build_corpus_vectors")
+def build_corpus_vectors(df, cols):
+    """
+    One " | "-joined document per row of `df[cols]` and its TF-IDF matrix.
+    Returns (text_series, vectorizer, X).
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    text_series = df[list(cols)].astype(str).apply(lambda r: " | ".join(r.values), axis=1)
+    vec = TfidfVectorizer(strip_accents="unicode", ngram_range=(1, 2), min_df=1)
+    X = vec.fit_transform(text_series.values)
+    return text_series, vec, X
+
+
+@timed("retrieval.retrieve")
+def retrieve(vectorizer, X, query, k):
+    """Positions and cosine similarities of the `k` rows closest to `query`."""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    qv = vectorizer.transform([query])
+    sims = cosine_similarity(qv, X).ravel()
+    idx = np.argsort(-sims)[:k]
+    return idx, sims[idx]
+
+
+def context_rows(rows, cols):
+    """Compact, one-line-per-row context block for the prompt."""
+    return "\n".join(
+        f"- ROW {i}: " + " | ".join(f"{c}={str(rows.iloc[i][c])}" for c in cols)
+        for i in range(len(rows))
+    )
+
+
+def build_prompt(user_q, rows_md):
+    return (
+        f"{SYSTEM_INSTRUCTION}\n\n"
+        f"QUESTION:\n{user_q}\n\n"
+        f"CONTEXT (CSV rows):\n{rows_md}\n\n"
+        f"ANSWER:"
+    )
+
+
+def stream_from_ollama(prompt, model, temperature=0.7, max_tokens=256, url=OLLAMA_GENERATE_URL):
+    """
+    Yield the answer token by token. Connection and HTTP errors are yielded
+    as a final warning line, so callers can show them like any other text.
+    """
+    import requests
+
+    try:
+        with requests.post(
+            url,
+            json={
+                "model": model,
+                "prompt": prompt,
+                "stream": True,
+                "options": {"temperature": temperature, "num_predict": max_tokens},
+            },
+            stream=True,
+            timeout=0xFFFF,
+        ) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line.decode("utf-8"))
+                if "response" in data:
+                    yield data["response"]
+                if data.get("done"):
+                    break
+    except requests.exceptions.ConnectionError:
+        yield "⚠️ Cannot reach Ollama at http://localhost:11434. Is `ollama serve` running?"
+    except Exception as e:
+        yield f"⚠️ Error: {e}"
@@ -0,0 +1,191 @@
+"""
+Role-based data scoping, enforced in the SQL that reads crimes_raw.
+
+Each role maps to a `QueryProfile`. The profile decides which rows a session
+may see (all of them, or only its assigned alcaldías), which columns
+(Visitante never receives coordinates or exact dates), and whether the map
+gets individual crimes or only cells counted inside DuckDB. Because the
+filter is part of the query, a low-privilege session never transfers,
+cleans or keeps in memory anything outside its scope.
+"""
+from dataclasses import dataclass, replace
+
+from crime_core.db import ALCALDIAS_INVALIDAS
+
+# Columns the map works with (see crime_core.data)
+MAP_COLUMNS = (
+    "delito", "categoria_delito", "alcaldia_hecho", "latitud", "longitud", "fecha_hecho", "hora_hecho", "anio_hecho",
+)
+
+# Coarse, non-locating columns for roles without row-level access
+PUBLIC_COLUMNS = ("delito", "categoria_delito", "alcaldia_hecho", "anio_hecho")
+
+# SQL key used to compare alcaldías: upper case, no accents, trimmed
+ALCALDIA_KEY = "upper(strip_accents(trim(CAST(alcaldia_hecho AS VARCHAR))))"
+
+
+@dataclass(frozen=True)
+class QueryProfile:
+    role: str
+    # "rows": individual crimes; "cells": counts per grid cell only
+    map_level: str = "rows"
+    # None means every column / every alcaldía
+    columns: tuple = None
+    alcaldias: tuple = None
+    # Cells with fewer crimes than this are not returned (cells level only)
+    min_cell_count: int = 1
+
+    @property
+    def row_level(self):
+        return self.map_level == "rows"
+
+    def allows(self, column):
+        return self.columns is None or column in self.columns
+
+
+ROLE_PROFILES = {
+    "Socio Thales": QueryProfile("Socio Thales"),
+    "Agente Policiaco": QueryProfile("Agente Policiaco", columns=MAP_COLUMNS, alcaldias=()),
+    "Visitante": QueryProfile("Visitante", map_level="cells", columns=PUBLIC_COLUMNS, min_cell_count=5),
+}
+
+# Unknown or missing roles get the most restrictive profile
+DEFAULT_ROLE = "Visitante"
+
+
+def normalize_alcaldia(name):
+    """Python twin of ALCALDIA_KEY, for names chosen in the UI."""
+    import unicodedata
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    return text.strip().upper()
+
+
+def profile_for(role, alcaldias=None):
+    """
+    Profile of `role`. For Agente Policiaco `alcaldias` are the assigned
+    alcaldías; an agent with none assigned sees no rows.
+    """
+    profile = ROLE_PROFILES.get(role, ROLE_PROFILES[DEFAULT_ROLE])
+    if profile.alcaldias is not None:
+        assigned = tuple(sorted({normalize_alcaldia(a) for a in (alcaldias or [])}))
+        profile = replace(profile, alcaldias=assigned)
+    return profile
+
+
+def scope_filter(profile):
+    """(SQL condition, parameters) restricting crimes_raw to the profile's rows."""
+    if profile.alcaldias is None:
+        return "TRUE", []
+    if not profile.alcaldias:
+        return "FALSE", []
+    placeholders = ", ".join("?" for _ in profile.alcaldias)
+    return f"{ALCALDIA_KEY} IN ({placeholders})", list(profile.alcaldias)
+
+
+def select_list(profile, wanted=None):
+    """Columns to SELECT: `wanted` (or all) intersected with what the profile allows."""
+    if wanted is None:
+        return "*" if profile.columns is None else ", ".join(profile.columns)
+    allowed = [c for c in wanted if profile.allows(c)]
+    if not allowed:
+        raise PermissionError(f"El rol {profile.role} no tiene acceso a estas columnas")
+    return ", ".join(allowed)
+
+
+def _category_filter(categorias):
+    if not categorias:
+        return "TRUE", []
+    placeholders = ", ".join("?" for _ in categorias)
+    return f"upper(trim(categoria_delito)) IN ({placeholders})", [c.upper() for c in categorias]
+
+
+def scoped_rows(con, profile, columns=None, where="TRUE", params=(), limit=None):
+    """Rows of crimes_raw visible to `profile`, with an optional extra filter."""
+    scope_sql, scope_params = scope_filter(profile)
+    sql = f"SELECT {select_list(profile, columns)} FROM crimes_raw WHERE ({scope_sql}) AND ({where})"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return con.execute(sql, scope_params + list(params)).df()
+
+
+def scoped_cells(con, profile, cell_km=1.0, categorias=None):
+    """
+    Crime counts per square cell of `cell_km`, aggregated in DuckDB.
+    Returns lat/lon of the cell's south-west corner, its size in degrees and
+    the count `n`; cells under the profile's `min_cell_count` are dropped.
+    """
+    step = cell_km / 111.0
+    scope_sql, scope_params = scope_filter(profile)
+    cat_sql, cat_params = _category_filter(categorias)
+    df = con.execute(
+        f"""
+        SELECT floor(lat / ?) AS i, floor(lon / ?) AS j, COUNT(*) AS n
+        FROM (
+            SELECT TRY_CAST(latitud AS DOUBLE) AS lat, TRY_CAST(longitud AS DOUBLE) AS lon, categoria_delito, alcaldia_hecho
+            FROM crimes_raw
+        )
+        WHERE lat BETWEEN 19.0 AND 19.6 AND lon BETWEEN -99.4 AND -98.9
+          AND ({scope_sql}) AND ({cat_sql})
+        GROUP BY ALL
+        HAVING COUNT(*) >= ?
+        """,
+        [step, step] + scope_params + cat_params + [profile.min_cell_count],
+    ).df()
+    df["lat"] = df.pop("i") * step
+    df["lon"] = df.pop("j") * step
+    df["step"] = step
+    return df[["lat", "lon", "step", "n"]]
+
+
+def scoped_hex_cells(con, profile, res, categorias=None):
+    """
+    Crime counts per hexagonal cell of resolution `res` (crime_core.hexgrid),
+    an integer GROUP BY in DuckDB. Returns columns cell and count; cells
+    under the profile's `min_cell_count` are dropped.
+    """
+    # Imported here: app.py imports this module on the login path, before pandas
+    from crime_core.hexgrid import hex_expr
+
+    scope_sql, scope_params = scope_filter(profile)
+    cat_sql, cat_params = _category_filter(categorias)
+    return con.execute(
+        f"""
+        SELECT {hex_expr(con, res)} AS cell, COUNT(*) AS count
+        FROM crimes_raw
+        WHERE TRY_CAST(latitud AS DOUBLE) BETWEEN 19.0 AND 19.6
+          AND TRY_CAST(longitud AS DOUBLE) BETWEEN -99.4 AND -98.9
+          AND ({scope_sql}) AND ({cat_sql})
+        GROUP BY cell
+        HAVING COUNT(*) >= ?
+        """,
+        scope_params + cat_params + [profile.min_cell_count],
+    ).df()
+
+
+def scoped_counts(con, profile, column, categorias=None, limit=None):
+    """Counts per value of `column` (e.g. delito, alcaldia_hecho) within the profile."""
+    if not profile.allows(column):
+        raise PermissionError(f"El rol {profile.role} no tiene acceso a {column}")
+    scope_sql, scope_params = scope_filter(profile)
+    cat_sql, cat_params = _category_filter(categorias)
+    sql = f"""
+        SELECT upper(trim(CAST({column} AS VARCHAR))) AS valor, COUNT(*) AS n
+        FROM crimes_raw
+        WHERE ({scope_sql}) AND ({cat_sql}) AND {column} IS NOT NULL
+        GROUP BY 1
+        ORDER BY n DESC
+    """
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return con.execute(sql, scope_params + cat_params).df()
+
+
+def list_alcaldias(con):
+    """Alcaldía keys present in crimes_raw, for assigning them to agents."""
+    placeholders = ", ".join("?" for _ in ALCALDIAS_INVALIDAS)
+    df = con.execute(
+        f"SELECT DISTINCT {ALCALDIA_KEY} AS a FROM crimes_raw WHERE alcaldia_hecho IS NOT NULL "
+        f"AND {ALCALDIA_KEY} NOT IN ({placeholders}) ORDER BY 1",
+        ALCALDIAS_INVALIDAS,
+    ).df()
+    return [a for a in df["a"] if a]
@@ -0,0 +1,165 @@
+"""
+Hourly crime-count series per crime family, kept in DuckDB.
+
+`crime_hourly` holds one row per (familia, hour) with at least one crime;
+missing hours are zero. The table is rebuilt once with `rebuild_hourly_series`
+and then maintained at ingest by `ingest`, which appends the new raw rows and
+adds their hourly counts in the same transaction. `lag_matrix` reads the
+window needed for one day of lags with a single range query.
+"""
+import numpy as np
+import pandas as pd
+
+from crime_core.db import DB_PATH, connect, table_exists
+from crime_core.hexgrid import fill_hex_columns
+
+SERIES_TABLE = "crime_hourly"
+
+# familia -> ILIKE pattern over `delito`. A delito belongs to the first family it
+# matches, in the series (family_case) and in Predicciones (family_filter) alike
+CRIME_FAMILIES = {
+    "TRANSEUNTE": "%TRANSEUNTE%",
+    "NEGOCIO": "%NEGOCIO%",
+    "TRANSPORTE": "%TRANSPORTE%",
+    "HOMICIDIO": "%HOMICIDIO%",
+    "VIOLACION": "%VIOLACION%",
+}
+
+LAGS = (1, 2, 3, 6, 12, 24)
+
+# Hour of the event from fecha_hecho + hora_hecho (strings or DATE/TIME columns)
+_EVENT_HOUR = (
+    "date_trunc('hour', TRY_CAST(fecha_hecho AS DATE)"
+    " + COALESCE(TRY_CAST(hora_hecho AS TIME), TIME '00:00:00'))"
+)
+
+
+def family_case():
+    """SQL CASE expression mapping `delito` to its familia (NULL when none matches)."""
+    whens = " ".join(
+        f"WHEN delito ILIKE '{pattern}' THEN '{familia}'"
+        for familia, pattern in CRIME_FAMILIES.items()
+    )
+    return f"CASE {whens} END"
+
+
+def family_filter(familia):
+    """SQL condition selecting the delitos that `family_case` maps to `familia`."""
+    if familia not in CRIME_FAMILIES:
+        raise KeyError(f"Familia desconocida: {familia}")
+    return f"{family_case()} = '{familia}'"
+
+
+def _aggregate_sql(source):
+    return f"""
+        SELECT familia, ts, COUNT(*)::INTEGER AS n
+        FROM (
+            SELECT {family_case()} AS familia, {_EVENT_HOUR} AS ts
+            FROM {source}
+        )
+        WHERE familia IS NOT NULL AND ts IS NOT NULL
+        GROUP BY familia, ts
+    """
+
+
+def _create_series_table(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SERIES_TABLE} (
+            familia VARCHAR NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (familia, ts)
+        )
+    """)
+
+
+def rebuild_hourly_series(con):
+    """Recompute the whole series from crimes_raw. Returns the number of rows written."""
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(f"DROP TABLE IF EXISTS {SERIES_TABLE}")
+        _create_series_table(con)
+        # Sorted insert keeps min/max zonemaps tight, so ts range scans skip row groups
+        con.execute(f"INSERT INTO {SERIES_TABLE} {_aggregate_sql('crimes_raw')} ORDER BY familia, ts")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return con.execute(f"SELECT COUNT(*) FROM {SERIES_TABLE}").fetchone()[0]
+
+
+def ingest(con, new_rows):
+    """
+    Append `new_rows` (a DataFrame with the crimes_raw columns) and add their
+    hourly counts to the series, so the series never needs a full rebuild.
+    Their hexagonal cell ids are filled too if crimes_raw stores them
+    (crime_core.hexgrid).
+    """
+    _create_series_table(con)
+    con.register("_new_rows", new_rows)
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("INSERT INTO crimes_raw BY NAME SELECT * FROM _new_rows")
+        fill_hex_columns(con)
+        con.execute(f"""
+            INSERT INTO {SERIES_TABLE} {_aggregate_sql('_new_rows')}
+            ON CONFLICT (familia, ts) DO UPDATE SET n = n + excluded.n
+        """)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.unregister("_new_rows")
+    return len(new_rows)
+
+
+def has_series(con):
+    return table_exists(con, SERIES_TABLE)
+
+
+def lag_matrix(con, familia, fecha, lags=LAGS):
+    """
+    Lags for the 24 hours of `fecha` as a (24 x len(lags)) float32 array:
+    entry [h, i] is the count at hour h - lags[i].
+    """
+    day_start = pd.Timestamp(fecha).normalize().to_pydatetime()
+    max_lag = max(lags)
+    # Offsets are computed in SQL so the window fills with one vectorized assignment
+    offsets, counts = con.execute(
+        f"""
+        SELECT date_diff('hour', $start::TIMESTAMP, ts)::INTEGER AS k, n
+        FROM {SERIES_TABLE}
+        WHERE familia = $familia
+          AND ts >= $start::TIMESTAMP
+          AND ts < $start::TIMESTAMP + INTERVAL 1 HOUR * $span
+        """,
+        {"familia": familia, "start": day_start - pd.Timedelta(hours=max_lag), "span": max_lag + 24},
+    ).fetchnumpy().values()
+
+    # Position 0 is the start of the window, position max_lag + h is hour h of fecha
+    window = np.zeros(max_lag + 24, dtype=np.float32)
+    window[offsets] = counts
+    return window[(np.arange(24) + max_lag)[:, None] - np.asarray(lags)]
+
+
+def lag_features(con, familia, fecha, lags=LAGS):
+    """`lag_matrix` as a DataFrame with columns lag_1, lag_2, ..."""
+    return pd.DataFrame(lag_matrix(con, familia, fecha, lags), columns=[f"lag_{k}" for k in lags])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mantiene la serie horaria por familia de delito.")
+    parser.add_argument("--db", default=DB_PATH)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rebuild", action="store_true", help="Recalcular la serie completa")
+    group.add_argument("--ingest", metavar="CSV", help="Agregar filas nuevas desde un CSV")
+    args = parser.parse_args()
+
+    with connect(args.db, read_only=False) as con:
+        if args.rebuild:
+            print(f"{rebuild_hourly_series(con):,} horas con delitos en {SERIES_TABLE}")
+        else:
+            print(f"{ingest(con, pd.read_csv(args.ingest)):,} filas ingeridas")
@@ -0,0 +1,218 @@
+"""
+Space-time cube of crimes and emerging hot spot analysis.
+
+The cube counts crimes per cell of a fixed grid and per week starting on
+Monday, `SpaceTimeCube.counts[w, i, j]`. The grid is anchored to the CDMX
+box instead of to the extent of the data, so cubes built at different times
+line up and `SpaceTimeCube.append` only adds the slices of the new weeks.
+
+Every weekly slice gets a Gi* analysis (crime_core.hotspots) and the
+series of every cell is tested for a monotonic trend with a vectorized
+Mann-Kendall test. Together they classify the cells as emerging hot spot
+analysis does: new, consecutive, intensifying, persistent, diminishing,
+sporadic or historical hot spots.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from crime_core.grid import cell_degrees
+from crime_core.hotspots import getis_ord_gi_star, grid_weights, study_area
+from crime_core.hypothesis import benjamini_hochberg
+from crime_core.metrics import timed
+
+# Same box as the aggregated views (crime_core.scoping); points outside are dropped
+CUBE_BOUNDS = ((19.0, 19.6), (-99.4, -98.9))
+CUBE_CELL_KM = 1.0
+
+# Week 0 starts on this Monday; week numbers are stable across cubes
+_EPOCH = pd.Timestamp("2000-01-03")
+
+# FDR level of a weekly hot spot and significance of a Mann-Kendall trend
+SIGNIFICANCE = 0.05
+TREND_ALPHA = 0.05
+# Share of the weeks a persistent, intensifying, diminishing or historical hot spot is hot
+PERSISTENT_SHARE = 0.9
+# Fewer weeks than this give trends without much meaning
+MIN_WEEKS = 10
+
+# Categories in order of precedence
+EMERGING_CATEGORIES = (
+    "Nuevo", "Consecutivo", "Intensificándose", "Disminuyendo", "Histórico", "Persistente", "Esporádico",
+)
+
+
+def week_index(dates):
+    """Week number (since _EPOCH) of each date; -1 for missing dates."""
+    dates = pd.to_datetime(pd.Series(dates), errors="coerce")
+    weeks = (dates.dt.normalize() - _EPOCH) // pd.Timedelta(days=7)
+    return weeks.fillna(-1).to_numpy(dtype=np.int64)
+
+
+@dataclass
+class SpaceTimeCube:
+    """Crimes per week x cell; week w of `counts` starts at `week_starts[w]`."""
+    lat_bins: np.ndarray
+    lon_bins: np.ndarray
+    first_week: int
+    counts: np.ndarray
+
+    @classmethod
+    def empty(cls, cell_size_km=CUBE_CELL_KM, bounds=CUBE_BOUNDS):
+        (lat0, lat1), (lon0, lon1) = bounds
+        lat_step, lon_step = cell_degrees(cell_size_km, (lat0 + lat1) / 2)
+        lat_bins = lat0 + np.arange(int(np.ceil((lat1 - lat0) / lat_step)) + 1) * lat_step
+        lon_bins = lon0 + np.arange(int(np.ceil((lon1 - lon0) / lon_step)) + 1) * lon_step
+        counts = np.zeros((0, lat_bins.size - 1, lon_bins.size - 1), dtype=np.int32)
+        return cls(lat_bins, lon_bins, 0, counts)
+
+    @property
+    def weeks(self):
+        return self.counts.shape[0]
+
+    @property
+    def week_starts(self):
+        return _EPOCH + pd.to_timedelta(7 * (self.first_week + np.arange(self.weeks)), unit="D")
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.lat_bins, self.lon_bins, self.counts))
+
+    def append(self, df):
+        """
+        Add the crimes of `df` (latitud, longitud, fecha_hecho). Weeks outside
+        the cube are added as new slices and only the slices of `df`'s weeks
+        are binned, so a weekly update touches one slice. Returns self.
+        """
+        n_lat, n_lon = self.counts.shape[1:]
+        lat = df["latitud"].to_numpy(dtype=float)
+        lon = df["longitud"].to_numpy(dtype=float)
+        week = week_index(df["fecha_hecho"])
+        with np.errstate(invalid="ignore"):
+            i = np.floor((lat - self.lat_bins[0]) / (self.lat_bins[1] - self.lat_bins[0]))
+            j = np.floor((lon - self.lon_bins[0]) / (self.lon_bins[1] - self.lon_bins[0]))
+        ok = (week >= 0) & (i >= 0) & (i < n_lat) & (j >= 0) & (j < n_lon)
+        if not ok.any():
+            return self
+        week, i, j = week[ok], i[ok].astype(np.int64), j[ok].astype(np.int64)
+
+        lo, hi = week.min(), week.max() + 1
+        if self.weeks:
+            before = max(0, self.first_week - lo)
+            after = max(0, hi - (self.first_week + self.weeks))
+            if before or after:
+                self.counts = np.pad(self.counts, ((before, after), (0, 0), (0, 0)))
+            self.first_week -= before
+        else:
+            self.counts = np.zeros((hi - lo, n_lat, n_lon), dtype=np.int32)
+            self.first_week = lo
+
+        cells = n_lat * n_lon
+        added = np.bincount((week - lo) * cells + i * n_lon + j, minlength=(hi - lo) * cells)
+        self.counts[lo - self.first_week:hi - self.first_week] += added.reshape(hi - lo, n_lat, n_lon).astype(np.int32)
+        return self
+
+
+@timed("spacetime.build_space_time_cube")
+def build_space_time_cube(df, cell_size_km=CUBE_CELL_KM):
+    """SpaceTimeCube of the crimes in `df` on a fixed `cell_size_km` grid."""
+    return SpaceTimeCube.empty(cell_size_km).append(df)
+
+
+def mann_kendall(series):
+    """
+    Mann-Kendall trend test of every row of `series` (n, t) at once, with
+    the correction for ties. Returns (s, z, p_value): the S statistic, its
+    normal z-score (positive for increasing) and the two-sided p-value.
+    """
+    from scipy.stats import norm
+
+    x = np.asarray(series, dtype=np.float64)
+    n, t = x.shape
+    # One pass per time step over a (t, n) copy: each step compares it with all later steps
+    by_time = np.ascontiguousarray(x.T)
+    s = np.zeros(n)
+    for k in range(t - 1):
+        s += np.sign(by_time[k + 1:] - by_time[k]).sum(axis=0)
+
+    # Ties: sum of g(g - 1)(2g + 5) over the groups of equal values of each row
+    ordered = np.sort(x, axis=1)
+    starts = np.ones_like(ordered, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    sizes = np.bincount(np.cumsum(starts.ravel()) - 1).astype(np.float64)
+    rows = np.repeat(np.arange(n), starts.sum(axis=1))
+    ties = np.bincount(rows, weights=sizes * (sizes - 1) * (2 * sizes + 5), minlength=n)
+
+    var = (t * (t - 1) * (2 * t + 5) - ties) / 18
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(var > 0, (s - np.sign(s)) / np.sqrt(var), 0.0)
+    return s, z, 2 * norm.sf(np.abs(z))
+
+
+def classify_emerging(hot, trend_z, trend_p, share=PERSISTENT_SHARE, alpha=TREND_ALPHA):
+    """
+    Emerging hot spot category of each row of `hot` (n, weeks: significant
+    hot spot that week) given the Mann-Kendall trend of its Gi* z-scores;
+    None only for cells that were never a hot spot. Cells hot on and off
+    are sporadic whether or not the last week is hot.
+    """
+    weeks = hot.shape[1]
+    n_hot = hot.sum(axis=1)
+    last = hot[:, -1]
+    mostly = n_hot >= share * weeks
+    # Length of the run of hot weeks that ends at the last week
+    tail = hot[:, ::-1]
+    run = np.where(tail.all(axis=1), weeks, np.argmax(~tail, axis=1))
+    trending = trend_p < alpha
+
+    conditions = [
+        last & (n_hot == 1),
+        last & (run == n_hot) & ~mostly,
+        last & mostly & trending & (trend_z > 0),
+        last & mostly & trending & (trend_z < 0),
+        ~last & mostly,
+        mostly,
+        (n_hot > 0) & (run != n_hot),
+    ]
+    return np.select(conditions, EMERGING_CATEGORIES, default=None)
+
+
+@timed("spacetime.emerging_hotspots")
+def emerging_hotspots(cube, radius=1, alpha=SIGNIFICANCE):
+    """
+    Emerging hot spot analysis of `cube`: Gi* of every cell in every week
+    (FDR-corrected per week) and Mann-Kendall trends of the weekly counts
+    and of the Gi* z-scores. Returns one row per cell of the study area:
+    bounds (lat0, lon0, lat1, lon1), count, hot_weeks, trend_z and trend_p
+    (of the counts: is the cell getting worse?) and category.
+    """
+    columns = ["lat0", "lon0", "lat1", "lon1", "count", "hot_weeks", "trend_z", "trend_p", "category"]
+    total = cube.counts.sum(axis=0)
+    studied = study_area(total, radius)
+    if cube.weeks < 2 or studied.sum() < 2:
+        return pd.DataFrame(columns=columns)
+
+    x = cube.counts[:, studied].T.astype(np.float64)
+    z, p = getis_ord_gi_star(x, grid_weights(total.shape, radius, studied))
+    q = np.column_stack([benjamini_hochberg(p[:, w]) for w in range(cube.weeks)])
+    hot = (q < alpha) & (z > 0)
+
+    _, trend_z, trend_p = mann_kendall(x)
+    # The trend of the z-scores only matters for cells that were ever hot
+    ever = hot.any(axis=1)
+    hot_trend_z, hot_trend_p = np.zeros(len(x)), np.ones(len(x))
+    if ever.any():
+        _, hot_trend_z[ever], hot_trend_p[ever] = mann_kendall(z[ever])
+    i, j = np.nonzero(studied)
+    return pd.DataFrame({
+        "lat0": cube.lat_bins[i],
+        "lon0": cube.lon_bins[j],
+        "lat1": cube.lat_bins[i + 1],
+        "lon1": cube.lon_bins[j + 1],
+        "count": total[studied].astype(np.int64),
+        "hot_weeks": hot.sum(axis=1),
+        "trend_z": trend_z,
+        "trend_p": trend_p,
+        "category": classify_emerging(hot, hot_trend_z, hot_trend_p),
+    })[columns]
@@ -0,0 +1,150 @@
+"""
+Process-level warm-up for the dashboard.
+
+`start()` is called from app.py on every script run but only does work the
+first time in a process: a daemon thread imports the heavy libraries the
+pages use, loads the datasets, the models and the alcaldía boundaries, and
+records how long each step took. The first visitor then finds everything
+already in memory instead of paying for it on their first click.
+
+`python app.py --warmup-only` (or `python -m crime_core.startup`) runs the
+same steps in the foreground, prints the timing report and exits non-zero
+if any step failed, which makes it usable as a readiness probe.
+"""
+import importlib
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+from crime_core.db import DB_PATH
+
+# Libraries imported by the pages, most expensive first
+HEAVY_IMPORTS = [
+    "geopandas",
+    "osmnx",
+    "folium",
+    "xgboost",
+    "sklearn",
+    "scipy.stats",
+    "seaborn",
+    "matplotlib.pyplot",
+    "altair",
+    "squarify",
+]
+
+
+@dataclass
+class Step:
+    phase: str
+    name: str
+    seconds: float
+    ok: bool = True
+    error: str = None
+
+
+@dataclass
+class StartupReport:
+    started_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    steps: list = field(default_factory=list)
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    @property
+    def ok(self):
+        return all(s.ok for s in self.steps)
+
+    def phases(self):
+        """Seconds per phase, in execution order."""
+        totals = {}
+        for s in self.steps:
+            totals[s.phase] = totals.get(s.phase, 0.0) + s.seconds
+        return totals
+
+    def to_dict(self):
+        return {
+            "done": self.done,
+            "ok": self.ok,
+            "total_seconds": (self.finished_at or time.time()) - self.started_at,
+            "phases": self.phases(),
+            "steps": [asdict(s) for s in self.steps],
+        }
+
+
+def _run_step(report, phase, name, fn):
+    t0 = time.perf_counter()
+    try:
+        fn()
+        step = Step(phase, name, time.perf_counter() - t0)
+    except Exception as e:
+        step = Step(phase, name, time.perf_counter() - t0, ok=False, error=f"{type(e).__name__}: {e}")
+    report.steps.append(step)
+    return step
+
+
+def run(report=None, db_path=DB_PATH):
+    """Run every warm-up step in the calling thread and return the report."""
+    from crime_core import data
+    from crime_core.models import get_registry
+
+    report = report or StartupReport()
+
+    for module in HEAVY_IMPORTS:
+        _run_step(report, "imports", module, lambda m=module: importlib.import_module(m))
+
+    _run_step(report, "datasets", "crime_data", lambda: data.get_crime_data(db_path))
+    _run_step(report, "datasets", "robbery_matrix", lambda: data.get_robbery_matrix(db_path))
+
+    registry = get_registry()
+    for name in registry.available():
+        _run_step(report, "models", name, lambda n=name: registry.predictor(n))
+
+    geojson_path = data.find_geojson()
+    if geojson_path:
+        _run_step(report, "boundaries", geojson_path, lambda: data.get_boundaries(geojson_path))
+
+    report.finished_at = time.time()
+    return report
+
+
+_report = None
+_lock = threading.Lock()
+
+
+def start(background=True):
+    """Start the warm-up once per process; later calls return the same report."""
+    global _report
+    with _lock:
+        if _report is not None:
+            return _report
+        _report = StartupReport()
+    if background:
+        threading.Thread(target=run, args=(_report,), name="startup-warmup", daemon=True).start()
+    else:
+        run(_report)
+    return _report
+
+
+def get_report():
+    """The report of this process's warm-up, or None if it was never started."""
+    return _report
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precarga datos, modelos y capas, y reporta los tiempos.")
+    parser.add_argument("--warmup-only", action="store_true", help="Aceptado por compatibilidad con app.py")
+    parser.add_argument("--db", default=DB_PATH)
+    args, _ = parser.parse_known_args(argv)
+
+    report = run(db_path=args.db)
+    print(json.dumps(report.to_dict(), indent=2, ensure_ascii=False))
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""
+Contingency-table statistics built on a precomputed alcaldía x hour matrix.
+
+The matrix is computed once from the raw rows; every zone/period table the
+EDA page needs is then a sum over its rows and columns, so changing the
+zone definition never touches the raw data again. Permutation and
+bootstrap variants of the chi-square test are vectorized over resamples.
+"""
+import numpy as np
+import pandas as pd
+
+HOURS = list(range(24))
+HORARIO_LABORAL = range(8, 18)
+
+
+def alcaldia_hour_matrix(df, alcaldia_col="alcaldia_hecho", hour_col="hora", count_col=None):
+    """
+    Counts per alcaldía (rows) and hour 0-23 (columns) as an int64 DataFrame.
+    Each row of `df` is one crime, or `count_col` of them when given (rows
+    already grouped by alcaldía and hour).
+    """
+    horas = df[hour_col].to_numpy()
+    valid = ~pd.isna(horas)
+    horas = horas[valid].astype(np.int64)
+    in_range = (horas >= 0) & (horas < 24)
+    codes, alcaldias = pd.factorize(df[alcaldia_col].to_numpy()[valid][in_range], sort=True)
+    weights = None if count_col is None else df[count_col].to_numpy()[valid][in_range]
+    flat = np.bincount(codes * 24 + horas[in_range], weights=weights, minlength=len(alcaldias) * 24)
+    return pd.DataFrame(flat.reshape(len(alcaldias), 24).astype(np.int64), index=alcaldias, columns=HOURS)
+
+
+def zone_contingency(matrix, central, periferica, horas_laborales=HORARIO_LABORAL):
+    """
+    2x2 table (zona x periodo) derived from `matrix` by summing rows and
+    columns; same layout as `pd.crosstab(zona, periodo)` on the raw rows.
+    """
+    laboral = np.isin(matrix.columns.to_numpy(), list(horas_laborales))
+    alcaldias = matrix.index.to_numpy()
+    # (2 x alcaldías) @ (alcaldías x 24) @ (24 x 2)
+    zonas = np.stack([np.isin(alcaldias, list(central)), np.isin(alcaldias, list(periferica))])
+    periodos = np.stack([laboral, ~laboral], axis=1)
+    table = zonas.astype(np.int64) @ matrix.to_numpy() @ periodos.astype(np.int64)
+    return pd.DataFrame(table, index=["Central", "Periferica"], columns=["Laboral", "No Laboral"])
+
+
+def expected_counts(tables):
+    """Expected counts under independence for one (r, c) or a stack (..., r, c) of tables."""
+    tables = np.asarray(tables, dtype=np.float64)
+    total = tables.sum(axis=(-2, -1), keepdims=True)
+    rows = tables.sum(axis=-1, keepdims=True)
+    cols = tables.sum(axis=-2, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return rows * cols / total
+
+
+def chi2_statistic(tables, expected=None):
+    """Pearson chi-square (no continuity correction), vectorized over leading axes."""
+    tables = np.asarray(tables, dtype=np.float64)
+    if expected is None:
+        expected = expected_counts(tables)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terms = np.where(expected > 0, (tables - expected) ** 2 / expected, 0.0)
+    return terms.sum(axis=(-2, -1))
+
+
+def cramers_v(tables, chi2=None):
+    """Cramér's V for one table or a stack of tables."""
+    tables = np.asarray(tables, dtype=np.float64)
+    if chi2 is None:
+        chi2 = chi2_statistic(tables)
+    n = tables.sum(axis=(-2, -1))
+    k = min(tables.shape[-2], tables.shape[-1]) - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(chi2 / (n * k))
+
+
+def chi2_test(table, correction=True):
+    """Classic test; returns (chi2, p, dof, expected) like scipy's chi2_contingency."""
+    from scipy.stats import chi2_contingency
+    return chi2_contingency(np.asarray(table), correction=correction)
+
+
+def _permuted_tables(table, n_resamples, rng):
+    """
+    Tables with the same margins as `table`, as produced by shuffling the
+    column labels of the underlying rows. Each cell is drawn from the
+    hypergeometric distribution conditional on the cells before it.
+    """
+    table = np.asarray(table, dtype=np.int64)
+    r, c = table.shape
+    row_left = np.broadcast_to(table.sum(axis=1), (n_resamples, r)).copy()
+    out = np.zeros((n_resamples, r, c), dtype=np.int64)
+    for j in range(c - 1):
+        to_place = np.full(n_resamples, table[:, j].sum())
+        for i in range(r - 1):
+            rest = row_left[:, i + 1:].sum(axis=1)
+            draw = rng.hypergeometric(row_left[:, i], rest, to_place)
+            out[:, i, j] = draw
+            to_place -= draw
+        out[:, r - 1, j] = to_place
+        row_left -= out[:, :, j]
+    out[:, :, c - 1] = row_left
+    return out
+
+
+def permutation_test(table, n_resamples=9_999, seed=0):
+    """
+    Permutation chi-square test with fixed margins. Returns the observed
+    statistic and the Monte Carlo p-value.
+    """
+    rng = np.random.default_rng(seed)
+    observed = chi2_statistic(table)
+    expected = expected_counts(table)
+    null = chi2_statistic(_permuted_tables(table, n_resamples, rng), expected)
+    p = (1 + np.count_nonzero(null >= observed - 1e-9)) / (n_resamples + 1)
+    return {"chi2": float(observed), "p_value": float(p), "n_resamples": n_resamples}
+
+
+def bootstrap_test(table, n_resamples=9_999, seed=0, confidence=0.95):
+    """
+    Parametric bootstrap: the p-value resamples tables of the same size from
+    the independence model; the Cramér's V interval resamples from the
+    observed cell proportions.
+    """
+    rng = np.random.default_rng(seed)
+    table = np.asarray(table, dtype=np.int64)
+    n = int(table.sum())
+    observed = chi2_statistic(table)
+
+    null_probs = (expected_counts(table) / n).ravel()
+    null = chi2_statistic(rng.multinomial(n, null_probs, size=n_resamples).reshape(-1, *table.shape))
+    p = (1 + np.count_nonzero(null >= observed - 1e-9)) / (n_resamples + 1)
+
+    boot = rng.multinomial(n, (table / n).ravel(), size=n_resamples).reshape(-1, *table.shape)
+    v = cramers_v(boot)
+    alpha = (1 - confidence) / 2
+    low, high = np.nanquantile(v, [alpha, 1 - alpha])
+    return {
+        "chi2": float(observed),
+        "p_value": float(p),
+        "cramers_v": float(cramers_v(table, observed)),
+        "cramers_v_ci": (float(low), float(high)),
+        "n_resamples": n_resamples,
+    }
@@ -0,0 +1,151 @@
+"""
+Crimes inside the visible part of the map, aggregated by zoom.
+
+The viewport map component (components.viewport_map) reports the bounds
+and zoom of the map after every pan or zoom, and `viewport_layer` answers
+with what fits that screen: zoomed out, the hexagon counts
+(crime_core.hexgrid) of the resolution whose cells are a few dozen pixels
+wide, read from a pyramid binned once per set of filters; zoomed in, the
+crimes themselves, found with the k-d tree of crime_core.proximity. Either
+way the payload grows with the screen and not with the dataset.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from crime_core.grid import KM_PER_DEGREE
+from crime_core.hexgrid import (
+    HEX_EDGE_KM, KM_PER_DEGREE_LON, MAP_RESOLUTIONS, REF_LAT, cell_to_latlng, hex_counts, project,
+)
+from crime_core.metrics import timed
+
+# Crimes are drawn one by one from this zoom on (about 4.5 m per pixel in CDMX)
+POINTS_MIN_ZOOM = 15
+# ...but never more than this many; a denser view gets a fixed sample of them
+MAX_VIEWPORT_POINTS = 5000
+
+# Hexagons are chosen to be at least this many pixels across on screen
+HEX_PIXELS = 32
+
+# Ground metres per pixel at zoom 0 on the equator (256-pixel Web Mercator tiles)
+_EQUATOR_M_PER_PIXEL = 156543.03
+
+# Whole CDMX box, for the first render before the map has reported its view
+DEFAULT_ZOOM = 11
+DEFAULT_BOUNDS = ((19.0, -99.4), (19.6, -98.9))
+
+
+def metres_per_pixel(zoom, lat=REF_LAT):
+    return _EQUATOR_M_PER_PIXEL * np.cos(np.radians(lat)) / 2 ** zoom
+
+
+def resolution_for_zoom(zoom, lat=REF_LAT, resolutions=MAP_RESOLUTIONS, pixels=HEX_PIXELS):
+    """The finest of `resolutions` whose hexagons (two edges across) span `pixels` at `zoom`."""
+    width_km = pixels * metres_per_pixel(zoom, lat) / 1000
+    fitting = [res for res in resolutions if 2 * HEX_EDGE_KM[res] >= width_km]
+    return max(fitting) if fitting else min(resolutions)
+
+
+@dataclass(frozen=True)
+class Viewport:
+    """Visible area of the map: its (south, west) and (north, east) corners and the zoom."""
+    south: float
+    west: float
+    north: float
+    east: float
+    zoom: int
+
+    @classmethod
+    def default(cls):
+        (south, west), (north, east) = DEFAULT_BOUNDS
+        return cls(south, west, north, east, DEFAULT_ZOOM)
+
+    @classmethod
+    def from_bounds(cls, bounds, zoom):
+        """From Leaflet's [[south, west], [north, east]]."""
+        (south, west), (north, east) = bounds
+        return cls(float(south), float(west), float(north), float(east), int(zoom))
+
+    @property
+    def centre_lat(self):
+        return (self.south + self.north) / 2
+
+
+@dataclass
+class HexPyramid:
+    """Crimes per hexagon of every map resolution: `cells[res]` has cell, count, lat and lon (centre)."""
+    cells: dict
+
+    @property
+    def nbytes(self):
+        return int(sum(frame.memory_usage(index=True).sum() for frame in self.cells.values()))
+
+
+@timed("viewport.build_hex_pyramid")
+def build_hex_pyramid(df, resolutions=MAP_RESOLUTIONS):
+    """HexPyramid of `df`, from the stored hex_r* columns where loaded."""
+    cells = {}
+    for res in resolutions:
+        counts = hex_counts(df, res)
+        lat, lon = cell_to_latlng(counts["cell"].to_numpy())
+        cells[res] = counts.assign(lat=lat, lon=lon)
+    return HexPyramid(cells)
+
+
+def cells_in_view(cells, viewport, res):
+    """Rows of `cells` (one pyramid level) whose hexagon may show in `viewport`: centres within an edge of it."""
+    lat_pad = HEX_EDGE_KM[res] / KM_PER_DEGREE
+    lon_pad = HEX_EDGE_KM[res] / KM_PER_DEGREE_LON
+    lat, lon = cells["lat"].to_numpy(), cells["lon"].to_numpy()
+    inside = (
+        (lat >= viewport.south - lat_pad) & (lat <= viewport.north + lat_pad)
+        & (lon >= viewport.west - lon_pad) & (lon <= viewport.east + lon_pad)
+    )
+    return cells[inside]
+
+
+def positions_in_view(index, viewport):
+    """
+    Positions (in the frame of the CrimeIndex `index`) of the crimes inside
+    `viewport`. The projection keeps the box a box, so one ball query around
+    its centre and a bounds check on the hits find them.
+    """
+    (x0, x1), (y0, y1) = project([viewport.south, viewport.north], [viewport.west, viewport.east])
+    centre = ((x0 + x1) / 2, (y0 + y1) / 2)
+    hits = np.asarray(index.tree.query_ball_point(centre, np.hypot(x1 - x0, y1 - y0) / 2), dtype=np.int64)
+    x, y = index.tree.data[hits].T
+    return np.sort(hits[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)])
+
+
+@dataclass
+class ViewportLayer:
+    """
+    What to draw for a viewport: hexagon counts at `resolution` (kind
+    "cells": cell, count, lat, lon) or rows of the crime frame (kind
+    "points"). `in_view` counts the crimes drawn: those of the cells, or
+    every point in the viewport when `features` is a sample of them.
+    """
+    kind: str
+    features: pd.DataFrame
+    in_view: int
+    resolution: int = None
+
+
+@timed("viewport.viewport_layer")
+def viewport_layer(index, pyramid, df, viewport, max_points=MAX_VIEWPORT_POINTS, seed=0):
+    """
+    ViewportLayer of `df` (the frame of `index` and `pyramid`) for
+    `viewport`: raw crimes from POINTS_MIN_ZOOM, at most `max_points` of
+    them; below it, the pyramid level that suits the zoom.
+    """
+    if viewport.zoom >= POINTS_MIN_ZOOM:
+        positions = positions_in_view(index, viewport)
+        shown = positions
+        if positions.size > max_points:
+            shown = np.sort(np.random.default_rng(seed).choice(positions, max_points, replace=False))
+        return ViewportLayer("points", df.iloc[shown], int(positions.size))
+
+    res = resolution_for_zoom(viewport.zoom, viewport.centre_lat, tuple(pyramid.cells))
+    cells = cells_in_view(pyramid.cells[res], viewport, res)
+    return ViewportLayer("cells", cells, int(cells["count"].sum()), res)
@@ -1,141 +1,292 @@
-def theme_css(mode: str) -> str:
+"""
+Theme stylesheets for the dashboard.
+
+Each variant ('auto', 'light', 'dark') is built and minified once per
+process; app.py and the pages inject the memoized string, so a rerun sends
+a smaller and byte-identical <style> block that the frontend does not need
+to re-render. Page-specific blocks live here as well (`page_css`).
+"""
+import re
+from functools import lru_cache
+
+import streamlit as st
+
+THEME_MODES = ("auto", "light", "dark")
+
+
+def _build_theme_css(mode: str) -> str:
     """
     Returns a <style> block that:
-      - Defines light and dark color tokens with CSS variables.
-      - Applies to Streamlit's main area and sidebar via stable `data-testid` hooks.
+      - Defines light and dark color tokens with CSS variables based on Thales Blue.
       - Supports 'auto' (prefers-color-scheme), 'light', and 'dark'.
+      - Hides Streamlit Header and Footer.
+    """
+    
+    # Colores base (Light Mode - Azul Pálido Sutil)
+    light_mode_vars = """
+    --bg:#a8d0ff;       /* Azul Pálido Sutil (Fondo principal) */
+    --bg-alt: #6eb8f5;   /* Azul Claro pálido (Fondo secundario/Sidebar) */
+    --fg: #000000ff;       /* Negro (Texto principal) */
+    --muted: #000000ff;      /* Gris para texto 'muted' */
+    --primary: #1ebcde;    /* Azul Thales Claro (Acento) */
+    --border: #6c70a3ff;   /* Borde */
     """
+
+    # Colores Dark Mode
+    dark_mode_vars = """
+    --bg: #08306b;       /* Azul Thales Oscuro (Fondo principal) */
+    --bg-alt: #000000;     /* Negro (Fondo secundario/Sidebar) */
+    --fg: #ffffff;         /* Blanco (Texto principal) */
+    --muted: #a0a3ad;      /* Gris claro para texto 'muted' */
+    --primary: #1ebcde;    /* Azul Thales Claro (Acento) */
+    --border: #3b42a9ff;   /* Borde */
+    """
+    
+    # Lógica para aplicar los colores según el 'mode'
+    initial_vars = light_mode_vars
+    auto_dark_css = ""
+    
+    if mode == "auto":
+        auto_dark_css = f"""
+        @media (prefers-color-scheme: dark) {{
+          :root {{
+            {dark_mode_vars}
+          }}
+        }}
+        """
+    elif mode == "dark":
+        initial_vars = dark_mode_vars
+    
     return f"""
+    <style>
+    :root {{
+    {initial_vars}
+    }}
+
+    @media (prefers-reduced-motion: no-preference) {{
+      [data-testid="stAppViewContainer"],
+      [data-testid="stSidebar"] {{
+        transition: background-color .2s ease, color .2s ease, border-color .2s ease;
+      }}
+    }}
+
+    {auto_dark_css}
+
+    /* =========================================
+       OCULTAR ELEMENTOS DE STREAMLIT (HEADER/FOOTER)
+       ========================================= */
+    
+    /* Ocultar Header (Barra superior con menú hamburguesa y 'Deploy') */
+    header[data-testid="stHeader"] {{
+        background-color: transparent !important;
+        box-shadow: none !important;
+        border-bottom: none !important;
+        /* Si quieres que desaparezca y el contenido suba, descomenta la linea de abajo: */
+        /* display: none !important; */
+    }}
+
+    /* Ocultar Footer ('Made with Streamlit') */
+    footer {{
+        visibility: hidden;
+        display: none !important;
+    }}
+    
+    /* Ajustar el padding superior del contenido principal 
+       para aprovechar el espacio si el header es transparente/oculto */
+    .block-container {{
+        padding-top: 2rem !important;
+    }}
+
+    /* =========================================
+       ESTILOS DE TEMA PERSONALIZADO
+       ========================================= */
+
+    /* Main content area */
+    [data-testid="stAppViewContainer"],
+    .block-container {{
+      background-color: var(--bg);
+      color: var(--fg);
+    }}
+
+    a, .stMarkdown a {{
+      color: var(--primary);
+    }}
+
+    /* Input fields (Text, Number, Selectbox, Multiselect) */
+    div[data-baseweb="input"] input,
+    textarea, .stTextInput input, .stNumberInput input, .stTextArea textarea,
+    .stSelectbox div[role="combobox"], .stMultiSelect div[role="combobox"] {{
+      background-color: var(--bg-alt) !important;
+      color: var(--fg) !important;
+      border: 1px solid var(--border) !important;
+    }}
+
+    /* Buttons */
+    .stButton > button, .stDownloadButton > button {{
+      background-color: var(--primary) !important; 
+      color: var(--fg) !important; 
+      border: 1px solid var(--primary) !important;
+      border-radius: 5px;
+      font-weight: bold;
+    }}
+
+    .stButton > button:hover,
+    [data-testid="stSidebar"] .stButton > button:hover {{
+      background-color: #1693b3 !important; 
+      border-color: #1693b3 !important;
+    }}
+
+    hr {{
+      border-color: var(--border);
+    }}
+
+    /* Sidebar styling */
+    [data-testid="stSidebar"] {{
+      background-color: var(--bg-alt);
+      border-right: 1px solid var(--border);
+      color: var(--fg);
+    }}
+
+    [data-testid="stSidebar"] * {{
+      color: var(--fg) !important;
+    }}
+
+    [data-testid="stSidebar"] a {{
+      color: var(--primary) !important;
+    }}
+
+    /* Sidebar Inputs */
+    [data-testid="stSidebar"] .stTextInput input,
+    [data-testid="stSidebar"] textarea,
+    [data-testid="stSidebar"] .stSelectbox div[role="combobox"],
+    [data-testid="stSidebar"] .stMultiSelect div[role="combobox"],
+    [data-testid="stSidebar"] .stNumberInput input {{
+      background-color: var(--bg) !important;
+      color: var(--fg) !important;
+      border: 1px solid var(--border) !important;
+    }}
+
+    /* Sidebar Buttons */
+    [data-testid="stSidebar"] .stButton > button,
+    [data-testid="stSidebar"] .stDownloadButton > button {{
+      background-color: var(--primary) !important;
+      color: var(--fg) !important;
+      border: 1px solid var(--primary) !important;
+    }}
+
+    [data-testid="stSidebar"] label,
+    [data-testid="stSidebar"] [data-testid="stMarkdownContainer"] p {{
+      color: var(--fg) !important;
+    }}
+    </style>
+    """
+
+
+# ===========================
+# ESTILOS POR PÁGINA
+# ===========================
+PAGE_CSS = {
+    "eda": """
 <style>
-:root {{
-  --bg: #c3ecff;
-  --bg-alt: #8eccf7;
-  --fg: #111111;
-  --muted: #475569;
-  --primary: #3b82f6;
-  --border: #e5e7eb;
-}}
-
-@media (prefers-reduced-motion: no-preference) {{
-  [data-testid="stAppViewContainer"],
-  [data-testid="stSidebar"] {{
-    transition: background-color .2s ease, color .2s ease, border-color .2s ease;
-  }}
-}}
-
-{("""
-@media (prefers-color-scheme: dark) {
-  :root {
-    --bg: #242a75;
-    --bg-alt: #27badc;
-    --fg: #E6E9EF;
-    --muted: #a0a3ad;
-    --primary: #03b3cd;
-    --border: #00365b;
-  }
+    /* 1. SLIDER ROJO */
+    div.stSlider > div[data-baseweb = "slider"] > div > div {
+        background-color: #ff4b4b !important;
+    }
+    div.stSlider > div[data-baseweb = "slider"] > div > div > div {
+        background-color: #ff4b4b !important;
+    }
+
+    /* 2. ACENTOS AZULES */
+    .st-emotion-cache-16txtl3 {
+        color: #6cd1ff !important;
+    }
+
+    /* 3. TARJETAS DE MÉTRICAS */
+    div[data-testid="stMetric"] {
+        background-color: white !important;
+        border: 1px solid #e0e0e0;
+        padding: 10px;
+        border-radius: 8px;
+        box-shadow: 1px 1px 4px rgba(0,0,0,0.1);
+    }
+    
+    /* 4. TÍTULOS DE MÉTRICAS -> NEGRO Y NEGRITAS */
+    [data-testid="stMetricLabel"] * {
+        color: #000000 !important;   
+        font-weight: 900 !important; 
+        font-size: 1.1rem !important;
+    }
+    
+    /* VALORES DE MÉTRICAS -> GRIS OSCURO */
+    [data-testid="stMetricValue"] * {
+        color: #333333 !important;
+    }
+</style>
+""",
+    # Tarjetas de estadísticas y gráficas Altair de Mapa
+    "mapa_stats": """
+<style>
+div.stat-card {
+    background-color: #ffffff;
+    padding: 20px;
+    border-radius: 10px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    text-align: center;
+    border: 1px solid #e0e0e0;
+    margin-bottom: 10px;
+}
+div.stat-title {
+    color: #000000;
+    font-weight: 900; /* Extra bold for titles */
+    font-size: 16px;
+    margin-bottom: 10px;
+}
+div.stat-value {
+    color: #000000;
+    font-size: 28px;
+    font-weight: bold;
 }
-""" if mode == "auto" else "")}
-
-{("""
-:root {
-  --bg: #c3ecff;
-  --bg-alt: #8eccf7;
-  --fg: #111111;
-  --muted: #475569;
-  --primary: #3b82f6;
-  --border: #e5e7eb;
+/* NUEVO: Estilo para bordes redondeados en gráficas Altair */
+div[data-testid="stAltairChart"] {
+    background-color: #ffffff;
+    border-radius: 15px;
+    padding: 10px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    border: 1px solid #e0e0e0;
 }
-""" if mode == "light" else "")}
-
-{("""
-:root {
-  --bg: #c3ecff;
-  --bg-alt: #8eccf7;
-  --fg: #111111;
-  --muted: #475569;
-  --primary: #3b82f6;
-  --border: #e5e7eb;
+canvas {
+    border-radius: 15px !important;
 }
-""" if mode == "dark" else "")}
-
-/* Main content area */
-[data-testid="stAppViewContainer"],
-.block-container {{
-  background-color: var(--bg);
-  color: var(--fg);
-}}
-
-a, .stMarkdown a {{
-  color: var(--primary);
-}}
-
-div[data-baseweb="input"] input,
-textarea, .stTextInput input, .stNumberInput input, .stTextArea textarea,
-.stSelectbox div[role="combobox"], .stMultiSelect div[role="combobox"] {{
-  background-color: var(--bg-alt) !important;
-  color: var(--fg) !important;
-  border: 1px solid var(--border) !important;
-}}
-
-.stButton > button, .stDownloadButton > button {{
-  background-color: #bce4ff !important;
-  color: #111111 !important;
-  border: 1px solid #a5d9ff !important;
-  border-radius: 5px;
-  font-weight: bold;
-}}
-
-.stButton > button:hover,
-[data-testid="stSidebar"] .stButton > button:hover {{
-  background-color: #bce4ff !important;
-  border-color: #a5d9ff  !important;
-}}
-
-hr {{
-  border-color: var(--border);
-}}
-
-/* Sidebar styling */
-[data-testid="stSidebar"] {{
-  background-color: var(--bg-alt);
-  border-right: 1px solid var(--border);
-  color: var(--fg);
-}}
-
-[data-testid="stSidebar"] * {{
-  color: var(--fg) !important;
-}}
-
-[data-testid="stSidebar"] a {{
-  color: var(--primary) !important;
-}}
-
-[data-testid="stSidebar"] .stTextInput input,
-[data-testid="stSidebar"] textarea,
-[data-testid="stSidebar"] .stSelectbox div[role="combobox"],
-[data-testid="stSidebar"] .stMultiSelect div[role="combobox"],
-[data-testid="stSidebar"] .stNumberInput input {{
-  background-color: var(--bg) !important;
-  color: var(--fg) !important;
-  border: 1px solid var(--border) !important;
-}}
-
-[data-testid="stSidebar"] .stButton > button,
-[data-testid="stSidebar"] .stDownloadButton > button {{
-  background-color: #8ac0ce !important;
-  color: #111111 !important;
-  border: 1px solid #03b3cd !important;
-  border-radius: 5px;
-  font-weight: bold;
-}}
-
-[data-testid="stSidebar"] label,
-[data-testid="stSidebar"] [data-testid="stMarkdownContainer"] p {{
-  color: var(--fg) !important;
-}}
-
-[data-testid="stSidebar"] .stRadio [role="radiogroup"] > div[aria-checked="true"] label span {{
-  font-weight: 600;
-}}
 </style>
-"""
\ No newline at end of file
+""",
+}
+
+
+def minify_css(block: str) -> str:
+    """Drop comments and redundant whitespace from a <style> block."""
+    block = re.sub(r"/\*.*?\*/", "", block, flags=re.S)
+    block = re.sub(r"\s+", " ", block)
+    block = re.sub(r"\s*([{};:,>])\s*", r"\1", block)
+    return block.replace(";}", "}").strip()
+
+
+@lru_cache(maxsize=None)
+def theme_css(mode: str = "auto") -> str:
+    """Minified theme block for `mode`, built once per process."""
+    if mode not in THEME_MODES:
+        mode = "auto"
+    return minify_css(_build_theme_css(mode))
+
+
+@lru_cache(maxsize=None)
+def page_css(name: str) -> str:
+    """Minified page-specific block from PAGE_CSS, built once per process."""
+    return minify_css(PAGE_CSS[name])
+
+
+def inject_theme(mode: str = "auto"):
+    st.markdown(theme_css(mode), unsafe_allow_html=True)
+
+
+def inject_page_css(name: str):
+    st.markdown(page_css(name), unsafe_allow_html=True)
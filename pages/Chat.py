@@ -1,10 +1,10 @@
-import duckdb
 import streamlit as st
 import pandas as pd
-import numpy as np
-import requests, json
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from crime_core.cache import get_result_cache
+from crime_core.db import connect
+from crime_core.metrics import span
+from crime_core.retrieval import build_corpus_vectors, build_prompt, context_rows, retrieve, stream_from_ollama
+from crime_core.scoping import profile_for, scoped_rows
 
 st.set_page_config(page_title="Chat Local (Ollama)", page_icon="📚")
 st.title("📚 Chat  — 100% Local (Ollama)")
@@ -23,20 +23,26 @@ with st.sidebar:
         st.rerun()
 
 
-@st.cache_data
-def load_data():
+# Solo filas y columnas que el rol puede ver (crime_core.scoping)
+profile = profile_for(st.session_state.get("role"), st.session_state.get("alcaldias_asignadas"))
+
+# Caché compartida entre sesiones y acotada en memoria (crime_core.cache)
+result_cache = get_result_cache()
+
+@result_cache.memoize("chat.rows")
+def query_rows(profile):
+    with connect() as con:
+        return scoped_rows(con, profile, limit=1000)
+
+def load_data(profile):
     try:
-        con = duckdb.connect("crimes_fgj.db", read_only=True)
-        query = "SELECT * FROM crimes_raw LiMIT 1000"
-        df = con.execute(query).df()
-        con.close()
-        return df
+        return query_rows(profile)
     except Exception as e:
         st.error(f"Error cargando la base de datos: {e}")
         return pd.DataFrame()
 
 
-df = load_data()
+df = load_data(profile)
 st.success(f"Cargadas {len(df):,} filas × {len(df.columns)} columnas")
 st.dataframe(df.head(10), use_container_width=True)
 
@@ -52,21 +58,13 @@ if not text_cols:
 
 # ---------- Build TF-IDF retriever ----------
 #a classic technique used in information retrieval and text-based search systems 
-# to find and rank documents relevant to a query.
-@st.cache_data(show_spinner=False)
-def build_corpus_vectors(_df: pd.DataFrame, _cols):
-    text_series = _df[_cols].astype(str).apply(lambda r: " | ".join(r.values), axis=1)
-    vec = TfidfVectorizer(strip_accents="unicode", ngram_range=(1, 2), min_df=1)
-    X = vec.fit_transform(text_series.values)
-    return text_series, vec, X
-
-text_series, vectorizer, X = build_corpus_vectors(df, text_cols)
-
-def retrieve(query: str, k: int):
-    qv = vectorizer.transform([query])
-    sims = cosine_similarity(qv, X).ravel()
-    idx = np.argsort(-sims)[:k]
-    return idx, sims[idx]
+# to find and rank documents relevant to a query (crime_core.retrieval).
+# La clave es (perfil, columnas): el DataFrame sale de query_rows(profile) y no se hashea
+@result_cache.memoize("chat.corpus_vectors")
+def load_corpus_vectors(_df: pd.DataFrame, profile, cols):
+    return build_corpus_vectors(_df, cols)
+
+text_series, vectorizer, X = load_corpus_vectors(df, profile, tuple(text_cols))
 
 # ---------- Chat state ----------
 if "messages" not in st.session_state:
@@ -78,53 +76,6 @@ for m in st.session_state.messages:
     with st.chat_message(m["role"]):
         st.markdown(m["content"])
 
-# ---------- Ollama call (local) ----------
-OLLAMA_CHAT_URL = "http://localhost:11434/api/generate"  # using /generate for simple prompting
-
-def stream_from_ollama(prompt: str):
-    try:
-        with requests.post(
-            OLLAMA_CHAT_URL,
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": True,
-                "options": {"temperature": temperature, "num_predict": max_tokens},
-            },
-            stream=True,
-            timeout=0xFFFF,
-        ) as r:
-            r.raise_for_status()
-            full = ""
-            for line in r.iter_lines():
-                if not line:
-                    continue
-                data = json.loads(line.decode("utf-8"))
-                if "response" in data:
-                    token = data["response"]
-                    full += token
-                    yield token
-                if data.get("done"):
-                    break
-    except requests.exceptions.ConnectionError:
-        yield "⚠️ Cannot reach Ollama at http://localhost:11434. Is `ollama serve` running?"
-    except Exception as e:
-        yield f"⚠️ Error: {e}"
-
-# ---------- Prompt template ----------
-SYSTEM_INSTRUCTION = (
-    "Eres un asistente útil. Responde SO´LO usando las filas de contexto CSV proporcionadas. "
-    "Si la respuesta no está en el contexto, indica que no la encuentras."
-)
-
-def build_prompt(user_q: str, rows_md: str) -> str:
-    return (
-        f"{SYSTEM_INSTRUCTION}\n\n"
-        f"QUESTION:\n{user_q}\n\n"
-        f"CONTEXT (CSV rows):\n{rows_md}\n\n"
-        f"ANSWER:"
-    )
-
 # ---------- Handle user question ----------
 if user_q := st.chat_input("Pregunta algo sobre el CSV…"):
     st.session_state.messages.append({"role": "user", "content": user_q})
@@ -133,23 +84,22 @@ if user_q := st.chat_input("Pregunta algo sobre el CSV…"):
 
     with st.chat_message("assistant"):
         with st.spinner("BUscando columnas relevantes…"):
-            idxs, scores = retrieve(user_q, top_k)
+            idxs, scores = retrieve(vectorizer, X, user_q, top_k)
             top_rows = df.iloc[idxs]
             st.caption("Columnas Top (usadas como contexto):")
             st.dataframe(top_rows, use_container_width=True)
 
             # Compact context block
-            rows_md = "\n".join(
-                f"- ROW {i}: " + " | ".join(f"{c}={str(top_rows.iloc[i][c])}" for c in text_cols)
-                for i in range(len(top_rows))
-            )
+            rows_md = context_rows(top_rows, text_cols)
 
         with st.spinner("Generando respuesta…"):
+            # Ollama local (/api/generate)
             prompt = build_prompt(user_q, rows_md)
             placeholder = st.empty()
             acc = ""
-            for tok in stream_from_ollama(prompt):
-                acc += tok
-                placeholder.markdown(acc)
+            with span("chat.ollama", model=model):
+                for tok in stream_from_ollama(prompt, model, temperature, max_tokens):
+                    acc += tok
+                    placeholder.markdown(acc)
 
-    st.session_state.messages.append({"role": "assistant", "content": acc})
\ No newline at end of file
+    st.session_state.messages.append({"role": "assistant", "content": acc})
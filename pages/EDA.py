@@ -1,59 +1,32 @@
 import streamlit as st
-import duckdb
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.cm 
-import matplotlib.colors 
-import matplotlib.ticker as ticker 
-import matplotlib.patches as mpatches 
-import seaborn as sns
-import squarify
-from scipy.stats import chi2_contingency
 import numpy as np
+from crime_core.cache import get_result_cache
+from crime_core.db import connect
+from crime_core.figures import get_figure_cache
+from crime_core.lazy import lazy_import
+from crime_core.metrics import span
+from css.theme import inject_page_css
+from crime_core.stats import zone_contingency, chi2_test, permutation_test, bootstrap_test, cramers_v
+from crime_core.hypothesis import family_cube, run_suite
+from crime_core.data import get_robbery_matrix
+
+# Solo se importan al dibujar una figura que no está en caché (squarify, solo con Treemap)
+plt = lazy_import("matplotlib.pyplot")
+mcm = lazy_import("matplotlib.cm")
+mcolors = lazy_import("matplotlib.colors")
+ticker = lazy_import("matplotlib.ticker")
+mpatches = lazy_import("matplotlib.patches")
+sns = lazy_import("seaborn")
+squarify = lazy_import("squarify")
 
 # ===========================
 # CONFIGURACIÓN DE LA PÁGINA Y ESTILOS CSS
 # ===========================
 st.set_page_config(page_title="EDA - Robos CDMX", layout="wide")
 
-# INYECCIÓN DE CSS
-st.markdown("""
-<style>
-    /* 1. SLIDER ROJO */
-    div.stSlider > div[data-baseweb = "slider"] > div > div {
-        background-color: #ff4b4b !important;
-    }
-    div.stSlider > div[data-baseweb = "slider"] > div > div > div {
-        background-color: #ff4b4b !important;
-    }
-
-    /* 2. ACENTOS AZULES */
-    .st-emotion-cache-16txtl3 {
-        color: #6cd1ff !important;
-    }
-
-    /* 3. TARJETAS DE MÉTRICAS */
-    div[data-testid="stMetric"] {
-        background-color: white !important;
-        border: 1px solid #e0e0e0;
-        padding: 10px;
-        border-radius: 8px;
-        box-shadow: 1px 1px 4px rgba(0,0,0,0.1);
-    }
-    
-    /* 4. TÍTULOS DE MÉTRICAS -> NEGRO Y NEGRITAS */
-    [data-testid="stMetricLabel"] * {
-        color: #000000 !important;   
-        font-weight: 900 !important; 
-        font-size: 1.1rem !important;
-    }
-    
-    /* VALORES DE MÉTRICAS -> GRIS OSCURO */
-    [data-testid="stMetricValue"] * {
-        color: #333333 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# INYECCIÓN DE CSS (memoizado y minificado en css/theme.py)
+inject_page_css("eda")
 
 st.title("📊 Análisis Estadístico Descriptivo")
 st.markdown("""
@@ -75,44 +48,37 @@ def estilar_tabla(df):
     })
 
 # ===========================
-# CARGA DE DATOS
+# CACHÉ DE GRÁFICAS
+# ===========================
+# Las figuras se guardan como PNG por (tipo, datos, tema); en un rerun sin cambios
+# no se vuelve a dibujar con matplotlib.
+fig_cache = get_figure_cache()
+result_cache = get_result_cache()
+tema = st.session_state.get("theme_mode", "auto")
+
+def mostrar_figura(tipo, datos, dibujar, transparent=False, **params):
+    png = fig_cache.render(tipo, datos, dibujar, theme=tema, transparent=transparent, **params)
+    st.image(png, use_container_width=True)
+
+# ===========================
+# CARGA DE DATOS: MATRIZ ALCALDÍA x HORA
 # ===========================
-@st.cache_data
-def load_data():
+# Todo lo que muestra la página sale de esta matriz (alcaldías x 24 horas), que se
+# calcula una sola vez por proceso (crime_core.data, precargada desde app.py) y vive
+# en la caché de resultados compartida.
+def load_matriz():
     try:
-        con = duckdb.connect("crimes_fgj.db", read_only=True)
-        query = "SELECT * FROM crimes_raw WHERE delito ILIKE '%ROBO%'"
-        df = con.execute(query).df()
-        con.close()
-        return df
+        return get_robbery_matrix()
     except Exception as e:
         st.error(f"Error cargando la base de datos: {e}")
         return pd.DataFrame()
 
-df_robo = load_data()
+matriz = load_matriz()
 
-if df_robo.empty:
+if matriz.empty:
     st.warning("No se cargaron datos. Verifica que el archivo 'crimes_fgj.db' esté en la carpeta.")
     st.stop()
 
-# ===========================
-# LIMPIEZA BÁSICA
-# ===========================
-df_robo["fecha_hecho"] = pd.to_datetime(df_robo["fecha_hecho"], errors="coerce")
-df_robo["hora"] = pd.to_datetime(df_robo["hora_hecho"], errors="coerce").dt.hour
-df_robo["alcaldia_hecho"] = df_robo["alcaldia_hecho"].astype(str).str.upper().str.strip()
-
-valores_basura = ["NAN", "NONE", "NULL", "NAT", "", "DESCONOCIDO", "CDMX (INDETERMINADA)"]
-df_robo = df_robo.dropna(subset=["alcaldia_hecho", "hora"])
-df_robo = df_robo[~df_robo["alcaldia_hecho"].isin(valores_basura)]
-
-df_robo["horario"] = pd.cut(
-    df_robo["hora"],
-    bins=[0, 6, 12, 18, 24],
-    labels=["Madrugada", "Mañana", "Tarde", "Noche"],
-    right=False
-)
-
 # ==============================================================================
 # SECCIONES 1 y 2: VISUALIZACIONES LADO A LADO
 # ==============================================================================
@@ -122,77 +88,90 @@ col_viz_1, col_viz_2 = st.columns(2)
 with col_viz_1:
     st.subheader("1️⃣ Robos por Alcaldía")
     
-    df_alcaldia = df_robo["alcaldia_hecho"].value_counts().reset_index()
-    df_alcaldia.columns = ["alcaldia", "robos"]
+    df_alcaldia = matriz.sum(axis=1).sort_values(ascending=False, kind="stable").rename_axis("alcaldia").reset_index(name="robos")
     
     opcion_viz = st.selectbox("Tipo de Gráfico (Alcaldía):", ["Barras horizontales", "Heatmap", "Treemap"])
     color_azul = "#6cd1ff"
 
     if opcion_viz == "Barras horizontales":
-        fig, ax = plt.subplots(figsize=(8, 6))
-        sns.barplot(data=df_alcaldia, y="alcaldia", x="robos", ax=ax, color=color_azul)
-        
-        # EJE X con formato miles (20,000)
-        ax.xaxis.set_major_formatter(ticker.StrMethodFormatter('{x:,.0f}'))
-        # Etiquetas en barras con formato miles
-        ax.bar_label(ax.containers[0], fmt='{:,.0f}', padding=3, fontsize=9)
-        
-        ax.set_title("Total de Robos por Alcaldía")
-        st.pyplot(fig)
+        def dibujar_barras(df_alcaldia, color):
+            fig, ax = plt.subplots(figsize=(8, 6))
+            sns.barplot(data=df_alcaldia, y="alcaldia", x="robos", ax=ax, color=color)
+            
+            # EJE X con formato miles (20,000)
+            ax.xaxis.set_major_formatter(ticker.StrMethodFormatter('{x:,.0f}'))
+            # Etiquetas en barras con formato miles
+            ax.bar_label(ax.containers[0], fmt='{:,.0f}', padding=3, fontsize=9)
+            
+            ax.set_title("Total de Robos por Alcaldía")
+            return fig
+
+        mostrar_figura("eda_barras_alcaldia", df_alcaldia, dibujar_barras, color=color_azul)
 
     elif opcion_viz == "Heatmap":
-        df_heat = df_alcaldia.set_index("alcaldia")
-        fig, ax = plt.subplots(figsize=(6, 8))
-        # Heatmap formato miles con coma (fmt=",d")
-        sns.heatmap(df_heat, annot=True, fmt=",d", cmap="Blues", ax=ax, cbar=False)
-        ax.set_title("Heatmap de robos por alcaldía")
-        st.pyplot(fig)
+        def dibujar_heatmap(df_alcaldia):
+            df_heat = df_alcaldia.set_index("alcaldia")
+            fig, ax = plt.subplots(figsize=(6, 8))
+            # Heatmap formato miles con coma (fmt=",d")
+            sns.heatmap(df_heat, annot=True, fmt=",d", cmap="Blues", ax=ax, cbar=False)
+            ax.set_title("Heatmap de robos por alcaldía")
+            return fig
+
+        mostrar_figura("eda_heatmap_alcaldia", df_alcaldia, dibujar_heatmap)
 
     elif opcion_viz == "Treemap":
-        fig, ax = plt.subplots(figsize=(10, 6))
-        df_tree = df_alcaldia[df_alcaldia["robos"] > 0]
-        
-        # Paleta YlGnBu (Tonos azul/verde/aqua)
-        cmap = matplotlib.cm.get_cmap('YlGnBu')
-        mini, maxi = df_tree["robos"].min(), df_tree["robos"].max()
-        norm = matplotlib.colors.Normalize(vmin=mini, vmax=maxi)
-        colors = [cmap(norm(value)) for value in df_tree["robos"]]
-        
-        # Treemap solo con números formateados
-        squarify.plot(sizes=df_tree["robos"], 
-                      label=df_tree["robos"].apply(lambda x: f"{x:,}"), 
-                      alpha=0.9, color=colors, pad=True, 
-                      text_kwargs={'fontsize':9, 'color':'black', 'weight':'bold'})
-        
-        # Leyenda lateral externa
-        legend_handles = [mpatches.Patch(color=cmap(norm(row['robos'])), label=row['alcaldia']) 
-                          for index, row in df_tree.iterrows()]
-        
-        ax.legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
-        plt.axis("off")
-        st.pyplot(fig)
+        def dibujar_treemap(df_alcaldia):
+            fig, ax = plt.subplots(figsize=(10, 6))
+            df_tree = df_alcaldia[df_alcaldia["robos"] > 0]
+            
+            # Paleta YlGnBu (Tonos azul/verde/aqua)
+            cmap = mcm.get_cmap('YlGnBu')
+            mini, maxi = df_tree["robos"].min(), df_tree["robos"].max()
+            norm = mcolors.Normalize(vmin=mini, vmax=maxi)
+            colors = [cmap(norm(value)) for value in df_tree["robos"]]
+            
+            # Treemap solo con números formateados
+            squarify.plot(sizes=df_tree["robos"], 
+                          label=df_tree["robos"].apply(lambda x: f"{x:,}"), 
+                          alpha=0.9, color=colors, pad=True, ax=ax,
+                          text_kwargs={'fontsize':9, 'color':'black', 'weight':'bold'})
+            
+            # Leyenda lateral externa
+            legend_handles = [mpatches.Patch(color=cmap(norm(row['robos'])), label=row['alcaldia']) 
+                              for index, row in df_tree.iterrows()]
+            
+            ax.legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+            ax.axis("off")
+            return fig
+
+        mostrar_figura("eda_treemap_alcaldia", df_alcaldia, dibujar_treemap)
 
 # --- COLUMNA DERECHA: HORAS ---
 with col_viz_2:
     st.subheader("2️⃣ Robos por Hora")
     
-    alcaldias = ["Todas"] + sorted(df_robo["alcaldia_hecho"].unique())
+    alcaldias = ["Todas"] + list(matriz.index)
     selected_alcaldia = st.selectbox("Filtrar por alcaldía (Hora):", alcaldias)
     
-    df_filtrado = df_robo.copy() if selected_alcaldia == "Todas" else df_robo[df_robo["alcaldia_hecho"] == selected_alcaldia]
-    df_filtrado = df_filtrado[df_filtrado["hora"].between(0, 23)]
+    # Solo 24 conteos: la figura se indexa por estos valores, no por las filas
+    conteo_horas = matriz.sum(axis=0) if selected_alcaldia == "Todas" else matriz.loc[selected_alcaldia]
+    conteo_horas = conteo_horas[conteo_horas > 0].rename("count")
 
-    fig, ax = plt.subplots(figsize=(8, 6)) 
-    sns.countplot(x="hora", data=df_filtrado, ax=ax, color=color_azul)
-    
-    # Ajuste de Ejes
-    ax.tick_params(axis='x', labelsize=7)
-    # Eje Y con formato miles
-    ax.yaxis.set_major_formatter(ticker.StrMethodFormatter('{x:,.0f}'))
-    
-    ax.set_title(f"Robos por hora del día ({selected_alcaldia})")
-    ax.set_ylabel("Cantidad")
-    st.pyplot(fig)
+    def dibujar_horas(conteo_horas, color, titulo):
+        fig, ax = plt.subplots(figsize=(8, 6)) 
+        sns.barplot(x=conteo_horas.index, y=conteo_horas.values, ax=ax, color=color)
+        
+        # Ajuste de Ejes
+        ax.tick_params(axis='x', labelsize=7)
+        # Eje Y con formato miles
+        ax.yaxis.set_major_formatter(ticker.StrMethodFormatter('{x:,.0f}'))
+        
+        ax.set_title(f"Robos por hora del día ({titulo})")
+        ax.set_xlabel("hora")
+        ax.set_ylabel("Cantidad")
+        return fig
+
+    mostrar_figura("eda_robos_hora", conteo_horas, dibujar_horas, color=color_azul, titulo=selected_alcaldia)
 
 
 st.markdown("---")
@@ -222,18 +201,27 @@ zonas = {
 central = zonas.get(radio, zonas[10])["central"]
 periferica = zonas.get(radio, zonas[10])["periferica"]
 
-df_robo["zona"] = df_robo["alcaldia_hecho"].apply(lambda x: "Central" if x in central else ("Periferica" if x in periferica else "Otra"))
-df_test = df_robo[df_robo["zona"].isin(["Central", "Periferica"])].copy()
-df_test["periodo"] = df_test["hora"].apply(lambda h: "Laboral" if 8 <= h < 18 else "No Laboral")
+# Tabla 2x2 (zona x periodo) sumando filas y columnas de la matriz precalculada
+contingency = zone_contingency(matriz, central, periferica)
+contingency = contingency[contingency.sum(axis=1) > 0]
 
-contingency = pd.crosstab(df_test["zona"], df_test["periodo"])
-chi2, p, dof, expected = chi2_contingency(contingency)
+metodo = st.radio("Método de la prueba:", ["Chi² clásico", "Permutación", "Bootstrap"], horizontal=True)
+chi2, p, dof, expected = chi2_test(contingency)
+if metodo == "Permutación":
+    p = permutation_test(contingency)["p_value"]
+elif metodo == "Bootstrap":
+    resultado_boot = bootstrap_test(contingency)
+    p = resultado_boot["p_value"]
 
 st.markdown("#### Resultados Estadísticos")
-c1, c2, c3 = st.columns(3)
+c1, c2, c3, c4 = st.columns(4)
 c1.metric("Chi²", f"{chi2:.2f}")
 c2.metric("p-valor", f"{p:.5f}")
 c3.metric("Grados de libertad", f"{dof}")
+c4.metric("V de Cramér", f"{cramers_v(contingency):.3f}")
+if metodo == "Bootstrap":
+    low, high = resultado_boot["cramers_v_ci"]
+    st.caption(f"IC 95% de la V de Cramér (bootstrap): [{low:.3f}, {high:.3f}]")
 st.write("") 
 
 col_chi_1, col_chi_2 = st.columns([1, 1])
@@ -246,34 +234,39 @@ with col_chi_1:
     st.write("**Distribución de Robos Laborales (Donut):**")
     
     # DONUT CHART
-    df_laboral = df_test[df_test["periodo"] == "Laboral"]
-    total_laboral = len(df_laboral)
-    conteo_zonas = df_laboral["zona"].value_counts()
-    val_central = conteo_zonas.get("Central", 0)
-    val_perif = conteo_zonas.get("Periferica", 0)
+    conteo_zonas = contingency["Laboral"]
+    total_laboral = int(conteo_zonas.sum())
+    val_central = int(conteo_zonas.get("Central", 0))
+    val_perif = int(conteo_zonas.get("Periferica", 0))
     sizes = [val_central, val_perif]
     labels = ['Central', 'Periférica']
     colors_donut = ['#08306b', '#1f6eb3'] # Azul oscuro / Azul claro
 
-    fig_donut, ax_donut = plt.subplots(figsize=(5, 5))
-    wedges, texts, autotexts = ax_donut.pie(
-        sizes, labels=labels, colors=colors_donut, autopct='%1.1f%%', 
-        startangle=90, pctdistance=0.85, 
-        wedgeprops=dict(width=0.4, edgecolor='white')
-    )
-    plt.setp(texts, size=10, weight="bold")
-    plt.setp(autotexts, size=10, weight="bold", color="white")
-    ax_donut.text(0, 0, f"Total\n{total_laboral:,}", ha='center', va='center', fontsize=11, fontweight='bold')
-    ax_donut.set_title("Proporción Central vs Periférica", fontsize=12)
-    st.pyplot(fig_donut)
+    def dibujar_donut(sizes, total_laboral):
+        fig_donut, ax_donut = plt.subplots(figsize=(5, 5))
+        wedges, texts, autotexts = ax_donut.pie(
+            sizes, labels=labels, colors=colors_donut, autopct='%1.1f%%', 
+            startangle=90, pctdistance=0.85, 
+            wedgeprops=dict(width=0.4, edgecolor='white')
+        )
+        plt.setp(texts, size=10, weight="bold")
+        plt.setp(autotexts, size=10, weight="bold", color="white")
+        ax_donut.text(0, 0, f"Total\n{total_laboral:,}", ha='center', va='center', fontsize=11, fontweight='bold')
+        ax_donut.set_title("Proporción Central vs Periférica", fontsize=12)
+        return fig_donut
+
+    mostrar_figura("eda_donut_laboral", sizes, dibujar_donut, total_laboral=total_laboral)
 
 with col_chi_2:
     st.write("**Mapa de Calor de la Muestra:**")
-    fig_heat, ax_heat = plt.subplots(figsize=(6, 6)) 
-    ax_heat.set_title("Heatmap de Contingencia (Zonas vs Horario)", fontsize=12, pad=15)
-    # Heatmap con miles
-    sns.heatmap(contingency, annot=True, fmt=",d", cmap="Blues", ax=ax_heat, cbar=False)
-    st.pyplot(fig_heat)
+    def dibujar_contingencia(contingency):
+        fig_heat, ax_heat = plt.subplots(figsize=(6, 6)) 
+        ax_heat.set_title("Heatmap de Contingencia (Zonas vs Horario)", fontsize=12, pad=15)
+        # Heatmap con miles
+        sns.heatmap(contingency, annot=True, fmt=",d", cmap="Blues", ax=ax_heat, cbar=False)
+        return fig_heat
+
+    mostrar_figura("eda_heatmap_contingencia", contingency, dibujar_contingencia)
 
 st.markdown("---")
 
@@ -349,15 +342,14 @@ def dibujar_medidor(rechaza_ho):
     # Límites para cortar la mitad de abajo
     ax.set_ylim(-0.1, 1.1)
     ax.set_xlim(-1.1, 1.1)
-    plt.axis('off')
+    ax.axis('off')
     
     return fig
 
 with col_conc_1:
     st.write("**Estado de la Hipótesis Nula:**")
-    fig_gauge = dibujar_medidor(se_rechaza)
     # Renderizar con fondo transparente
-    st.pyplot(fig_gauge, transparent=True)
+    mostrar_figura("eda_medidor", bool(se_rechaza), dibujar_medidor, transparent=True)
 
 with col_conc_2:
     st.write("**Interpretación del Resultado:**")
@@ -380,4 +372,63 @@ with col_conc_2:
         st.markdown(f"####  **No se rechaza la Ho**")
         st.markdown("""
         No hay evidencia estadística suficiente para diferenciar el comportamiento entre zonas.
-        """)
\ No newline at end of file
+        """)
+
+st.markdown("---")
+
+# ==============================================================================
+# SECCIÓN 5: BATERÍA DE PRUEBAS (CORRECCIÓN POR COMPARACIONES MÚLTIPLES)
+# ==============================================================================
+st.subheader("5️⃣ Batería de pruebas")
+st.markdown("""
+Todas las parejas de alcaldías, todas las ventanas horarias por alcaldía y todas las familias de delito,
+con corrección de **Benjamini–Hochberg** (q-valor) sobre el conjunto completo de pruebas.
+""")
+
+@result_cache.memoize("eda.cubo_familias")
+def consultar_cubo_familias():
+    with connect(read_only=True) as con:
+        return family_cube(con)
+
+def load_cubo_familias():
+    # Los errores no se guardan en caché: el siguiente rerun vuelve a intentarlo
+    try:
+        return consultar_cubo_familias()
+    except Exception:
+        return None
+
+col_bat_1, col_bat_2 = st.columns([1, 3])
+with col_bat_1:
+    ancho_ventana = st.select_slider("Ancho de ventana (horas):", options=[1, 2, 3, 4, 6], value=3)
+    solo_significativas = st.checkbox("Solo significativas (q < 0.05)", value=True)
+
+with span("eda.run_suite", ancho_ventana=ancho_ventana):
+    resultados = run_suite(matriz, load_cubo_familias(), window_width=ancho_ventana)
+
+with col_bat_1:
+    st.metric("Pruebas", f"{len(resultados):,}")
+    st.metric("Significativas", f"{int(resultados['significativa'].sum()):,}")
+
+with col_bat_2:
+    resumen = resultados.groupby("prueba", sort=False).agg(
+        pruebas=("grupo", "size"),
+        significativas=("significativa", "sum"),
+        v_mediana=("cramers_v", "median"),
+    )
+    st.dataframe(resumen, use_container_width=True)
+
+    tabla = resultados[resultados["significativa"]] if solo_significativas else resultados
+    st.dataframe(
+        tabla.sort_values(["q_value", "cramers_v"], ascending=[True, False]).head(200),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "chi2": st.column_config.NumberColumn("Chi²", format="%.2f"),
+            "p_value": st.column_config.NumberColumn("p-valor", format="%.2e"),
+            "q_value": st.column_config.NumberColumn("q-valor", format="%.2e"),
+            "cramers_v": st.column_config.NumberColumn("V de Cramér", format="%.3f"),
+        },
+    )
+
+with st.expander("⚙️ Cachés de gráficas y resultados"):
+    st.json({"graficas": fig_cache.stats(), "resultados": result_cache.stats()})
@@ -9,23 +9,43 @@
 #Emilio Adrián Gutiérrez Terrones A01654071
 
 
-import os
 #import re
-import json
-from datetime import datetime, timedelta
-from pathlib import Path
+from datetime import datetime
 import streamlit as st
 import pandas as pd
 import folium
-from folium.plugins import HeatMap, HeatMapWithTime, MarkerCluster
-import numpy as np
-import osmnx as ox
-import branca.colormap as cm
-import geopandas as gpd
-from shapely.geometry import Point
-import duckdb
-import matplotlib.pyplot as plt
 import altair as alt
+from crime_core.cache import get_result_cache
+from crime_core.figures import get_figure_cache
+from crime_core.data import find_geojson, frame_memory, get_crime_data
+from crime_core.db import connect
+from crime_core.grid import (
+    GRID_BASE_KM, GRID_LEVELS_KM, WEEKDAYS, build_grid_pyramid, count_violence, counts_by_alcaldia, counts_by_weekday,
+    timeline_groups,
+)
+from crime_core.density import BANDWIDTHS_KM, DEFAULT_BANDWIDTH_KM, hotspot_polygons, kde_surface
+from crime_core.maps import (
+    POI_LAYERS, add_alcaldias_to_map, add_density_layer, add_emerging_layer, add_grid_to_map,
+    add_heatmap, add_hex_layer, add_hotspot_layer, add_poi_layer, add_proximity_layer, add_timeline,
+    add_radius_query_layer, cell_count_map, create_base_map, hex_count_map, poi_points, stable_html,
+    viewport_layer_data,
+)
+from crime_core.hotspots import hotspot_cells
+from crime_core.spacetime import MIN_WEEKS, build_space_time_cube, emerging_hotspots
+from crime_core.proximity import (
+    DEFAULT_RADIUS_M, PROXIMITY_RADII_M, build_crime_index, poi_crime_counts, radius_column, radius_report,
+    top_pois,
+)
+from crime_core.hexgrid import MAP_RESOLUTIONS, edge_label, hex_counts
+from crime_core.viewport import POINTS_MIN_ZOOM, build_hex_pyramid, viewport_layer
+from crime_core.scoping import profile_for, scoped_cells, scoped_counts, scoped_hex_cells
+from crime_core.lazy import lazy_import
+from crime_core.metrics import span
+from css.theme import inject_page_css
+from components.viewport_map import current_viewport, viewport_map
+
+# matplotlib only loads on a figure-cache miss (osmnx loads inside crime_core.maps)
+plt = lazy_import("matplotlib.pyplot")
 
 
 # Page configuration
@@ -43,211 +63,99 @@ st.markdown("Análisis interactivo de delitos con múltiples capas de visualizac
 st.sidebar.header("Controles del Panel")
 
 # ============================================================================
-# DATA CLEANING FUNCTIONS (Adapted from final_eda.py)
-# ============================================================================
-
-# ============================================================================
-# DATA CLEANING FUNCTIONS (Optimized for Memory)
+# DATA SCOPE (crime_core.scoping): what this session's role may query
 # ============================================================================
 
-def _strip_accents_capitalize(text):
-    """
-    Normalize text by removing accents and capitalizing the first letter of each word.
-    Example: "álvaro obregón norte" -> "Alvaro Obregon Norte"
-    """
-    if pd.isna(text):
-        return text
-    
-    # Remove accents
-    repl = (("á","a"),("é","e"),("í","i"),("ó","o"),("ú","u"),
-            ("Á","A"),("É","E"),("Í","I"),("Ó","O"),("Ú","U"),
-            ("ñ","n"),("Ñ","N"))
-    for a, b in repl:
-        text = text.replace(a, b)
-    
-    # Capitalize the first letter of each word
-    words = text.split()
-    words = [w.capitalize() for w in words]
-    
-    return " ".join(words)
+profile = profile_for(st.session_state.get("role"), st.session_state.get("alcaldias_asignadas"))
 
-def _fill_missing_alcaldias(crimes_df, geojson_path, alcaldia_column="NOMGEO"):
-    """
-    Fill missing 'alcaldia_hecho' using coordinates.
-    """
-    if not os.path.exists(geojson_path):
-        st.warning(f"Archivo GeoJSON no encontrado en {geojson_path}.")
-        return crimes_df
-    
-    try:
-        # Load the GeoJSON polygons
-        gdf_municipalities = gpd.read_file(geojson_path).to_crs(epsg=4326)
-        
-        # Work only with rows that have coordinates
-        coords_df = crimes_df.dropna(subset=["latitud", "longitud"]).copy()
-        
-        if not coords_df.empty:
-            # Build Point geometries
-            coords_df["geometry"] = [Point(xy) for xy in zip(coords_df["longitud"], coords_df["latitud"])]
-            
-            # Convert to GeoDataFrame
-            crimes_gdf = gpd.GeoDataFrame(coords_df, geometry="geometry", crs="EPSG:4326")
-            
-            # Spatial join with municipality polygons
-            joined = gpd.sjoin(crimes_gdf, gdf_municipalities, how="left", predicate="within")
-            
-            # Fill missing values
-            crimes_df = crimes_df.copy()
-            subset = crimes_df.loc[coords_df.index, "alcaldia_hecho"].copy()
-            subset = subset.fillna(joined[alcaldia_column].reset_index(drop=True))
-            crimes_df.loc[coords_df.index, "alcaldia_hecho"] = subset
-    
-    except Exception as e:
-        st.warning(f"Error al completar alcaldías: {e}")
-    
-    return crimes_df
+# Shared across sessions with one memory budget; keys are the filters, never the data
+result_cache = get_result_cache()
 
-def _fill_to_unknown(df, column="alcaldia_hecho"):
-    df = df.copy()
-    df[column] = df[column].replace("CDMX (indeterminada)", "Desconocido")
-    df[column] = df[column].fillna("Desconocido")
-    return df
+# ============================================================================
+# AGGREGATED VIEW (roles without row-level access, e.g. Visitante)
+# ============================================================================
 
-def clean_crime_data(df, geojson_path=None):
-    """
-    Clean and prepare crime data.
-    Includes MEMORY PROTECTION to skip spatial joins on large datasets.
-    """
-    
-    
-    original_count = len(df)
-    
-    # --- MEMORY FIX: Skip Spatial Join if dataset is too big ---
-    # geopandas sjoin is extremely heavy. If > 5000 rows, we skip it to prevent crash.
-    if geojson_path and os.path.exists(geojson_path):
-        if len(df) < 5000: 
-            df = _fill_missing_alcaldias(df, geojson_path)
-        else:
-            st.warning("⚠️ Dataset grande: Saltando cálculo geométrico para ahorrar memoria.")
-    # -----------------------------------------------------------
+@result_cache.memoize("mapa.cells")
+def load_cells(profile, cell_km, categorias):
+    """Crime counts per grid cell, aggregated in DuckDB"""
+    with connect() as con:
+        return scoped_cells(con, profile, cell_km, list(categorias))
+
+@result_cache.memoize("mapa.hex_cells")
+def load_hex_cells(profile, res, categorias):
+    """Crime counts per hexagon, an integer GROUP BY in DuckDB"""
+    with connect() as con:
+        return scoped_hex_cells(con, profile, res, list(categorias))
+
+@result_cache.memoize("mapa.counts")
+def load_counts(profile, column, categorias, limit=None):
+    """Crime counts per value of `column`, aggregated in DuckDB"""
+    with connect() as con:
+        return scoped_counts(con, profile, column, list(categorias), limit)
+
+if not profile.row_level:
+    st.sidebar.info("Vista pública: solo se muestran conteos agregados por celda.")
+    unit = st.sidebar.radio("Unidad de agregación", ["Cuadrícula", "Hexágonos"], horizontal=True)
+    if unit == "Hexágonos":
+        hex_res = st.sidebar.select_slider(
+            "Lado del hexágono", options=MAP_RESOLUTIONS, value=3, format_func=edge_label,
+        )
+    else:
+        cell_km = st.sidebar.slider("Tamaño de celda de cuadrícula (km)", 0.5, 5.0, 1.0, 0.5)
+    all_categories = load_counts(profile, "categoria_delito", ())["valor"].tolist()
+    categorias = tuple(st.sidebar.multiselect("Selecionar categorías de delito", all_categories))
 
-    # Step 2: Fill remaining missing values with "Unknown"
-    df = _fill_to_unknown(df)
-    
-    # Step 3: Normalize alcaldía names
-    df["alcaldia_hecho"] = df["alcaldia_hecho"].apply(_strip_accents_capitalize)
-    
-    # Step 4: Clean and validate coordinates
-    # (Note: We already filtered NULLs in SQL, but we filter ranges here)
-    before_coord_filter = len(df)
-    
-    # Ensure numeric types (Redundant check, but safe)
-    df['latitud'] = pd.to_numeric(df['latitud'], errors='coerce')
-    df['longitud'] = pd.to_numeric(df['longitud'], errors='coerce')
-    
-    df = df.dropna(subset=['latitud', 'longitud'])
-    
-    # Filter valid coordinates for Mexico City
-    df = df[(df['latitud'] >= 19.0) & (df['latitud'] <= 19.6) & 
-            (df['longitud'] >= -99.4) & (df['longitud'] <= -98.9)]
-    
-    after_coord_filter = len(df)
-    coord_removed = before_coord_filter - after_coord_filter
-    
-    # Step 5: Convert date columns
-    for date_col in ['fecha_inicio', 'fecha_hecho']:
-        if date_col in df.columns:
-            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    
-    # Step 6: Normalize strings
-    if 'delito' in df.columns:
-        df['delito'] = df['delito'].str.strip().str.upper()
-    if 'categoria_delito' in df.columns:
-        df['categoria_delito'] = df['categoria_delito'].str.strip().str.upper()
-    
-    # Step 7: Remove duplicates
-    before_dedup = len(df)
-    df = df.drop_duplicates()
-    after_dedup = len(df)
-    duplicates_removed = before_dedup - after_dedup
-    
-    final_count = len(df)
-    total_removed = original_count - final_count
-    
-    return df
+    if unit == "Hexágonos":
+        cells = load_hex_cells(profile, hex_res, categorias)
+    else:
+        cells = load_cells(profile, cell_km, categorias)
+    if cells.empty:
+        st.warning("No hay suficientes datos agregados para mostrar.")
+        st.stop()
+
+    m = hex_count_map(cells) if unit == "Hexágonos" else cell_count_map(cells)
+    with span("mapa.folium_html", viz="celdas"):
+        html = m._repr_html_()
+    st.components.v1.html(html, height=600)
+
+    col_a, col_b = st.columns(2)
+    with col_a:
+        st.subheader("Crimenes por Alcaldía")
+        by_alcaldia = load_counts(profile, "alcaldia_hecho", categorias)
+        st.altair_chart(alt.Chart(by_alcaldia).mark_bar(color='#1f77b4').encode(
+            x=alt.X('valor', sort='-y', title='Alcaldía', axis=alt.Axis(labelAngle=-45, labelOverlap=False)),
+            y=alt.Y('n', title='Número de Crímenes'),
+            tooltip=['valor', 'n']
+        ).properties(height=400), use_container_width=True)
+    with col_b:
+        st.subheader("Top 10 tipos de crimen")
+        top = load_counts(profile, "delito", categorias, 10)
+        st.altair_chart(alt.Chart(top).mark_bar(color='#1f77b4').encode(
+            x=alt.X('valor', sort='-y', title='Tipo de Delito', axis=alt.Axis(labelAngle=-45, labelOverlap=False)),
+            y=alt.Y('n', title='Número de Crímenes'),
+            tooltip=['valor', 'n']
+        ).properties(height=400), use_container_width=True)
+    st.stop()
 
 # ============================================================================
-# DATA LOADING (Optimized for Memory)
+# DATA LOADING (crime_core.data; warmed up at startup from app.py)
 # ============================================================================
 
-@st.cache_data
-def load_crime_data():
-    """Load and clean crime data from DuckDB and local GeoJSON"""
+def load_crime_data(profile):
+    """Load and clean the crimes this role may see, from DuckDB and local GeoJSON"""
+    # get_crime_data is memoized in the shared result cache
     try:
-        db_path = "crimes_fgj.db"
-        geojson_path = "limite-de-las-alcaldias.json"
-
-        if not os.path.exists(db_path):
-            st.error(f"BD no encontrada: {db_path}")
-            return None
-
-        con = duckdb.connect(db_path, read_only=True)
-        
-        # --- MEMORY FIX 1: SELECT ONLY NEEDED COLUMNS ---
-        # Instead of SELECT *, we select only what we visualize.
-        # We also filter NULL coordinates in SQL to save Python memory.
-        query = """
-            SELECT 
-                delito, 
-                categoria_delito,
-                alcaldia_hecho, 
-                latitud, 
-                longitud, 
-                fecha_hecho, 
-                anio_hecho
-            FROM crimes_raw
-            WHERE latitud IS NOT NULL 
-              AND longitud IS NOT NULL
-        """
-        # If your table doesn't have 'categoria_delito', remove it from the query above
-        
-        try:
-            df = con.execute(query).df()
-        except Exception:
-            # Fallback if columns don't match, but try to limit rows
-            st.warning("Columnas no coinciden, cargando con SELECT * LIMIT 50000")
-            df = con.execute("SELECT * FROM crimes_raw LIMIT 50000").df()
-            
-        con.close()
-        
-        # Clean column names
-        df.columns = df.columns.str.strip()
-        
-        # --- MEMORY FIX 2: PRE-CONVERT TYPES ---
-        # Fix the "str >= float" error immediately
-        cols_to_fix = ['latitud', 'longitud', 'anio_hecho']
-        for col in cols_to_fix:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # Drop rows where conversion failed
-        df = df.dropna(subset=['latitud', 'longitud']) 
-
-        # Pass path only if exists
-        final_geojson_path = geojson_path if os.path.exists(geojson_path) else None
-        
-        # Clean data
-        df = clean_crime_data(df, final_geojson_path)
-        
-        return df
-        
+        df, notices = get_crime_data(profile=profile)
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return None
+    for notice in notices:
+        st.warning(notice)
+    return df
 
 # Load data
 with st.spinner("Cargando datos de delitos..."):
-    crime_df = load_crime_data()
+    crime_df = load_crime_data(profile)
 
 if crime_df is None:
     st.error("No se pudo cargar la data, revise el path del archivo.")
@@ -262,13 +170,22 @@ st.sidebar.success(f"✅ Cargado {len(crime_df):,} registros de crimen limpios")
 # Visualization type selector
 viz_type = st.sidebar.selectbox(
     "Selecciona el tipo de visualización",
-    ["Mapa base con marcadores", "Mapa de calor", "Cuadrícula (probabilidad)",
-     "Zonas calientes dinámicas", "Línea de tiempo animada", "Todas las capas combinadas"]
+    ["Mapa base con marcadores", "Mapa de calor", "Cuadrícula (probabilidad)", "Hexágonos",
+     "Zonas calientes dinámicas", "Puntos calientes (Gi*)", "Puntos calientes emergentes",
+     "Línea de tiempo animada", "Todas las capas combinadas"]
 )
 
 # Filter controls
 st.sidebar.subheader("Filters")
 
+# The filters build boolean masks over the shared crime_df; only the final
+# frames are selected from it, and no filter copies the whole dataset
+def select_rows(df, mask):
+    """Rows of df where mask holds; df itself, not a copy, when it holds everywhere"""
+    return df if mask.all() else df[mask]
+
+base_mask = pd.Series(True, index=crime_df.index)
+
 # --- 1. Date Filter ---
 if 'fecha_hecho' in crime_df.columns:
     min_date = crime_df['fecha_hecho'].min()
@@ -282,19 +199,15 @@ if 'fecha_hecho' in crime_df.columns:
     )
     
     if len(date_range) == 2:
-        crime_df_base = crime_df[
+        base_mask &= (
             (crime_df['fecha_hecho'] >= pd.Timestamp(date_range[0])) &
             (crime_df['fecha_hecho'] <= pd.Timestamp(date_range[1]))
-        ].copy()
-    else:
-        crime_df_base = crime_df.copy()
-else:
-    crime_df_base = crime_df.copy()
+        )
 
 # --- 2. Category Filter ---
-if 'categoria_delito' in crime_df_base.columns:
+if 'categoria_delito' in crime_df.columns:
     st.sidebar.subheader("Filtro por categoría de delito")
-    crime_categories = sorted(crime_df_base['categoria_delito'].dropna().unique())
+    crime_categories = sorted(crime_df.loc[base_mask, 'categoria_delito'].dropna().unique())
     
     col_cat1, col_cat2 = st.sidebar.columns(2)
     with col_cat1:
@@ -314,12 +227,12 @@ if 'categoria_delito' in crime_df_base.columns:
     )
     
     if selected_categories:
-        crime_df_base = crime_df_base[crime_df_base['categoria_delito'].isin(selected_categories)]
+        base_mask &= crime_df['categoria_delito'].isin(selected_categories)
 
 # --- 3. Crime Type Filter Setup ---
 # We define the options based on the base data, but we apply the filter LATER to separate datasets.
 st.sidebar.subheader("Filtro por tipo de crimen")
-crime_types = sorted(crime_df_base['delito'].unique())
+crime_types = sorted(crime_df.loc[base_mask, 'delito'].unique())
 
 col1, col2 = st.sidebar.columns(2)
 with col1:
@@ -341,8 +254,8 @@ selected_crimes = st.sidebar.multiselect(
 # --- 4. Alcaldia Filter Setup ---
 # To maintain UI consistency, options here depend on the "current view" (which includes crime types)
 # BUT we will apply this filter to the base data to create the "Broad" dataset.
-temp_view_df = crime_df_base[crime_df_base['delito'].isin(selected_crimes)] if selected_crimes else crime_df_base
-alcaldias = sorted(temp_view_df['alcaldia_hecho'].dropna().unique())
+crime_mask = crime_df['delito'].isin(selected_crimes) if selected_crimes else pd.Series(True, index=crime_df.index)
+alcaldias = sorted(crime_df.loc[base_mask & crime_mask, 'alcaldia_hecho'].dropna().unique())
 
 selected_alcaldias = st.sidebar.multiselect(
     "Seleccionar Alcaldías",
@@ -354,18 +267,21 @@ selected_alcaldias = st.sidebar.multiselect(
 
 # A) Broad Context DataFrame (Date + Category + Alcaldia, IGNORING specific Crime Type)
 # This is used for the "Top 10" chart to show what else is happening in these areas/times.
-if selected_alcaldias:
-    crime_df_broad = crime_df_base[crime_df_base['alcaldia_hecho'].isin(selected_alcaldias)]
-else:
-    crime_df_broad = crime_df_base
+broad_mask = base_mask & crime_df['alcaldia_hecho'].isin(selected_alcaldias) if selected_alcaldias else base_mask
+crime_df_broad = select_rows(crime_df, broad_mask)
 
 # B) Specific Filtered DataFrame (Broad + Specific Crime Type)
 # This is used for the Map, Stats, and specific charts.
-if selected_crimes:
-    crime_df_filtered = crime_df_broad[crime_df_broad['delito'].isin(selected_crimes)]
-else:
-    crime_df_filtered = crime_df_broad
-
+crime_df_filtered = select_rows(crime_df, broad_mask & crime_mask)
+
+# Cache key for results derived from crime_df_filtered: the filters that produced it
+filter_key = (
+    profile,
+    tuple(str(d) for d in date_range) if 'fecha_hecho' in crime_df.columns else None,
+    tuple(selected_categories) if 'categoria_delito' in crime_df.columns else None,
+    tuple(selected_crimes),
+    tuple(selected_alcaldias),
+)
 
 # Additional layers toggle
 st.sidebar.subheader("Capas adicionales")
@@ -374,12 +290,78 @@ show_schools = st.sidebar.checkbox("Mostrar escuelas", value=False)
 show_hospitals = st.sidebar.checkbox("Mostrar hospitales", value=False)
 show_metro = st.sidebar.checkbox("Mostrar estaciones de metro", value=False)
 show_parking = st.sidebar.checkbox("Mostrar estacionamientos", value=False)
+if any((show_schools, show_hospitals, show_metro, show_parking)):
+    proximity_radius = st.sidebar.select_slider(
+        "Radio de proximidad (m)", options=PROXIMITY_RADII_M, value=DEFAULT_RADIUS_M,
+        help="Cuenta los crímenes filtrados a esta distancia de cada punto de interés",
+    )
+
+# Radius query around a point, over every loaded crime (crime_core.proximity)
+st.sidebar.subheader("Consulta por radio")
+point_query = st.sidebar.checkbox("Consultar alrededor de un punto", value=False)
+if point_query:
+    query_lat = st.sidebar.number_input(
+        "Latitud", min_value=19.0, max_value=19.6, value=round(float(crime_df['latitud'].median()), 5),
+        step=0.001, format="%.5f",
+    )
+    query_lon = st.sidebar.number_input(
+        "Longitud", min_value=-99.4, max_value=-98.9, value=round(float(crime_df['longitud'].median()), 5),
+        step=0.001, format="%.5f",
+    )
+    query_radius_m = st.sidebar.slider("Radio de la consulta (m)", 100, 2000, 500, 100)
+    query_dates = (None, None)
+    if 'fecha_hecho' in crime_df.columns:
+        last_date = crime_df['fecha_hecho'].max()
+        query_range = st.sidebar.date_input(
+            "Fechas de la consulta",
+            value=(last_date - pd.Timedelta(days=30), last_date),
+            min_value=crime_df['fecha_hecho'].min(),
+            max_value=last_date,
+        )
+        if len(query_range) == 2:
+            query_dates = query_range
 
 # Grid sector settings
-if viz_type in ["Cuadrícula (probabilidad)", "Zonas calientes dinámicas", "Todas las capas combinadas"]:
+if viz_type in ["Cuadrícula (probabilidad)", "Puntos calientes (Gi*)", "Puntos calientes emergentes",
+                "Todas las capas combinadas"]:
     st.sidebar.subheader("Configuración de cuadrícula")
-    grid_size = st.sidebar.slider("Tamaño de celda de cuadrícula (km)", 0.5, 5.0, 1.0, 0.5)
-    probability_threshold = st.sidebar.slider("Límite de probablidad (%)", 0, 100, 50, 5)
+    grid_size = st.sidebar.select_slider("Tamaño de celda de cuadrícula (km)", options=GRID_LEVELS_KM, value=1.0)
+if viz_type in ["Cuadrícula (probabilidad)", "Todas las capas combinadas"]:
+    probability_threshold = st.sidebar.slider(
+        "Límite de probablidad (%)", 0, 100, 50, 5,
+        help="Muestra las celdas con al menos este porcentaje de la probabilidad de la celda más caliente",
+    )
+
+# Getis-Ord Gi* settings (statistical hot spots, crime_core.hotspots)
+if viz_type in ["Puntos calientes (Gi*)", "Puntos calientes emergentes"]:
+    gi_radius = st.sidebar.slider(
+        "Vecindario (celdas a cada lado)", 1, 3, 1,
+        help="Cada celda se compara con las celdas a esta distancia o menos; "
+             "las zonas se marcan con significancia corregida por FDR (Benjamini-Hochberg)",
+    )
+
+# Kernel density settings (hot zones are smoothed on the server, crime_core.density)
+if viz_type == "Zonas calientes dinámicas":
+    st.sidebar.subheader("Configuración de densidad")
+    bandwidth_km = st.sidebar.select_slider(
+        "Radio de suavizado (km)", options=BANDWIDTHS_KM, value=DEFAULT_BANDWIDTH_KM,
+        help="Desviación estándar del kernel gaussiano; un radio mayor da zonas más amplias y suaves",
+    )
+
+if viz_type in ["Cuadrícula (probabilidad)", "Zonas calientes dinámicas", "Puntos calientes (Gi*)",
+                "Todas las capas combinadas"]:
+    grid_hour = st.sidebar.selectbox(
+        "Hora del día", [None] + list(range(24)),
+        format_func=lambda h: "Todas" if h is None else f"{h:02d}:00",
+        disabled="hora" not in crime_df.columns,
+    )
+
+# Hexagon settings
+if viz_type == "Hexágonos":
+    st.sidebar.subheader("Configuración de hexágonos")
+    hex_res = st.sidebar.select_slider(
+        "Lado del hexágono", options=MAP_RESOLUTIONS, value=3, format_func=edge_label,
+    )
 
 # Animation settings
 if viz_type == "Línea de tiempo animada":
@@ -387,235 +369,81 @@ if viz_type == "Línea de tiempo animada":
     time_window = st.sidebar.slider("Ventana de tiempo (horas)", 4, 48, 24, 4)
 
 # ============================================================================
-# MAP CREATION FUNCTIONS
+# MAP LAYERS (crime_core.grid computes, crime_core.maps draws)
 # ============================================================================
 
-def create_base_map():
-    """Create base Folium map centered on Mexico City"""
-    center_lat = crime_df_filtered['latitud'].mean()
-    center_lon = crime_df_filtered['longitud'].mean()
-    
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=11,
-        tiles='OpenStreetMap'
-    )
-    
-    # Add alternative tile layers
-    folium.TileLayer('CartoDB positron', name='Light Map').add_to(m)
-    folium.TileLayer('CartoDB dark_matter', name='Dark Map').add_to(m)
-    
-    return m
-
-@st.cache_data
-def get_schools_data():
-    """Get schools data using OSMnx"""
-    try:
-        tags = {'amenity': 'school'}
-        gdf = ox.features_from_place('Ciudad de México, Mexico', tags)
-        return gdf
-    except:
-        return None
-
-@st.cache_data
-def get_hospitals_data():
-    """Get hospitals data using OSMnx"""
-    try:
-        tags = {'amenity': 'hospital'}
-        gdf = ox.features_from_place('Ciudad de México, Mexico', tags)
-        return gdf
-    except:
-        return None
-
-@st.cache_data
-def get_metro_data():
-    """Get metro stations using OSMnx"""
-    try:
-        tags = {'railway': 'station', 'station': 'subway'}
-        gdf = ox.features_from_place('Ciudad de México, Mexico', tags)
-        return gdf
-    except:
-        return None
-
-@st.cache_data
-def get_parking_data():
-    """Get parking areas using OSMnx"""
-    try:
-        tags = {'amenity': 'parking'}
-        gdf = ox.features_from_place('Ciudad de México, Mexico', tags)
-        return gdf
-    except:
-        return None
-
-def create_grid_sectors(df, cell_size_km=1.0):
-    """Create grid sectors with crime probability"""
-    # Convert km to degrees (approximate)
-    cell_size = cell_size_km / 111.0
-    
-    # Create grid
-    lat_bins = np.arange(df['latitud'].min(), df['latitud'].max() + cell_size, cell_size)
-    lon_bins = np.arange(df['longitud'].min(), df['longitud'].max() + cell_size, cell_size)
-    
-    # Count crimes in each cell
-    grid_counts = np.zeros((len(lat_bins)-1, len(lon_bins)-1))
-    
-    for i in range(len(lat_bins)-1):
-        for j in range(len(lon_bins)-1):
-            mask = (
-                (df['latitud'] >= lat_bins[i]) & 
-                (df['latitud'] < lat_bins[i+1]) &
-                (df['longitud'] >= lon_bins[j]) & 
-                (df['longitud'] < lon_bins[j+1])
-            )
-            grid_counts[i, j] = mask.sum()
-    
-    # Calculate probabilities
-    total_crimes = grid_counts.sum()
-    grid_probs = (grid_counts / total_crimes * 100) if total_crimes > 0 else grid_counts
-    
-    return lat_bins, lon_bins, grid_counts, grid_probs
-
-def add_grid_to_map(m, lat_bins, lon_bins, grid_probs, threshold=0):
-    """Add colored grid sectors to map"""
-    # Create colormap
-    max_prob = grid_probs.max()
-    colormap = cm.LinearColormap(
-        colors=['green', 'yellow', 'orange', 'red'],
-        vmin=0,
-        vmax=max_prob,
-        caption='Probabilidad de crimen (%)'
-    )
-    
-    # Add rectangles for each cell
-    for i in range(len(lat_bins)-1):
-        for j in range(len(lon_bins)-1):
-            if grid_probs[i, j] >= threshold:
-                folium.Rectangle(
-                    bounds=[
-                        [lat_bins[i], lon_bins[j]],
-                        [lat_bins[i+1], lon_bins[j+1]]
-                    ],
-                    color=colormap(grid_probs[i, j]),
-                    fill=True,
-                    fillColor=colormap(grid_probs[i, j]),
-                    fillOpacity=0.5,
-                    popup=f"Probabilidad: {grid_probs[i, j]:.2f}%<br>Count: {int(grid_probs[i, j] * len(crime_df_filtered) / 100)}"
-                ).add_to(m)
-    
-    colormap.add_to(m)
-
-def add_alcaldias_to_map(m, geojson_path, crime_counts_df):
-    """
-    Add alcaldía boundaries to map with crime count information
-    
-    Parameters:
-    - m: folium map object
-    - geojson_path: path to the GeoJSON file with alcaldía boundaries
-    - crime_counts_df: DataFrame with alcaldía names and crime counts
-    """
-    if not os.path.exists(geojson_path):
-        st.warning(f"GeoJSON archivo no encontrado en {geojson_path}")
+def add_alcaldias_layer(m):
+    """Alcaldía boundaries colored by the current crime counts, if enabled"""
+    if not (show_alcaldias and geojson_path):
         return
-    
     try:
-        # Load GeoJSON
-        with open(geojson_path, "r", encoding="utf-8") as f:
-            alcaldias_geo = json.load(f)
-        
-        # Create a dictionary of crime counts by alcaldía (normalized)
-        crime_dict = {}
-        for idx, row in crime_counts_df.iterrows():
-            normalized_name = _strip_accents_capitalize(row['alcaldia_hecho'])
-            crime_dict[normalized_name] = row['count']
-        
-        # Create a colormap for the choropleth
-        max_crimes = max(crime_dict.values()) if crime_dict else 1
-        colormap = cm.LinearColormap(
-            colors=['#ffffcc', '#ffeda0', '#fed976', '#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#bd0026', '#800026'],
-            vmin=0,
-            vmax=max_crimes,
-            caption='Numero de crimenes'
-        )
-        
-        def style_function(feature):
-            """Style each alcaldía based on crime count"""
-            # Normalize the GeoJSON name the same way
-            alcaldia_name = feature['properties'].get('NOMGEO', '')
-            alcaldia_normalized = _strip_accents_capitalize(alcaldia_name)
-            crime_count = crime_dict.get(alcaldia_normalized, 0)
-    
-            return {
-                'fillColor': colormap(crime_count) if crime_count > 0 else '#cccccc',
-                'color': 'black',
-                'weight': 2,
-                'fillOpacity': 0.6
-            }
-        
-        def highlight_function(feature):
-            """Highlight on hover"""
-            return {
-                'fillColor': '#ffff00',
-                'color': 'black',
-                'weight': 3,
-                'fillOpacity': 0.8
-            }
-        
-        # Add GeoJSON layer with tooltips and popups
-        folium.GeoJson(
-            alcaldias_geo,
-            name="Alcaldías",
-            style_function=style_function,
-            highlight_function=highlight_function,
-            tooltip=folium.GeoJsonTooltip(
-                fields=['NOMGEO'],
-                aliases=['Alcaldía:'],
-                localize=True
-            ),
-            popup=folium.GeoJsonPopup(
-                fields=['NOMGEO'],
-                aliases=['Alcaldía:'],
-                localize=True
-            )
-        ).add_to(m)
-        
-        # Add custom popups with crime counts
-        gdf = gpd.read_file(geojson_path)
-        for idx, row in gdf.iterrows():
-            alcaldia_name = _strip_accents_capitalize(row['NOMGEO'])
-            crime_count = crime_dict.get(alcaldia_name, 0)
-            
-            # Get centroid for label placement
-            centroid = row.geometry.centroid
-            
-            # Add a marker at the centroid with crime count
-            folium.Marker(
-                location=[centroid.y, centroid.x],
-                icon=folium.DivIcon(html=f'''
-                    <div style="
-                        font-size: 10px;
-                        font-weight: bold;
-                        color: white;
-                        text-align: center;
-                        background-color: rgba(0, 0, 0, 0.7);
-                        border-radius: 5px;
-                        padding: 2px 5px;
-                        white-space: nowrap;
-                    ">
-                        {alcaldia_name}<br>{crime_count:,} crimes
-                    </div>
-                ''')
-            ).add_to(m)
-        
-        # Add colormap to map
-        colormap.add_to(m)
-        
+        add_alcaldias_to_map(m, geojson_path, crime_counts)
+    except FileNotFoundError as e:
+        st.warning(str(e))
     except Exception as e:
         st.warning(f"Error añadiendo alcaldías {e}")
 
-@st.cache_data
-def get_crime_counts_by_alcaldia(df):
-    """Get crime counts grouped by alcaldía"""
-    return df.groupby('alcaldia_hecho').size().reset_index(name='count')
+@result_cache.memoize("mapa.grid_pyramid")
+def get_grid_pyramid(_df, filter_key):
+    """Every grid size of the slider, binned once per set of filters"""
+    return build_grid_pyramid(_df)
+
+def add_grid_layer(m):
+    """Probability grid of the filtered crimes (a pyramid lookup, not a re-binning)"""
+    level = get_grid_pyramid(crime_df_filtered, filter_key).level(grid_size)
+    counts, probs = (level.counts, level.probs) if grid_hour is None else level.hour(grid_hour)
+    add_grid_to_map(m, level.lat_bins, level.lon_bins, counts, probs, probability_threshold)
+
+@result_cache.memoize("mapa.density")
+def get_density(_df, filter_key, bandwidth_km, hour):
+    """Smoothed surface and hot-zone contours; deterministic for the filters, so cached like the grid"""
+    surface = kde_surface(get_grid_pyramid(_df, filter_key).level(GRID_BASE_KM), bandwidth_km, hour)
+    return surface, hotspot_polygons(surface)
+
+@result_cache.memoize("mapa.hotspots")
+def get_hotspots(_df, filter_key, cell_size_km, radius, hour):
+    """Gi* z-scores and FDR bins of every studied cell, per set of filters"""
+    return hotspot_cells(get_grid_pyramid(_df, filter_key).level(cell_size_km), radius, hour)
+
+@result_cache.memoize("mapa.space_time_cube")
+def get_space_time_cube(_df, filter_key, cell_size_km):
+    """Crimes per cell x week on the fixed CDMX grid (crime_core.spacetime)"""
+    return build_space_time_cube(_df, cell_size_km)
+
+@result_cache.memoize("mapa.emerging")
+def get_emerging(_df, filter_key, cell_size_km, radius):
+    """Weekly Gi* and Mann-Kendall trends of every cell, per set of filters"""
+    return emerging_hotspots(get_space_time_cube(_df, filter_key, cell_size_km), radius)
+
+@result_cache.memoize("mapa.crime_index")
+def get_crime_index(_df, filter_key):
+    """k-d tree over the filtered crimes, shared by every proximity query of these filters"""
+    return build_crime_index(_df)
+
+@result_cache.memoize("mapa.poi_proximity")
+def get_poi_proximity(_df, filter_key, layer):
+    """Crimes within every offered radius of each point of one POI layer"""
+    return poi_crime_counts(get_crime_index(_df, filter_key), poi_points(layer))
+
+@result_cache.memoize("mapa.point_index")
+def get_point_index(_df, profile):
+    """k-d tree with dates over every crime this role loaded, built once per data load"""
+    return build_crime_index(_df)
+
+@result_cache.memoize("mapa.hex_counts")
+def get_hex_counts(_df, filter_key, res):
+    """Crimes per hexagon from the loaded cell ids (crime_core.hexgrid)"""
+    return hex_counts(_df, res)
+
+@result_cache.memoize("mapa.hex_pyramid")
+def get_hex_pyramid(_df, filter_key):
+    """Crimes per hexagon at every map resolution, for the viewport layer"""
+    return build_hex_pyramid(_df)
+
+@result_cache.memoize("mapa.counts_by_alcaldia")
+def get_crime_counts_by_alcaldia(_df, filter_key):
+    """Get crime counts grouped by alcaldía (cached on the filters, not on the DataFrame)"""
+    return counts_by_alcaldia(_df)
 
 # ============================================================================
 # CREATE VISUALIZATION
@@ -624,227 +452,144 @@ def get_crime_counts_by_alcaldia(df):
 st.subheader(f"Visualization: {viz_type}")
 
 # Get GeoJSON path for alcaldías
-geojson_options = [
-    Path.home() / "Downloads" / "limite-de-las-alcaldias.json",
-    Path.home() / "Descargas" / "limite-de-las-alcaldias.json",
-    "limite-de-las-alcaldias.json"
-]
-
-geojson_path = None
-for path in geojson_options:
-    if os.path.exists(path):
-        geojson_path = str(path)
-        break
+geojson_path = find_geojson()
 
 # Calculate crime counts by alcaldía for the current filtered data
-crime_counts = get_crime_counts_by_alcaldia(crime_df_filtered)
+crime_counts = get_crime_counts_by_alcaldia(crime_df_filtered, filter_key)
 
-if viz_type == "Mapa base con marcadores":
-    m = create_base_map()
-    
-    # Add alcaldías layer if enabled
-    if show_alcaldias and geojson_path:
-        add_alcaldias_to_map(m, geojson_path, crime_counts)
-    
-    # Add marker cluster
-    marker_cluster = MarkerCluster().add_to(m)
-    
-    # Sample data if too many points
-    sample_df = crime_df_filtered.sample(min(1000, len(crime_df_filtered)))
-    
-    for idx, row in sample_df.iterrows():
-        folium.CircleMarker(
-            location=[row['latitud'], row['longitud']],
-            radius=3,
-            popup=f"<b>Crime:</b> {row['delito']}<br><b>Date:</b> {row['fecha_hecho']}<br><b>Alcaldía:</b> {row['alcaldia_hecho']}",
-            color='red',
-            fill=True,
-            fillColor='red'
-        ).add_to(marker_cluster)
-
-elif viz_type == "Mapa de calor":
-    m = create_base_map()
-    
-    # Add alcaldías layer if enabled
-    if show_alcaldias and geojson_path:
-        add_alcaldias_to_map(m, geojson_path, crime_counts)
-    
-    # Prepare heatmap data
-    heat_data = crime_df_filtered[['latitud', 'longitud']].values.tolist()
-    
-    # Add heatmap
-    HeatMap(
-        heat_data,
-        radius=15,
-        blur=25,
-        max_zoom=13,
-        name='Heatmap de crimen'
-    ).add_to(m)
+m = create_base_map(crime_df_filtered)
+add_alcaldias_layer(m)
+
+# Markers and heatmap follow the map's viewport (components.viewport_map): only
+# the crimes in view are sent, as hexagons zoomed out and as points zoomed in
+VIEWPORT_STYLES = {"Mapa base con marcadores": "markers", "Mapa de calor": "heat"}
+
+if viz_type in VIEWPORT_STYLES:
+    viewport = current_viewport(st.session_state.get("mapa_viewport"))
+    crimes_in_view = viewport_layer(
+        get_crime_index(crime_df_filtered, filter_key), get_hex_pyramid(crime_df_filtered, filter_key),
+        crime_df_filtered, viewport,
+    )
+    crimes_in_view_data = viewport_layer_data(crimes_in_view, VIEWPORT_STYLES[viz_type])
 
 elif viz_type == "Cuadrícula (probabilidad)":
-    m = create_base_map()
-    
-    # Add alcaldías layer if enabled
-    if show_alcaldias and geojson_path:
-        add_alcaldias_to_map(m, geojson_path, crime_counts)
-    
-    # Create and add grid
-    lat_bins, lon_bins, grid_counts, grid_probs = create_grid_sectors(crime_df_filtered, grid_size)
-    add_grid_to_map(m, lat_bins, lon_bins, grid_probs, probability_threshold/100)
+    add_grid_layer(m)
+
+elif viz_type == "Hexágonos":
+    add_hex_layer(m, get_hex_counts(crime_df_filtered, filter_key, hex_res))
 
 elif viz_type == "Zonas calientes dinámicas":
-    m = create_base_map()
-    
-    # Add alcaldías layer if enabled
-    if show_alcaldias and geojson_path:
-        add_alcaldias_to_map(m, geojson_path, crime_counts)
-    
-    # Create grid with dynamic threshold
-    lat_bins, lon_bins, grid_counts, grid_probs = create_grid_sectors(crime_df_filtered, grid_size)
-    
-    # Only show hot spots above threshold
-    add_grid_to_map(m, lat_bins, lon_bins, grid_probs, probability_threshold/100)
-    
-    # Add heatmap overlay
-    heat_data = crime_df_filtered[['latitud', 'longitud']].values.tolist()
-    HeatMap(
-        heat_data,
-        radius=20,
-        blur=30,
-        max_zoom=13,
-        name='Zonas calientes'
-    ).add_to(m)
+    # Server-side kernel density with the contours of its top percentiles
+    add_density_layer(m, *get_density(crime_df_filtered, filter_key, bandwidth_km, grid_hour))
+
+elif viz_type == "Puntos calientes (Gi*)":
+    n_cells = add_hotspot_layer(m, get_hotspots(crime_df_filtered, filter_key, grid_size, gi_radius, grid_hour))
+    if n_cells == 0:
+        st.info("Ninguna celda es un punto caliente o frío significativo con estos filtros.")
+
+elif viz_type == "Puntos calientes emergentes":
+    cube = get_space_time_cube(crime_df_filtered, filter_key, grid_size)
+    if cube.weeks < MIN_WEEKS:
+        st.warning(f"Solo hay {cube.weeks} semanas con estos filtros; las tendencias necesitan al menos {MIN_WEEKS}.")
+    n_cells = add_emerging_layer(m, get_emerging(crime_df_filtered, filter_key, grid_size, gi_radius))
+    if n_cells == 0:
+        st.info("Ninguna celda muestra un patrón de punto caliente con estos filtros.")
+    elif cube.weeks:
+        st.caption(f"{cube.weeks} semanas, del {cube.week_starts[0]:%Y-%m-%d} al {cube.week_starts[-1]:%Y-%m-%d}")
 
 elif viz_type == "Línea de tiempo animada":
-    m = create_base_map()
-    
-    # Add alcaldías layer if enabled
-    if show_alcaldias and geojson_path:
-        add_alcaldias_to_map(m, geojson_path, crime_counts)
-    
-    # Prepare time-series data
-    crime_df_sorted = crime_df_filtered.sort_values('fecha_hecho')
-    
     # Group by time windows
-    time_groups = []
-    time_labels = []
-    
-    start_date = crime_df_sorted['fecha_hecho'].min()
-    end_date = crime_df_sorted['fecha_hecho'].max()
-    current_date = start_date
-    
-    while current_date <= end_date:
-        next_date = current_date + timedelta(hours=time_window)
-        mask = (crime_df_sorted['fecha_hecho'] >= current_date) & (crime_df_sorted['fecha_hecho'] < next_date)
-        group_data = crime_df_sorted[mask][['latitud', 'longitud']].values.tolist()
-        
-        if group_data:
-            time_groups.append(group_data)
-            time_labels.append(current_date.strftime('%Y-%m-%d %H:%M'))
-        
-        current_date = next_date
-    
-    if time_groups:
-        # Add animated heatmap
-        HeatMapWithTime(
-            time_groups,
-            index=time_labels,
-            auto_play=True,
-            radius=15,
-            max_opacity=0.8,
-            name='Línea de tiempo de crimen animada'
-        ).add_to(m)
+    time_groups, time_labels = timeline_groups(crime_df_filtered, time_window)
+    add_timeline(m, time_groups, time_labels)
 
 elif viz_type == "Todas las capas combinadas":
-    m = create_base_map()
-    
-    # Add alcaldías layer if enabled
-    if show_alcaldias and geojson_path:
-        add_alcaldias_to_map(m, geojson_path, crime_counts)
-    
-    # Add grid sectors
-    lat_bins, lon_bins, grid_counts, grid_probs = create_grid_sectors(crime_df_filtered, grid_size)
-    add_grid_to_map(m, lat_bins, lon_bins, grid_probs, probability_threshold/100)
-    
-    # Add heatmap
-    heat_data = crime_df_filtered[['latitud', 'longitud']].values.tolist()
-    HeatMap(
-        heat_data,
-        radius=15,
-        blur=25,
-        max_zoom=13,
-        name='Heatmap de crimen'
-    ).add_to(m)
-
-# Add additional layers if selected
-if show_schools:
-    with st.spinner("Loading schools..."):
-        schools = get_schools_data()
-        if schools is not None:
-            school_group = folium.FeatureGroup(name='Escuelas')
-            for idx, row in schools.iterrows():
-                if hasattr(row.geometry, 'centroid'):
-                    centroid = row.geometry.centroid
-                    folium.Marker(
-                        location=[centroid.y, centroid.x],
-                        popup='Escuela',
-                        icon=folium.Icon(color='blue', icon='graduation-cap', prefix='fa')
-                    ).add_to(school_group)
-            school_group.add_to(m)
-
-if show_hospitals:
-    with st.spinner("Cargando hospitales..."):
-        hospitals = get_hospitals_data()
-        if hospitals is not None:
-            hospital_group = folium.FeatureGroup(name='Hospitales')
-            for idx, row in hospitals.iterrows():
-                if hasattr(row.geometry, 'centroid'):
-                    centroid = row.geometry.centroid
-                    folium.Marker(
-                        location=[centroid.y, centroid.x],
-                        popup='Hospital',
-                        icon=folium.Icon(color='red', icon='plus', prefix='fa')
-                    ).add_to(hospital_group)
-            hospital_group.add_to(m)
-
-if show_metro:
-    with st.spinner("Cargando estaciones de metro..."):
-        metro = get_metro_data()
-        if metro is not None:
-            metro_group = folium.FeatureGroup(name='Estaciones de Metro')
-            for idx, row in metro.iterrows():
-                if hasattr(row.geometry, 'centroid'):
-                    centroid = row.geometry.centroid
-                    folium.Marker(
-                        location=[centroid.y, centroid.x],
-                        popup='Estación de Metro',
-                        icon=folium.Icon(color='orange', icon='subway', prefix='fa')
-                    ).add_to(metro_group)
-            metro_group.add_to(m)
-
-if show_parking:
-    with st.spinner("Cargando estacionamientos..."):
-        parking = get_parking_data()
-        if parking is not None:
-            parking_group = folium.FeatureGroup(name='Estacionamientos')
-            for idx, row in parking.iterrows():
-                if hasattr(row.geometry, 'centroid'):
-                    centroid = row.geometry.centroid
-                    folium.CircleMarker(
-                        location=[centroid.y, centroid.x],
-                        radius=5,
-                        popup='Estacionamiento',
-                        color='purple',
-                        fill=True,
-                        fillColor='purple'
-                    ).add_to(parking_group)
-            parking_group.add_to(m)
+    add_grid_layer(m)
+    add_heatmap(m, crime_df_filtered)
+
+# Radius query: only the ball around the point is read, never the whole DataFrame
+if point_query:
+    query_report = radius_report(
+        get_point_index(crime_df, profile), crime_df, query_lat, query_lon, query_radius_m, *query_dates,
+    )
+    add_radius_query_layer(m, query_lat, query_lon, query_radius_m, query_report.rows)
+
+# Add additional layers if selected (OSM downloads are cached, also on disk)
+poi_layers = [
+    (show_schools, "schools", "Loading schools..."),
+    (show_hospitals, "hospitals", "Cargando hospitales..."),
+    (show_metro, "metro", "Cargando estaciones de metro..."),
+    (show_parking, "parking", "Cargando estacionamientos..."),
+]
+# Crimes around each point of interest, ranked (crime_core.proximity)
+proximity_tables = {}
+for enabled, layer, message in poi_layers:
+    if enabled:
+        with st.spinner(message):
+            # Solo la descarga de OpenStreetMap puede fallar por la red; el resto debe reportar sus errores
+            try:
+                add_poi_layer(m, layer)
+            except Exception as e:
+                st.warning(f"No se pudo descargar {POI_LAYERS[layer]['name']} de OpenStreetMap: {e}")
+                continue
+            proximity_tables[layer] = get_poi_proximity(crime_df_filtered, filter_key, layer)
+            add_proximity_layer(
+                m, top_pois(proximity_tables[layer], proximity_radius), proximity_radius,
+                f"{POI_LAYERS[layer]['name']}: crímenes a {proximity_radius} m",
+            )
 
 # Add layer control
 folium.LayerControl().add_to(m)
 
 # Display map
-st.components.v1.html(m._repr_html_(), height=600)
+if viz_type in VIEWPORT_STYLES:
+    with span("mapa.folium_html", viz=viz_type):
+        html = stable_html(m)
+    viewport_map(html, crimes_in_view_data, height=600, key="mapa_viewport")
+    if crimes_in_view.kind == "points" and len(crimes_in_view.features) < crimes_in_view.in_view:
+        st.caption(f"Mostrando {len(crimes_in_view.features):,} de {crimes_in_view.in_view:,} crímenes en la vista; "
+                   "acerca el mapa para verlos todos.")
+    elif crimes_in_view.kind == "cells":
+        st.caption(f"Hexágonos de {edge_label(crimes_in_view.resolution)}; "
+                   f"los crímenes se muestran uno a uno desde el zoom {POINTS_MIN_ZOOM}.")
+else:
+    with span("mapa.folium_html", viz=viz_type):
+        html = m._repr_html_()
+    st.components.v1.html(html, height=600)
+
+if proximity_tables:
+    st.subheader(f"Puntos de interés con más crímenes a {proximity_radius} m")
+    tabs = st.tabs([POI_LAYERS[layer]["name"] for layer in proximity_tables])
+    for tab, table in zip(tabs, proximity_tables.values()):
+        with tab:
+            ranking = top_pois(table, proximity_radius).rename(
+                columns={"name": "Nombre", **{radius_column(r): f"≤ {r} m" for r in PROXIMITY_RADII_M}}
+            )
+            st.dataframe(ranking.drop(columns=["lat", "lon"]), use_container_width=True, hide_index=True)
+
+if point_query:
+    st.subheader(f"📍 Delitos a {query_radius_m} m de ({query_lat:.5f}, {query_lon:.5f})")
+    st.caption(
+        "Sobre todos los delitos cargados: solo aplican las fechas de la consulta, no los filtros de la barra lateral."
+    )
+    st.metric("Delitos en el radio", f"{len(query_report.rows):,}")
+    if not query_report.rows.empty:
+        col_q1, col_q2 = st.columns(2)
+        with col_q1:
+            st.altair_chart(alt.Chart(query_report.by_delito.head(10)).mark_bar(color='#1f77b4').encode(
+                x=alt.X('count', title='Número de Crímenes'),
+                y=alt.Y('delito', sort='-x', title='Tipo de Delito'),
+                tooltip=['delito', 'count']
+            ).properties(height=300), use_container_width=True)
+        with col_q2:
+            hourly = pd.DataFrame({"Hora": range(24), "Crímenes": query_report.hourly})
+            st.altair_chart(alt.Chart(hourly).mark_bar(color='#ff7f0e').encode(
+                x=alt.X('Hora:O', title='Hora del día'),
+                y=alt.Y('Crímenes', title='Número de Crímenes'),
+                tooltip=['Hora', 'Crímenes']
+            ).properties(height=300), use_container_width=True)
+        query_columns = [c for c in ["distancia_m", "fecha_hecho", "delito", "categoria_delito", "alcaldia_hecho",
+                                     "colonia_hecho"] if c in query_report.rows.columns]
+        st.dataframe(query_report.rows[query_columns].head(500), use_container_width=True, hide_index=True)
 
 # Download button
 st.sidebar.subheader("Exportar Mapa")
@@ -858,42 +603,8 @@ if st.sidebar.button("Descargar mapa como HTML"):
 # STATISTICS
 # ============================================================================
 
-# Custom CSS for the statistics cards
-st.markdown("""
-<style>
-div.stat-card {
-    background-color: #ffffff;
-    padding: 20px;
-    border-radius: 10px;
-    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    text-align: center;
-    border: 1px solid #e0e0e0;
-    margin-bottom: 10px;
-}
-div.stat-title {
-    color: #000000;
-    font-weight: 900; /* Extra bold for titles */
-    font-size: 16px;
-    margin-bottom: 10px;
-}
-div.stat-value {
-    color: #000000;
-    font-size: 28px;
-    font-weight: bold;
-}
-/* NUEVO: Estilo para bordes redondeados en gráficas Altair */
-div[data-testid="stAltairChart"] {
-    background-color: #ffffff;
-    border-radius: 15px;
-    padding: 10px;
-    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    border: 1px solid #e0e0e0;
-}
-canvas {
-    border-radius: 15px !important;
-}
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for the statistics cards (memoized and minified in css/theme.py)
+inject_page_css("mapa_stats")
 
 st.subheader("Estadísticas de Crimen")
 col1, col2, col3 = st.columns(3)
@@ -920,7 +631,8 @@ with col3:
 st.subheader("Top 10 tipos de crimen")
 
 # Use BROAD DataFrame to show global context, ignoring specific crime type selection
-top_crimes_series = crime_df_broad['delito'].value_counts().head(10)
+# delito is categorical: value_counts also lists the types filtered out, with 0
+top_crimes_series = crime_df_broad['delito'].value_counts().loc[lambda counts: counts > 0].head(10)
 top_crimes_df = top_crimes_series.reset_index()
 top_crimes_df.columns = ['Delito', 'Cantidad']
 
@@ -947,7 +659,7 @@ st.altair_chart(chart_top, use_container_width=True)
 st.subheader("Crimenes por Alcaldía")
 
 # Use Specific Filtered DataFrame (shows distribution of SELECTED crimes)
-crimes_by_alcaldia_series = crime_df_filtered['alcaldia_hecho'].value_counts()
+crimes_by_alcaldia_series = crime_df_filtered['alcaldia_hecho'].value_counts().loc[lambda counts: counts > 0]
 crimes_by_alcaldia_df = crimes_by_alcaldia_series.reset_index()
 crimes_by_alcaldia_df.columns = ['Alcaldía', 'Cantidad']
 
@@ -980,21 +692,11 @@ col_time, col_violence = st.columns(2)
 with col_time:
     st.subheader("Crímenes por día de la semana")
     
-    # Ensure date format and extract day name
-    crime_df_filtered['fecha_hecho'] = pd.to_datetime(crime_df_filtered['fecha_hecho'])
-    crime_df_filtered['dia_num'] = crime_df_filtered['fecha_hecho'].dt.dayofweek
-    
-    days_map = {0: 'Lunes', 1: 'Martes', 2: 'Miércoles', 3: 'Jueves', 4: 'Viernes', 5: 'Sábado', 6: 'Domingo'}
-    
-    daily_counts = crime_df_filtered['dia_num'].value_counts().sort_index()
-    daily_counts.index = daily_counts.index.map(days_map)
-    
-    # Prepare dataframe for Altair
-    daily_df = daily_counts.reset_index()
-    daily_df.columns = ['Día', 'Crímenes']
+    # Crimes per weekday (crime_core.grid), Lunes..Domingo
+    daily_df = counts_by_weekday(crime_df_filtered)
     
     # Force correct order for the X axis
-    day_order = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+    day_order = list(WEEKDAYS)
     
     # Updated to Area Chart
     area_chart = alt.Chart(daily_df).mark_area(
@@ -1022,74 +724,58 @@ with col_time:
 with col_violence:
     st.subheader("Violentos vs No Violentos")
     
-    # Function to classify violent crimes based on keywords
-    def classify_violence(row):
-        # Combine columns to increase match probability
-        # We check both 'delito' and 'categoria_delito'
-        d = str(row['delito']) if 'delito' in row else ''
-        c = str(row['categoria_delito']) if 'categoria_delito' in row else ''
-        text = (d + " " + c).upper()
-        
-        # Common keywords in CDMX crime data indicating violence
-        keywords = [
-            'VIOLENCIA', 'HOMICIDIO', 'LESIONES', 'ARMA', 'VIOLACION', 
-            'SECUESTRO', 'FEMINICIDIO', 'DISPARO', 'ASALTO', 'C/V', 
-            'AGRESION', 'MUERTE', 'BALA', 'PUNZOCORTANTE', 'GOLPE',
-            'AMENAZAS', 'ABUSO'
-        ]
-        
-        if any(k in text for k in keywords):
-            return "Violento"
-        return "No Violento"
-
-    # Apply row-wise classification (safer than column-wise if keywords are split)
-    violence_counts = crime_df_filtered.apply(classify_violence, axis=1).value_counts()
-    
-    # Ensure consistent order for colors: Violento first, then No Violento
-    # We reindex to guarantee the colors match the labels correctly
-    violence_counts = violence_counts.reindex(['Violento', 'No Violento']).dropna()
+    # Keyword classification over delito + categoria_delito (crime_core.grid),
+    # Violento first so the colors match the labels
+    violence_counts = count_violence(crime_df_filtered)
 
     # Create Pie Chart using Matplotlib for transparent background and custom colors
-    fig, ax = plt.subplots(figsize=(6, 6))
-    
-    # Blue tones: Dark Blue (Violent), Custom Light Blue (Non-Violent)
-    colors_map = {'Violento': '#1f77b4', 'No Violento': '#68bcff'}
-    colors = [colors_map.get(label, '#cccccc') for label in violence_counts.index]
-    
-    # Handle empty data case
-    if not violence_counts.empty:
-        wedges, texts, autotexts = ax.pie(
-            violence_counts, 
-            labels=None, # Removed labels from the chart itself
-            autopct='%1.1f%%', 
-            startangle=90, 
-            colors=colors,
-            textprops={'color':"black", 'weight':'bold', 'fontsize': 12},
-            explode=[0.05] * len(violence_counts) # Slight separation for all slices
-        )
+    # (rendered once per set of counts through the shared figure cache)
+    def draw_violence_pie(violence_counts):
+        fig, ax = plt.subplots(figsize=(6, 6))
+    
+        # Blue tones: Dark Blue (Violent), Custom Light Blue (Non-Violent)
+        colors_map = {'Violento': '#1f77b4', 'No Violento': '#68bcff'}
+        colors = [colors_map.get(label, '#cccccc') for label in violence_counts.index]
+    
+        # Handle empty data case
+        if not violence_counts.empty:
+            wedges, texts, autotexts = ax.pie(
+                violence_counts, 
+                labels=None, # Removed labels from the chart itself
+                autopct='%1.1f%%', 
+                startangle=90, 
+                colors=colors,
+                textprops={'color':"black", 'weight':'bold', 'fontsize': 12},
+                explode=[0.05] * len(violence_counts) # Slight separation for all slices
+            )
         
-        # Create custom legend as a "white card"
-        ax.legend(
-            wedges, 
-            violence_counts.index,
-            title="Categoría",
-            loc="center left",
-            bbox_to_anchor=(1, 0, 0.5, 1),
-            facecolor='white',     # White background
-            edgecolor='lightgray', # Subtle border
-            labelcolor='black',    # Black text
-            framealpha=1,          # Fully opaque
-            fontsize=10
-        )
+            # Create custom legend as a "white card"
+            ax.legend(
+                wedges, 
+                violence_counts.index,
+                title="Categoría",
+                loc="center left",
+                bbox_to_anchor=(1, 0, 0.5, 1),
+                facecolor='white',     # White background
+                edgecolor='lightgray', # Subtle border
+                labelcolor='black',    # Black text
+                framealpha=1,          # Fully opaque
+                fontsize=10
+            )
         
-    else:
-        ax.text(0.5, 0.5, "No hay datos", ha='center', va='center')
-    
-    # Transparent background for the figure
-    fig.patch.set_alpha(0.0)
-    ax.axis('equal')  
+        else:
+            ax.text(0.5, 0.5, "No hay datos", ha='center', va='center')
     
-    st.pyplot(fig, transparent=True)
+        # Transparent background for the figure
+        fig.patch.set_alpha(0.0)
+        ax.axis('equal')  
+        return fig
+
+    pie_png = get_figure_cache().render(
+        "mapa_violencia_pie", violence_counts, draw_violence_pie,
+        theme=st.session_state.get("theme_mode", "auto"), transparent=True,
+    )
+    st.image(pie_png, use_container_width=True)
 
 
 # ============================================================================
@@ -1131,6 +817,7 @@ with st.expander("📊 Reporte de calidad de data"):
     
     st.markdown("### Informacióon del conjunto de datos limpio")
     st.write(f"**Registros totales:** {len(crime_df_filtered):,}")
+    st.write(f"**Memoria del conjunto cargado:** {frame_memory(crime_df) / 1e6:,.1f} MB")
     st.write(f"**Alcaldías únicas:** {crime_df_filtered['alcaldia_hecho'].nunique()}")
     st.write(f"**Tipos de crimen únicos:** {crime_df_filtered['delito'].nunique()}")
     st.write(f"**DRango de datos:** {crime_df_filtered['fecha_hecho'].min()} to {crime_df_filtered['fecha_hecho'].max()}")
@@ -1141,7 +828,7 @@ st.markdown("""
 ### Documentación
 **Características:**
 - 🧹 **Limpieza de datos profesional**: Sigue las mejores prácticas de EDA con validación de coordenadas, normalización de nombres y manejo de valores faltantes.
-- 🗺️ **Visualizaciones múltiples**: Mapas de calor, sectores de cuadrícula, línea de tiempo animada con análisis temporal.
+- 🗺️ **Visualizaciones múltiples**: Mapas de calor, sectores de cuadrícula, hexágonos jerárquicos, zonas calientes por densidad de kernel, puntos calientes y fríos Gi* con corrección FDR, puntos calientes emergentes (Mann-Kendall), línea de tiempo animada con análisis temporal.
 - 🔍 **Filtrado interactivo**: Filtra por rango de fechas, tipo de delito y ubicación.
 
 - 📊 **Puntos críticos dinámicos**: Detección probabilística con umbrales ajustables.
@@ -1,12 +1,24 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import joblib
-import duckdb
-import seaborn as sns
-import matplotlib.pyplot as plt
+import os
+import tempfile
+import time
 from datetime import datetime
-import zlib
+from crime_core.cache import get_result_cache
+from crime_core.models import get_registry
+from crime_core.data import get_colonia_counts
+from crime_core.forecast import day_risk, distributed_day_risk, forecast
+from crime_core.db import connect
+from crime_core.figures import get_figure_cache
+from crime_core.series import LAGS, has_series, lag_features
+from crime_core.lazy import lazy_import
+from crime_core.metrics import span
+
+# Solo se importan al dibujar un heatmap que no está en caché
+sns = lazy_import("seaborn")
+plt = lazy_import("matplotlib.pyplot")
+# folium solo se carga al dibujar el mapa de hexágonos
+maps = lazy_import("crime_core.maps")
 
 # ==========================================
 # CONFIGURACIÓN DE PÁGINA
@@ -21,28 +33,28 @@ st.markdown("Distribución del riesgo predicho desglosado por **Alcaldía, Colon
 # ==========================================
 DELITO_CONFIG = {
     "Robo a Transeúnte": {
-        "sql_filter": "%TRANSEUNTE%",
-        "model_file": "xgboost_model.pkl",
+        "familia": "TRANSEUNTE",
+        "model": "xgboost_model",
         "type": "temporal_base"
     },
     "Robo a Negocio": {
-        "sql_filter": "%NEGOCIO%",
-        "model_file": "model_neg_tran.pkl",
+        "familia": "NEGOCIO",
+        "model": "model_neg_tran",
         "type": "spatiotemporal"
     },
     "Robo a Transporte": {
-        "sql_filter": "%TRANSPORTE%",
-        "model_file": "model_neg_tran.pkl",
+        "familia": "TRANSPORTE",
+        "model": "model_neg_tran",
         "type": "spatiotemporal"
     },
     "Homicidio y Feminicidio": {
-        "sql_filter": "%HOMICIDIO%",
-        "model_file": "model_hom_fem.pkl",
+        "familia": "HOMICIDIO",
+        "model": "model_hom_fem",
         "type": "spatiotemporal"
     },
     "Violación": {
-        "sql_filter": "%VIOLACION%",
-        "model_file": "model_violacion.pkl",
+        "familia": "VIOLACION",
+        "model": "model_violacion",
         "type": "spatiotemporal"
     }
 }
@@ -61,49 +73,165 @@ current_config = DELITO_CONFIG[tipo_delito]
 # ==========================================
 # 2. CARGA DE DATOS Y MODELO
 # ==========================================
-@st.cache_data
-def load_historical_stats(keyword_filter):
+def load_historical_stats(familia):
+    # Conteos por colonia en la caché de resultados compartida (crime_core.data), con los
+    # mismos delitos por familia que la serie horaria de los lags (crime_core.series)
     try:
-        con = duckdb.connect("crimes_fgj.db", read_only=True)
-        query = f"""
-            SELECT 
-                alcaldia_hecho, 
-                colonia_hecho, 
-                COUNT(*) as total_robos
-            FROM crimes_raw
-            WHERE delito ILIKE '{keyword_filter}' 
-            AND alcaldia_hecho IS NOT NULL 
-            AND colonia_hecho IS NOT NULL
-            GROUP BY alcaldia_hecho, colonia_hecho
-        """
-        df = con.execute(query).df()
-        con.close()
-        
-        df = df.dropna(subset=['alcaldia_hecho', 'colonia_hecho'])
-        df['alcaldia_hecho'] = df['alcaldia_hecho'].astype(str).str.upper().str.strip()
-        df['colonia_hecho'] = df['colonia_hecho'].astype(str).str.upper().str.strip()
-        return df
+        return get_colonia_counts(familia=familia)
     except Exception as e:
         st.error(f"Error conectando a la base de datos: {e}")
         return pd.DataFrame()
 
 @st.cache_resource
-def load_model(filename):
+def get_series_connection():
+    # Conexión de solo lectura a la serie horaria precalculada (crime_core.series)
+    try:
+        con = connect(read_only=True)
+    except Exception:
+        return None
+    if not has_series(con):
+        con.close()
+        return None
+    return con
+
+# El registro es compartido por todo el proceso y ya se precarga desde app.py
+registry = get_registry()
+
+def load_model(name):
     try:
-        loaded = joblib.load(filename)
-        if isinstance(loaded, str):
-            st.error(f"🚨 El archivo {filename} es texto. Revisa el pkl.")
-            return None
-        return loaded
+        return registry.get(name)
     except FileNotFoundError:
-        st.warning(f"⚠️ Falta archivo: {filename}")
+        st.error(f"🚨 No hay un modelo disponible para {tipo_delito} ({name}).")
         return None
     except Exception as e:
-        st.error(f"Error cargando {filename}: {e}")
+        st.error(f"Error cargando {name}: {e}")
         return None
 
-df_stats = load_historical_stats(current_config["sql_filter"])
-model = load_model(current_config["model_file"])
+df_stats = load_historical_stats(current_config["familia"])
+model = load_model(current_config["model"])
+# Predicción sobre arreglos float32 sin pasar por pandas/DMatrix (crime_core.inference)
+predictor = registry.predictor(current_config["model"]) if model is not None else None
+
+with st.expander("🧠 Modelos disponibles"):
+    st.dataframe(
+        # trained_at queda vacío salvo que el .meta.json registre la fecha real de entrenamiento
+        pd.DataFrame(registry.metrics()).reindex(
+            columns=["name", "fmt", "feature_names", "trained_at", "sha256", "load_seconds", "memory_bytes", "error"]
+        ),
+        use_container_width=True,
+    )
+
+# Heatmaps renderizados una vez por (datos, tema) y reutilizados en cada rerun
+fig_cache = get_figure_cache()
+
+def dibujar_heatmap_magma(df, ylabel, row_height):
+    fig, ax = plt.subplots(figsize=(14, max(6, len(df) * row_height)))
+    # Dejamos que seaborn calcule el min y max automáticamente (Auto-contraste)
+    sns.heatmap(df, cmap="magma", annot=False, linewidths=.5, ax=ax)
+    ax.set_xlabel("Hora del Día")
+    ax.set_ylabel(ylabel)
+    ax.tick_params(axis="x", labelrotation=45)
+    return fig
+
+def mostrar_heatmap(df, ylabel, row_height=0.5):
+    png = fig_cache.render(
+        "pred_heatmap_magma", df, dibujar_heatmap_magma,
+        theme=st.session_state.get("theme_mode", "auto"), ylabel=ylabel, row_height=row_height,
+    )
+    st.image(png, use_container_width=True)
+
+def mostrar_mapa_hexagonos(df_heatmap, df_colonias):
+    # Riesgo del día por colonia, sumado en el hexágono donde cae la mayoría de sus delitos
+    celdas = df_colonias.drop_duplicates("colonia_hecho").set_index("colonia_hecho")["hex_cell"]
+    riesgo = df_heatmap.sum(axis=1).rename("riesgo").to_frame().join(celdas).dropna(subset=["hex_cell"])
+    if riesgo.empty:
+        st.info("Las colonias seleccionadas no tienen coordenadas para ubicarlas en el mapa.")
+        return
+    por_celda = riesgo.groupby(riesgo["hex_cell"].astype("int64"))["riesgo"].sum().rename_axis("cell").reset_index()
+    m = maps.hex_count_map(
+        por_celda, zoom_start=13, name="Riesgo por hexágono", column="riesgo",
+        caption="Riesgo del día (suma de 24 h)", alias="Riesgo:",
+    )
+    with span("mapa.folium_html", viz="predicciones_hex"):
+        html = m._repr_html_()
+    st.components.v1.html(html, height=450)
+
+modo = st.radio(
+    "Modo de predicción:",
+    ["Un día por colonia", "Pronóstico multi-día (todas las alcaldías)"],
+    horizontal=True,
+)
+
+# ==========================================
+# 2b. PRONÓSTICO MULTI-DÍA
+# ==========================================
+result_cache = get_result_cache()
+
+@result_cache.memoize("predicciones.forecast_file")
+def get_forecast_file(_result, tipo, modelo, fecha_inicio, horizonte, fmt):
+    # Se escribe por bloques de días a un archivo temporal una sola vez por pronóstico y formato
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        _result.write(path, fmt=fmt)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+if modo.startswith("Pronóstico"):
+    if current_config["type"] != "spatiotemporal":
+        st.info("El pronóstico multi-día solo está disponible para los modelos espacio-temporales.")
+        st.stop()
+
+    col_f1, col_f2 = st.columns(2)
+    with col_f1:
+        fecha_inicio = st.date_input("Fecha inicial", datetime.now())
+    with col_f2:
+        horizonte = st.selectbox("Horizonte (días)", [7, 14, 30], index=0)
+
+    if st.button(f"Generar pronóstico de {horizonte} días para {tipo_delito}"):
+        if predictor is None or df_stats.empty:
+            st.stop()
+
+        with st.spinner("Calculando pronóstico..."):
+            t0 = time.perf_counter()
+            with span("predicciones.forecast", modelo=current_config["model"], dias=horizonte):
+                resultado = forecast(
+                    predictor, df_stats, fecha_inicio, horizonte, model_name=current_config["model"]
+                )
+            st.session_state.forecast_result = (tipo_delito, resultado, time.perf_counter() - t0)
+
+    if "forecast_result" in st.session_state and st.session_state.forecast_result[0] == tipo_delito:
+        _, resultado, segundos = st.session_state.forecast_result
+        st.success(
+            f"{resultado.n_rows:,} predicciones ({len(resultado.dates)} días × "
+            f"{len(resultado.colonias):,} colonias × 24 h) en {segundos:.2f} s"
+        )
+
+        st.subheader("📈 Riesgo total esperado por día y alcaldía")
+        st.line_chart(resultado.daily_by_alcaldia())
+
+        st.subheader("🔥 Riesgo promedio por alcaldía y hora")
+        mostrar_heatmap(resultado.hourly_by_alcaldia(), "Alcaldía", row_height=0.45)
+
+        st.subheader("🏘️ Colonias con mayor riesgo en el horizonte")
+        st.dataframe(resultado.top_colonias(20), use_container_width=True)
+
+        # Los archivos se generan solo a pedido; las descargas se reutilizan en los reruns
+        clave = (tipo_delito, current_config["model"], resultado.dates[0], len(resultado.dates))
+        if st.button("Preparar descarga"):
+            st.session_state.forecast_download = clave
+        if st.session_state.get("forecast_download") == clave:
+            col_d1, col_d2 = st.columns(2)
+            nombre = f"pronostico_{current_config['model']}_{resultado.dates[0]:%Y%m%d}_{len(resultado.dates)}d"
+            with col_d1:
+                st.download_button("Descargar Parquet", get_forecast_file(resultado, *clave, "parquet"),
+                                   file_name=f"{nombre}.parquet", mime="application/octet-stream")
+            with col_d2:
+                st.download_button("Descargar CSV", get_forecast_file(resultado, *clave, "csv"),
+                                   file_name=f"{nombre}.csv", mime="text/csv")
+    st.stop()
 
 # ==========================================
 # 3. FILTROS
@@ -127,10 +255,6 @@ with col3:
 # ==========================================
 # 4. LÓGICA DE PREDICCIÓN
 # ==========================================
-def get_colonia_code(nombre_colonia):
-    # Hash provisional
-    return zlib.crc32(nombre_colonia.encode('utf-8')) % 1000
-
 if st.button(f"Generar Mapa para {tipo_delito}"):
     
     if model is None or alcaldia_sel is None:
@@ -145,83 +269,36 @@ if st.button(f"Generar Mapa para {tipo_delito}"):
             
             df_top_colonias = df_local.sort_values('total_robos', ascending=False).head(top_n)
             
-            matrix_data = {}
-            dia_sem = fecha_sel.weekday()
-            mes = fecha_sel.month
-            anio = fecha_sel.year
-
             # --- MODELO NUEVO (Negocio / Transporte) ---
             if current_config["type"] == "spatiotemporal":
-                for _, row in df_top_colonias.iterrows():
-                    col_name = row['colonia_hecho']
-                    col_code = get_colonia_code(col_name)
-                    
-                    input_rows = []
-                    for h in range(24):
-                        input_rows.append({
-                            "hora": h,
-                            "dia_semana": dia_sem,
-                            "mes": mes,
-                            "colonia_code": col_code
-                        })
-                    
-                    df_pred = pd.DataFrame(input_rows)
-                    preds = model.predict(df_pred)
-                    
-                    # 1. CAMBIO IMPORTANTE: Quitamos la multiplicación * 100
-                    # Usamos el valor crudo del modelo
-                    matrix_data[col_name] = preds 
+                # Una sola matriz (colonias x 24 horas) y una sola llamada al modelo
+                # (valor crudo del modelo, sin multiplicar por 100)
+                df_heatmap = day_risk(predictor, df_top_colonias['colonia_hecho'], fecha_sel)
 
             # --- MODELO ANTIGUO (Transeúnte) ---
             else:
-                input_data = []
-                features_old = ['año', 'mes', 'dia', 'hora', 'dia_semana', 
-                                'sin_hora', 'cos_hora', 
-                                'lag_1', 'lag_2', 'lag_3', 'lag_6', 'lag_12', 'lag_24']
-                
-                for h in range(24):
-                    sin_h = np.sin(2 * np.pi * h / 24)
-                    cos_h = np.cos(2 * np.pi * h / 24)
-                    input_data.append({
-                        "año": anio, "mes": mes, "dia": fecha_sel.day,
-                        "hora": h, "dia_semana": dia_sem,
-                        "sin_hora": sin_h, "cos_hora": cos_h,
-                        "lag_1": 0, "lag_2": 0, "lag_3": 0, "lag_6": 0, "lag_12": 0, "lag_24": 0
-                    })
-                
-                df_time = pd.DataFrame(input_data)[features_old]
-                riesgo_base = model.predict(df_time)
-                
-                total_crimes = df_local['total_robos'].sum()
-                for _, row in df_top_colonias.iterrows():
-                    peso = row['total_robos'] / total_crimes
-                    # Mantenemos *100 aquí porque el riesgo base suele ser muy pequeño (0.00x)
-                    matrix_data[row['colonia_hecho']] = riesgo_base * peso * 100
+                # Lags reales desde la serie horaria (una consulta por rango en DuckDB)
+                con_series = get_series_connection()
+                if con_series is not None:
+                    df_lags = lag_features(con_series.cursor(), current_config["familia"], fecha_sel)
+                else:
+                    st.info("Serie horaria no disponible (`python -m crime_core.series --rebuild`); se usan lags en cero.")
+                    df_lags = pd.DataFrame(0, index=range(24), columns=[f"lag_{k}" for k in LAGS])
+
+                # Riesgo base repartido por el peso histórico de cada colonia (x100)
+                df_heatmap = distributed_day_risk(
+                    predictor, df_top_colonias, df_local['total_robos'].sum(), fecha_sel, df_lags
+                )
 
             # --- VISUALIZACIÓN ---
-            df_heatmap = pd.DataFrame(matrix_data).T 
-            df_heatmap.columns = [f"{h}:00" for h in range(24)]
-            
             st.subheader(f"🔥 Mapa de Calor: {tipo_delito}")
             
-            fig_height = max(6, top_n * 0.5)
-            fig, ax = plt.subplots(figsize=(14, fig_height))
-            
-            # 2. CAMBIO IMPORTANTE: Quitamos vmin=0
-            # Dejamos que seaborn calcule el min y max automáticamente (Auto-contraste)
-            sns.heatmap(
-                df_heatmap, 
-                cmap="magma",     
-                annot=False, 
-                linewidths=.5, 
-                ax=ax
-            )
-            
-            plt.xlabel("Hora del Día")
-            plt.ylabel("Colonia")
-            plt.xticks(rotation=45)
-            st.pyplot(fig)
+            # 2. CAMBIO IMPORTANTE: Quitamos vmin=0 (ver dibujar_heatmap_magma)
+            mostrar_heatmap(df_heatmap, "Colonia")
             
+            st.subheader("🗺️ Riesgo del día por hexágono")
+            mostrar_mapa_hexagonos(df_heatmap, df_top_colonias)
+
             with st.expander("📂 Ver datos numéricos"):
                 # Usamos un formato flexible
                 st.dataframe(df_heatmap.style.background_gradient(cmap="magma", axis=None))
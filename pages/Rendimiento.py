@@ -0,0 +1,97 @@
+import time
+
+import altair as alt
+import streamlit as st
+from crime_core.cache import get_result_cache
+from crime_core.figures import get_figure_cache
+from crime_core.metrics import METRICS_PATH, load_spans, percentiles_over_time, summarize
+
+st.set_page_config(page_title="Rendimiento", layout="wide")
+
+# Solo administradores; app.py tampoco la muestra a otros roles
+if st.session_state.get("role") != "Socio Thales":
+    st.error("Esta página solo está disponible para administradores.")
+    st.stop()
+
+st.title("⏱️ Rendimiento")
+st.markdown(f"""
+Tiempos de los puntos calientes registrados con `crime_core.metrics` (SQL, limpieza, cuadrícula,
+serialización de folium, modelos, recuperación y generación del chat) en `{METRICS_PATH}`.
+""")
+
+# ===========================
+# FILTROS
+# ===========================
+VENTANAS = {
+    "Última hora": (3600, "5min"),
+    "Últimas 24 horas": (24 * 3600, "1h"),
+    "Últimos 7 días": (7 * 24 * 3600, "6h"),
+    "Todo": (None, "1D"),
+}
+
+col_f1, col_f2 = st.columns([1, 3])
+with col_f1:
+    ventana = st.selectbox("Ventana de tiempo:", list(VENTANAS), index=1)
+    segundos, frecuencia = VENTANAS[ventana]
+    if st.button("🔄 Actualizar"):
+        st.rerun()
+
+spans = load_spans(since=time.time() - segundos if segundos else None)
+
+if spans.empty:
+    st.info("Todavía no hay spans registrados en esta ventana. Navega por las páginas y vuelve a cargar.")
+    st.stop()
+
+with col_f2:
+    nombres = sorted(spans["span"].unique())
+    seleccion = st.multiselect("Spans:", nombres, default=[n for n in nombres if not n.startswith("page.")][:6] or nombres[:6])
+
+# ===========================
+# RESUMEN POR SPAN
+# ===========================
+st.subheader("Resumen por span")
+st.dataframe(
+    summarize(spans),
+    use_container_width=True,
+    hide_index=True,
+    column_config={
+        "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+        "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+        "max_ms": st.column_config.NumberColumn("máx (ms)", format="%.1f"),
+        "rss_delta_mb": st.column_config.NumberColumn("Δ RSS medio (MB)", format="%.2f"),
+    },
+)
+
+# ===========================
+# p50 / p95 EN EL TIEMPO
+# ===========================
+st.subheader("p50 / p95 en el tiempo")
+if seleccion:
+    serie = percentiles_over_time(spans[spans["span"].isin(seleccion)], freq=frecuencia)
+    serie = serie.melt(id_vars=["span", "ts", "n"], value_vars=["p50_ms", "p95_ms"],
+                       var_name="percentil", value_name="ms")
+    chart = alt.Chart(serie).mark_line(point=True).encode(
+        x=alt.X("ts:T", title="Tiempo"),
+        y=alt.Y("ms:Q", title="Milisegundos", scale=alt.Scale(type="symlog")),
+        color=alt.Color("span:N", title="Span"),
+        strokeDash=alt.StrokeDash("percentil:N", title="Percentil"),
+        tooltip=["span", "percentil", "ts:T", alt.Tooltip("ms:Q", format=".1f"), "n"],
+    ).properties(height=420)
+    st.altair_chart(chart, use_container_width=True)
+else:
+    st.info("Selecciona al menos un span.")
+
+# ===========================
+# MEMORIA Y CACHÉS
+# ===========================
+col_m1, col_m2 = st.columns(2)
+with col_m1:
+    st.subheader("Memoria del proceso (RSS)")
+    memoria = spans.dropna(subset=["rss_mb"]).set_index("ts")["rss_mb"].resample(frecuencia).max().dropna()
+    st.line_chart(memoria, height=260)
+with col_m2:
+    st.subheader("Cachés")
+    st.json({"resultados": get_result_cache().stats(), "graficas": get_figure_cache().stats()}, expanded=False)
+
+with st.expander("Últimos spans"):
+    st.dataframe(spans.sort_values("ts", ascending=False).head(200), use_container_width=True, hide_index=True)